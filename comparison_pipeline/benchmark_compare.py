@@ -0,0 +1,47 @@
+"""Benchmarks row by row similarity scoring against batched scoring on body changes"""
+# pylint: disable=invalid-name
+import random
+import time
+import pandas as pd
+from compare import similarity, batch_similarity, SIMILARITY_METRICS
+
+CHANGE_COUNT = 5000
+WORDS_PER_BODY = 600
+WORDS = ["government", "minister", "said", "the", "a", "report", "police", "match",
+         "week", "people", "new", "after", "council", "year", "told", "BBC"]
+
+
+def make_changes(count: int) -> pd.DataFrame:
+    """Returns synthetic body changes, each a few words different from the previous version"""
+    rng = random.Random(1)
+    rows = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(WORDS_PER_BODY)]
+        previous = " ".join(words)
+        for _ in range(5):
+            words[rng.randrange(WORDS_PER_BODY)] = rng.choice(WORDS)
+        rows.append({"change_type": "body", "previous": previous, "current": " ".join(words)})
+    return pd.DataFrame(rows)
+
+
+def time_scoring(run) -> float:
+    """Returns seconds taken by a scoring function"""
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+
+    changes = make_changes(CHANGE_COUNT)
+    previous, current = changes["previous"].tolist(), changes["current"].tolist()
+
+    results = {"apply(axis=1) ratio": time_scoring(lambda: changes.apply(
+        lambda row: similarity(row["previous"], row["current"]), axis=1))}
+    for metric in SIMILARITY_METRICS:
+        results[f"batched {metric}"] = time_scoring(
+            lambda metric=metric: batch_similarity(previous, current, metric))
+
+    print(f"{CHANGE_COUNT} body changes of {WORDS_PER_BODY} words")
+    for name, seconds in results.items():
+        print(f"{name}: {seconds:.2f}s ({CHANGE_COUNT / seconds:.0f} changes/s)")
@@ -0,0 +1,50 @@
+"""Compares the stored size of changes as json diff hunks against the old
+sentinel-joined previous/current strings"""
+# pylint: disable=invalid-name
+import random
+from difflib import unified_diff
+from compare import encode_hunks
+from diff_engine import word_hunks
+
+CHANGE_COUNT = 2000
+WORDS_PER_BODY = 600
+EDITS_PER_CHANGE = 5
+
+
+def make_pairs(count: int) -> list:
+    """Returns synthetic (previous, current) bodies a few words apart"""
+    rng = random.Random(1)
+    pairs = []
+    for _ in range(count):
+        words = [f"word{rng.randrange(3000)}" for _ in range(WORDS_PER_BODY)]
+        previous = " ".join(words)
+        for _ in range(EDITS_PER_CHANGE):
+            words[rng.randrange(WORDS_PER_BODY)] = f"edit{rng.randrange(3000)}"
+        pairs.append((previous, " ".join(words)))
+    return pairs
+
+
+def legacy_side(symbol: str, differences: list) -> str:
+    """Encodes one side of a diff the way changes were stored before json hunks"""
+    words = ["£$" if "@@" in word else word for word in differences if word[0] != symbol]
+    return "§%".join(words)
+
+
+def legacy_bytes(previous: str, current: str) -> int:
+    """Returns the bytes taken by the old previous_version and current_version text"""
+    differences = list(unified_diff(previous.split(), current.split()))[2:]
+    return len(legacy_side("+", differences).encode()) + \
+        len(legacy_side("-", differences).encode())
+
+
+if __name__ == "__main__":
+
+    pairs = make_pairs(CHANGE_COUNT)
+    legacy = sum(legacy_bytes(previous, current) for previous, current in pairs)
+    hunks = sum(len(encode_hunks(word_hunks(previous, current)).encode())
+                for previous, current in pairs)
+
+    print(f"{CHANGE_COUNT} body changes of {EDITS_PER_CHANGE} edited words")
+    print(f"sentinel strings: {legacy / CHANGE_COUNT:.0f} bytes per change")
+    print(f"json hunks:       {hunks / CHANGE_COUNT:.0f} bytes per change "
+          f"({100 * (1 - hunks / legacy):.0f}% smaller)")
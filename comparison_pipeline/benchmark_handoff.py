@@ -0,0 +1,63 @@
+"""Benchmarks the comparison stages with csv hand-offs vs passing dataframes in memory"""
+# pylint: disable=invalid-name
+from contextlib import redirect_stdout
+import io
+import os
+import random
+import tempfile
+import time
+import pandas as pd
+from transform import transform_data
+from compare import compare_data
+
+ARTICLE_COUNT = 2000
+WORDS_PER_BODY = 800
+CHANGED_SHARE = 0.1
+WORDS = ["government", "minister", "said", "the", "a", "report", "police", "match",
+         "week", "people", "new", "after", "council", "year", "told", "BBC"]
+
+
+def make_versions(count: int) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Returns synthetic scraped and previous versions, a share of them changed"""
+    rng = random.Random(1)
+    previous, scraped = [], []
+    for article_id in range(count):
+        body = " ".join(rng.choice(WORDS) for _ in range(WORDS_PER_BODY))
+        url = f"https://www.bbc.co.uk/news/{article_id}"
+        previous.append({"body": body, "heading": f"Heading {article_id}", "article_url": url,
+                         "article_id": article_id, "scraped_at": "2023-09-11 12:00:00"})
+        if rng.random() < CHANGED_SHARE:
+            body = body.replace("said", "told", 1) + " Updated."
+        scraped.append({"body": body, "heading": f"Heading {article_id}", "article_url": url,
+                        "scraped_at": "2023-09-11 12:30:00"})
+    return pd.DataFrame(scraped), pd.DataFrame(previous)
+
+
+def run_stages(scraped: pd.DataFrame, previous: pd.DataFrame, checkpoint: bool) -> float:
+    """Runs transform and compare, returning seconds taken"""
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        if checkpoint:
+            scraped.to_csv("scraped_articles.csv", index=False)
+            previous.to_csv("previous_versions.csv", index=False)
+            transform_data(checkpoint=True)
+            compare_data(checkpoint=True)
+        else:
+            changes, _ = transform_data(scraped, previous)
+            compare_data(changes)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+
+    scraped_df, previous_df = make_versions(ARTICLE_COUNT)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        csv_seconds = run_stages(scraped_df, previous_df, checkpoint=True)
+        memory_seconds = run_stages(scraped_df, previous_df, checkpoint=False)
+        csv_bytes = sum(os.path.getsize(name) for name in os.listdir(workdir))
+
+    print(f"{ARTICLE_COUNT} articles, {WORDS_PER_BODY} words each")
+    print(f"csv hand-offs: {csv_seconds:.2f}s ({csv_bytes / 1e6:.1f} MB written)")
+    print(f"in memory:     {memory_seconds:.2f}s")
+    print(f"serialization overhead removed: {csv_seconds - memory_seconds:.2f}s")
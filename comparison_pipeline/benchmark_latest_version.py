@@ -0,0 +1,78 @@
+"""Benchmarks the latest-version query against the old correlated MAX(scraped_at) query.
+Needs a Postgres set up through the usual DB_* environment variables. The data is
+seeded into temporary tables that shadow article/article_version for this session only."""
+# pylint: disable=invalid-name
+import time
+from extract import get_db_connection, get_latest_version_of_article_from_db
+
+ARTICLE_COUNT = 20000
+VERSIONS_PER_ARTICLE = 6
+SCHEDULED_ARTICLES = 2400
+CORRELATED_MAX_QUERY = """SELECT article_version.body,
+                article_version.heading, article.article_url,
+                article.article_id,
+                article_version.scraped_at
+                FROM article
+                LEFT JOIN article_version
+                ON article_version.article_id = article.article_id
+                WHERE article_version.scraped_at = (SELECT MAX(article_version.scraped_at)
+                FROM article_version WHERE article.article_id = article_version.article_id)
+                GROUP BY article.article_id, article.article_url,
+                article_version.heading, article_version.body,
+                scraped_at
+                ;"""
+SEED_SQL = """
+CREATE TEMP TABLE article (article_id INT PRIMARY KEY, article_url TEXT UNIQUE,
+                           created_at TIMESTAMPTZ);
+CREATE TEMP TABLE article_version (article_version_id SERIAL PRIMARY KEY,
+                                   scraped_at TIMESTAMPTZ, heading TEXT, body TEXT,
+                                   body_delta TEXT, article_id INT, heading_hash TEXT,
+                                   body_hash TEXT,
+                                   UNIQUE (article_id, scraped_at));
+INSERT INTO article SELECT n, 'https://www.bbc.co.uk/news/' || n,
+                           NOW() - n * INTERVAL '1 minute'
+FROM generate_series(1, %(articles)s) n;
+INSERT INTO article_version (scraped_at, heading, body, article_id, heading_hash, body_hash)
+SELECT a.created_at + v * INTERVAL '30 minutes', 'Heading ' || v,
+       repeat('Body text of the article. ', 120), a.article_id,
+       md5('Heading ' || v), md5(repeat('Body text of the article. ', 120))
+FROM article a, generate_series(1, %(versions)s) v;
+ANALYZE article;
+ANALYZE article_version;
+"""
+
+
+def time_query(run) -> tuple[float, int]:
+    """Returns seconds taken and rows returned by a query function"""
+    start = time.perf_counter()
+    rows = run()
+    return time.perf_counter() - start, rows
+
+
+if __name__ == "__main__":
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SEED_SQL, {"articles": ARTICLE_COUNT, "versions": VERSIONS_PER_ARTICLE})
+
+            def correlated_max() -> int:
+                """Runs the old query"""
+                cur.execute(CORRELATED_MAX_QUERY)
+                return len(cur.fetchall())
+
+            scheduled = [f"https://www.bbc.co.uk/news/{n}" for n in range(1, SCHEDULED_ARTICLES + 1)]
+            results = {
+                "correlated MAX": time_query(correlated_max),
+                "lateral latest, all articles": time_query(
+                    lambda: len(get_latest_version_of_article_from_db(conn))),
+                f"lateral latest, {SCHEDULED_ARTICLES} scheduled": time_query(
+                    lambda: len(get_latest_version_of_article_from_db(conn, scheduled))),
+            }
+    finally:
+        conn.rollback()
+        conn.close()
+
+    print(f"{ARTICLE_COUNT} articles, {ARTICLE_COUNT * VERSIONS_PER_ARTICLE} versions")
+    for name, (seconds, rows) in results.items():
+        print(f"{name}: {seconds:.2f}s for {rows} rows")
@@ -0,0 +1,63 @@
+"""Benchmarks COPY vs execute_values for bulk article_version inserts.
+Needs a local Postgres set up through the usual DB_* environment variables;
+only temporary tables are written and everything is rolled back."""
+# pylint: disable=invalid-name
+import random
+import time
+import pandas as pd
+from psycopg2.extras import execute_values
+from extract import get_db_connection
+from load import copy_rows
+
+ROW_COUNT = 30000
+WORDS_PER_BODY = 600
+WORDS = ["government", "minister", "said", "the", "a", "report", "police", "match",
+         "week", "people", "new", "after", "council", "year", "told", "BBC"]
+COLUMNS = ["scraped_at", "heading", "body", "article_id"]
+
+
+def make_versions(count: int) -> pd.DataFrame:
+    """Returns synthetic article versions with realistic body lengths"""
+    rng = random.Random(1)
+    return pd.DataFrame([("2023-09-11 12:00:00+00", f"Heading {number}",
+                          " ".join(rng.choice(WORDS) for _ in range(WORDS_PER_BODY)),
+                          number) for number in range(count)], columns=COLUMNS)
+
+
+def time_execute_values(cur, versions: pd.DataFrame) -> float:
+    """Returns seconds to insert every row with execute_values"""
+    start = time.perf_counter()
+    execute_values(cur, """INSERT INTO bench_version (scraped_at, heading, body, article_id)
+                   VALUES %s;""", versions.to_records(index=False).tolist())
+    return time.perf_counter() - start
+
+
+def time_copy(cur, versions: pd.DataFrame) -> float:
+    """Returns seconds to insert every row with COPY through a staging table"""
+    start = time.perf_counter()
+    copy_rows(cur, "bench_staging", COLUMNS, versions)
+    cur.execute("""INSERT INTO bench_version (scraped_at, heading, body, article_id)
+                SELECT scraped_at, heading, body, article_id FROM bench_staging;""")
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+
+    conn = get_db_connection()
+    rows = make_versions(ROW_COUNT)
+    megabytes = rows["body"].str.len().sum() / 1e6
+    try:
+        with conn.cursor() as bench_cur:
+            for table in ("bench_version", "bench_staging"):
+                bench_cur.execute(f"""CREATE TEMP TABLE {table} (scraped_at TIMESTAMPTZ,
+                                  heading TEXT, body TEXT, article_id INT);""")
+            values_seconds = time_execute_values(bench_cur, rows)
+            bench_cur.execute("TRUNCATE bench_version;")
+            copy_seconds = time_copy(bench_cur, rows)
+    finally:
+        conn.rollback()
+        conn.close()
+
+    print(f"{ROW_COUNT} bodies, {megabytes:.0f} MB of text")
+    print(f"execute_values: {values_seconds:.2f}s ({ROW_COUNT / values_seconds:.0f} rows/s)")
+    print(f"COPY:           {copy_seconds:.2f}s ({ROW_COUNT / copy_seconds:.0f} rows/s)")
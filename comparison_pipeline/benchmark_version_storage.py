@@ -0,0 +1,75 @@
+"""Benchmarks article_version bytes on disk and latest-version rebuild time for plain
+bodies against delta storage with periodic snapshots.
+Needs a Postgres set up through the usual DB_* environment variables. The data is
+seeded into temporary tables that shadow article/article_version for this session only."""
+# pylint: disable=invalid-name
+import random
+import time
+import pandas as pd
+from extract import get_db_connection, get_latest_version_of_article_from_db
+from load import copy_rows
+from version_store import make_delta, SNAPSHOT_EVERY
+
+ARTICLE_COUNT = 2000
+VERSIONS_PER_ARTICLE = 12
+WORDS_PER_BODY = 600
+COLUMNS = ["scraped_at", "heading", "body", "body_delta", "article_id",
+           "heading_hash", "body_hash"]
+SEED_SQL = """
+CREATE TEMP TABLE article (article_id INT PRIMARY KEY, article_url TEXT UNIQUE);
+CREATE TEMP TABLE article_version (article_version_id SERIAL PRIMARY KEY,
+                                   scraped_at TIMESTAMPTZ, heading TEXT, body TEXT,
+                                   body_delta TEXT, article_id INT, heading_hash TEXT,
+                                   body_hash TEXT, UNIQUE (article_id, scraped_at));
+INSERT INTO article SELECT n, 'https://www.bbc.co.uk/news/' || n
+FROM generate_series(1, %(articles)s) n;
+"""
+
+
+def make_versions(delta: bool) -> pd.DataFrame:
+    """Returns every article's versions, each a one word correction of the one before"""
+    rng = random.Random(1)
+    rows = []
+    for article_id in range(1, ARTICLE_COUNT + 1):
+        words = [f"word{rng.randrange(5000)}" for _ in range(WORDS_PER_BODY)]
+        previous = None
+        for version in range(VERSIONS_PER_ARTICLE):
+            words[rng.randrange(WORDS_PER_BODY)] = f"fix{rng.randrange(5000)}"
+            body = " ".join(words)
+            stored_delta = make_delta(previous, body) \
+                if delta and version % SNAPSHOT_EVERY else None
+            rows.append((f"2023-09-11 {version:02}:00:00+00", "Heading",
+                         None if stored_delta else body, stored_delta, article_id, "h", "b"))
+            previous = body
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def measure(conn, versions: pd.DataFrame) -> tuple[int, float]:
+    """Returns the table's bytes on disk and the seconds taken to read every latest version"""
+    with conn.cursor() as cur:
+        cur.execute("TRUNCATE article_version;")
+        copy_rows(cur, "article_version", COLUMNS, versions)
+        cur.execute("ANALYZE article_version;")
+        cur.execute("SELECT pg_total_relation_size('article_version');")
+        size = cur.fetchone()[0]
+    start = time.perf_counter()
+    get_latest_version_of_article_from_db(conn)
+    return size, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as seed_cur:
+            seed_cur.execute(SEED_SQL, {"articles": ARTICLE_COUNT})
+        results = {"plain text": measure(conn, make_versions(delta=False)),
+                   f"deltas, snapshot every {SNAPSHOT_EVERY}": measure(
+                       conn, make_versions(delta=True))}
+    finally:
+        conn.rollback()
+        conn.close()
+
+    print(f"{ARTICLE_COUNT} articles, {VERSIONS_PER_ARTICLE} one word corrections each")
+    for name, (size, seconds) in results.items():
+        print(f"{name}: {size / 1e6:.1f} MB, latest versions read in {seconds:.2f}s")
@@ -1,11 +1,23 @@
 """Main file for analysis on modified articles"""
 
-from difflib import unified_diff
-from rapidfuzz.fuzz import ratio
+from os import environ
+import json
+from rapidfuzz.fuzz import ratio, token_set_ratio
+from rapidfuzz.distance import Levenshtein
+from rapidfuzz.process import cpdist
+import numpy as np
 import pandas as pd
+from diff_engine import diff_all
 
 ARTICLES_FOR_COMPARISON = "articles_for_comparison.csv"
 TRANSFORMED_ARTICLES_FOR_ARTICLE_CHANGE = "transformed_data_for_a_c.csv"
+SIMILARITY_METRICS = {
+    "ratio": (ratio, 1),
+    "token_set_ratio": (token_set_ratio, 1),
+    # normalized_similarity scores 0 to 1, scaled to match the other metrics
+    "levenshtein": (Levenshtein.normalized_similarity, 100),
+}
+DEFAULT_METRIC = "ratio"
 
 
 def similarity(previous_version: str, current_version: str) -> float:
@@ -16,47 +28,84 @@ def similarity(previous_version: str, current_version: str) -> float:
     return result
 
 
-def adjust_for_change(symbol: str, differences: list) -> str:
-    """Adjusts the entry to reflect either the original with details removed,
-    or the update with added details"""
+def batch_similarity(previous_versions: list, current_versions: list,
+                     metric: str = DEFAULT_METRIC) -> np.ndarray:
+    """Scores every previous/current pair in one call, spread over all cores.
+    Returns ratios out of 100 in the same order as the input"""
 
-    new_differences = []
+    scorer, scale = SIMILARITY_METRICS[metric]
+    scores = cpdist(previous_versions, current_versions, scorer=scorer, workers=-1)
 
-    for word in differences:
-        # A symbol that wouldn't be used in traditional media
-        if '@@' in word:
-            new_differences.append("£$")
-        elif not word[0] == symbol:
-            new_differences.append(word)
-    # another symbol that wouldn't be used in traditional media
-    return "§%".join(new_differences)
+    return scores * scale
 
 
-def compare_data() -> None:
-    """Implores fuzzy matching to compare the two changes side by side"""
+def score_changes(article_changes: pd.DataFrame, metrics: dict = None) -> np.ndarray:
+    """Scores each change with the metric chosen for its change_type, one batch per type"""
+
+    metrics = metrics or {}
+    if "change_type" in article_changes.columns:
+        change_types = article_changes["change_type"].to_numpy()
+    else:
+        change_types = np.full(len(article_changes), "body", dtype=object)
+
+    scores = np.zeros(len(article_changes))
+    for change_type in pd.unique(change_types):
+        rows = change_types == change_type
+        scores[rows] = batch_similarity(
+            article_changes["previous"].to_numpy()[rows].tolist(),
+            article_changes["current"].to_numpy()[rows].tolist(),
+            metrics.get(change_type, DEFAULT_METRIC))
+
+    return scores
+
+
+def encode_hunks(hunks: list) -> str:
+    """Encodes diff hunks as compact json for the article_change diff column"""
+
+    return json.dumps(hunks, ensure_ascii=False, separators=(",", ":"))
+
+
+def compare_data(article_changes: pd.DataFrame = None, checkpoint: bool = False) -> pd.DataFrame:
+    """Implores fuzzy matching to compare the two changes side by side.
+    Reads the changes csv if no dataframe is passed in, and returns the changes
+    for the article_change table, also saving them to csv when checkpoint is set.
+    Errors are raised, so a failed run loads nothing."""
 
     try:
-        article_changes = pd.read_csv(ARTICLES_FOR_COMPARISON)
-
-        article_changes["similarity"] = article_changes.apply(lambda row:\
-                    similarity(row["previous"], row["current"]), axis=1)
-
-            # finds the differences between changed parts
-        article_changes["differences"] = article_changes.apply(lambda row:\
-    list(unified_diff(row["previous"].split(), row["current"].split()))[2:], axis=1)
-        article_changes["current"] = article_changes["differences"].apply(\
-            lambda x: adjust_for_change("-", x))
-        article_changes["previous"] = article_changes["differences"].apply(\
-            lambda x: adjust_for_change("+", x))
-        # format the columns
-        article_changes.drop(columns=["differences"], inplace=True)
+        if article_changes is None:
+            article_changes = pd.read_csv(ARTICLES_FOR_COMPARISON)
+        if article_changes.empty:
+            print("No changes at this time")
+            return pd.DataFrame()
+        article_changes = article_changes.copy()
+
+        body_metric = environ.get("BODY_SIMILARITY_METRIC", DEFAULT_METRIC)
+        article_changes["similarity"] = score_changes(article_changes, {
+            "heading": environ.get("HEADING_SIMILARITY_METRIC", DEFAULT_METRIC),
+            "body": body_metric, "paragraph": body_metric})
+
+        # the differences between versions, stored once as compact hunks, over just
+        # the changed paragraphs where transform narrowed them
+        workers = environ.get("DIFF_WORKERS")
+        diff_previous = article_changes.get("diff_previous",
+                                            article_changes["previous"]).fillna("")
+        diff_current = article_changes.get("diff_current", article_changes["current"]).fillna("")
+        differences = diff_all(list(zip(diff_previous, diff_current)),
+                               int(workers) if workers else None)
+        article_changes.insert(article_changes.columns.get_loc("previous"), "diff",
+                               [encode_hunks(hunks) for hunks in differences])
+        article_changes.drop(columns=[column for column in ["previous", "current",
+                                                            "diff_previous", "diff_current"]
+                                      if column in article_changes.columns], inplace=True)
         article_changes["similarity"] = article_changes["similarity"].round(2)
-        article_changes.to_csv(TRANSFORMED_ARTICLES_FOR_ARTICLE_CHANGE, index=False)
-    except KeyboardInterrupt:
-        print("User stopped.")
+        if checkpoint:
+            article_changes.to_csv(TRANSFORMED_ARTICLES_FOR_ARTICLE_CHANGE, index=False)
+        return article_changes
     except pd.errors.EmptyDataError:
         print("No changes at this time")
 
+    return pd.DataFrame()
+
 
 if __name__ == "__main__":
-    compare_data()
+    compare_data(checkpoint=True)
@@ -1,7 +1,12 @@
 """Pytest fixtures file"""
+import sys
+from pathlib import Path
 import pytest
 import pandas as pd
 
+# the shared parser is copied next to each pipeline in its docker image
+sys.path.append(str(Path(__file__).parent.parent / "shared"))
+
 @pytest.fixture
 def bbc_html():
     """bbc example html fixture"""
@@ -134,3 +139,12 @@ def mock_article_changes():
                         columns=["article_id", "article_url", \
                             "type_of_change", "previous", "current", "previous_scraped_at", "current_scraped_at", "similarity"])
 
+
+@pytest.fixture
+def mock_article_change_diffs():
+    """Fixture for mocked compared article changes, as compare_data returns them"""
+    return pd.DataFrame(data=[("1", "www.url.com", "body", '[[0,[["-","old"],["+","new"],[" ","body"]]]]',
+                               "2023-09-11 12:14:33", "2023-09-11 12:44:33", "0.99")],
+                        columns=["article_id", "article_url", "change_type", "diff",
+                                 "previous_scraped", "current_scraped", "similarity"])
+
@@ -0,0 +1,113 @@
+"""Word level diffs of article versions, spread over a process pool"""
+
+from os import cpu_count
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+
+CONTEXT_WORDS = 3
+LONG_INPUT_WORDS = 2000
+MAX_DIFF_WORDS = 20000
+POOL_MIN_PAIRS = 50
+CHUNKS_PER_WORKER = 4
+
+
+def common_affix_lengths(previous: list, current: list) -> tuple[int, int]:
+    """Returns how many words the two versions share at the start and at the end"""
+
+    shortest = min(len(previous), len(current))
+    prefix = 0
+    while prefix < shortest and previous[prefix] == current[prefix]:
+        prefix += 1
+
+    suffix = 0
+    while suffix < shortest - prefix and previous[-1 - suffix] == current[-1 - suffix]:
+        suffix += 1
+
+    return prefix, suffix
+
+
+def to_token_ids(previous: list, current: list) -> tuple[list, list]:
+    """Maps each distinct word to an int so matching compares ints, not strings"""
+
+    ids = {}
+    return ([ids.setdefault(word, len(ids)) for word in previous],
+            [ids.setdefault(word, len(ids)) for word in current])
+
+
+def grouped_opcodes(previous_words: list, current_words: list) -> tuple[list, list, list, int]:
+    """Returns the words a word diff indexes into, its grouped opcodes and the word
+    offset they start from, in the argument order of compact_hunks. Long versions
+    only match the words between their shared start and end, and past MAX_DIFF_WORDS
+    the changed middle is reported as one replacement without matching."""
+
+    if len(previous_words) + len(current_words) <= LONG_INPUT_WORDS:
+        groups = SequenceMatcher(None, previous_words, current_words)\
+            .get_grouped_opcodes(CONTEXT_WORDS)
+        return previous_words, current_words, list(groups), 0
+
+    prefix, suffix = common_affix_lengths(previous_words, current_words)
+    start = max(prefix - CONTEXT_WORDS, 0)
+    trimmed_suffix = max(suffix - CONTEXT_WORDS, 0)
+    previous_middle = previous_words[start:len(previous_words) - trimmed_suffix]
+    current_middle = current_words[start:len(current_words) - trimmed_suffix]
+
+    if len(previous_middle) + len(current_middle) > MAX_DIFF_WORDS:
+        head = prefix - start
+        previous_tail = len(previous_middle) - (suffix - trimmed_suffix)
+        current_tail = len(current_middle) - (suffix - trimmed_suffix)
+        group = [opcode for opcode in [
+            ("equal", 0, head, 0, head),
+            ("replace", head, previous_tail, head, current_tail),
+            ("equal", previous_tail, len(previous_middle), current_tail, len(current_middle))]
+                 if opcode[1] != opcode[2] or opcode[3] != opcode[4]]
+        return previous_middle, current_middle, [group], start
+
+    groups = SequenceMatcher(None, *to_token_ids(previous_middle, current_middle))\
+        .get_grouped_opcodes(CONTEXT_WORDS)
+
+    return previous_middle, current_middle, list(groups), start
+
+
+def compact_hunks(previous: list, current: list, groups: list, offset: int = 0) -> list:
+    """Returns each hunk as [word offset, [[op, text], ...]], with runs of words
+    sharing an op (" " kept, "-" removed, "+" added) joined into one text"""
+
+    hunks = []
+    for group in groups:
+        ops = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                ops.append([" ", " ".join(previous[i1:i2])])
+                continue
+            if tag in {"replace", "delete"}:
+                ops.append(["-", " ".join(previous[i1:i2])])
+            if tag in {"replace", "insert"}:
+                ops.append(["+", " ".join(current[j1:j2])])
+        hunks.append([group[0][1] + offset, ops])
+
+    return hunks
+
+
+def word_hunks(previous: str, current: str) -> list:
+    """Returns the diff of two versions word by word as compact hunks"""
+
+    return compact_hunks(*grouped_opcodes(previous.split(), current.split()))
+
+
+def diff_pair(pair: tuple) -> list:
+    """Diffs one (previous, current) pair into compact hunks, for use with executor.map"""
+
+    return word_hunks(*pair)
+
+
+def diff_all(pairs: list, workers: int = None) -> list:
+    """Diffs every (previous, current) pair, in chunks over a process pool when
+    there are enough pairs to make starting one worthwhile"""
+
+    workers = workers or cpu_count() or 1
+    if workers == 1 or len(pairs) < POOL_MIN_PAIRS:
+        return [diff_pair(pair) for pair in pairs]
+
+    chunksize = max(len(pairs) // (workers * CHUNKS_PER_WORKER), 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(diff_pair, pairs, chunksize=chunksize))
@@ -2,16 +2,25 @@
 
 from os import environ
 import datetime
+from sqlite3 import Connection
+from typing import Callable
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup as bs
 from dotenv import load_dotenv
 from psycopg2 import connect, OperationalError
 from psycopg2.extensions import connection
+from rescrape import rescrape_articles, RESCRAPE_WORKERS
+from scheduler import (select_urls_to_scrape, SCRAPE_BUDGET_SECONDS,
+                       SECONDS_PER_ARTICLE)
+from content_hash import add_content_hashes, find_changed_urls
+from bbc_parser import parse_article_text, page_text
+from feeds import FEEDS_FILE, load_registry, get_text_extractor
+from http_client import fetch, get_stats
+from version_store import rebuild_latest_versions
+from validator_cache import (get_cache_connection, get_validators, conditional_headers,
+                             is_unchanged, response_validators, VALIDATOR_COLUMNS)
 
 ARTICLES_FROM_DB = "previous_versions.csv"
 SCRAPED_ARTICLES = "scraped_articles.csv"
-TIME_NOW = datetime.datetime.now().replace(microsecond=0)
 
 
 def get_db_connection() -> connection:
@@ -44,40 +53,77 @@ def get_urls_from_article_table(conn: connection) -> list:
     return result
 
 
-def scrape_article(article_url: str) -> dict:
-    """For a given url, scrape relevant data using BS4, return as a dict"""
+def get_article_sources(conn: connection, urls: list) -> list:
+    """Returns the source each of the given articles was ingested from, in url order"""
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT article_url, source FROM article WHERE article_url = ANY(%s);",
+                    [urls])
+        sources = dict(cur.fetchall())
+
+    return [sources.get(url) for url in urls]
+
+
+def get_source_extractors(sources: list) -> list:
+    """Returns the registry's extractor for each source, defaulting to the BBC parser
+    for sources no longer in the registry"""
+
+    registry = load_registry(environ.get("FEEDS_FILE", FEEDS_FILE))
+    extractors = {source["source"]: get_text_extractor(source) for source in registry}
+
+    return [extractors.get(source, parse_article_text) for source in sources]
+
+
+def parse_article(content: bytes | str, article_url: str,
+                  extractor: Callable = parse_article_text) -> dict:
+    """Parses relevant data from an article page with its source's extractor,
+    return as a dict"""
+
+    heading, text = extractor(content)
+
+    return {"body": text,
+            "heading": heading,
+            "article_url": article_url,
+            "scraped_at": datetime.datetime.now().replace(microsecond=0)}
 
-    article_dict = {}
 
-    article = requests.get(article_url, timeout=30)
-    soup = bs(article.content, 'lxml')
-    body = soup.find('main', id='main-content')
-    headline = soup.find('h1').text
+def scrape_article(article_url: str, cache: Connection = None, updates: list = None,
+                   extractor: Callable = parse_article_text) -> dict:
+    """For a given url, scrape relevant data with its source's extractor, return as a dict.
+    With a validator cache, returns an empty dict when the article is unchanged.
+    The validators of a successful response are added to updates, to be saved once
+    the run is loaded."""
 
-    if body is not None:
-        relevant_divs = body.findAll(
-            'div', attrs={"data-component": "text-block"})
-        text = " ".join(div.find('p').text for div in relevant_divs)
-    else:
-        body = soup.find('article')
-        if body:
-            text = " ".join([p.text for p in body.findAll('p')])
+    validators = get_validators(cache, article_url) if cache else None
+    article = fetch(article_url, timeout=30, headers=conditional_headers(validators))
+    fresh = response_validators(article_url, article.status_code, article.headers,
+                                article.content)
+    if fresh and updates is not None:
+        updates.append(fresh)
 
-    article_dict["body"] = text
-    article_dict["heading"] = headline
-    article_dict["article_url"] = article_url
-    article_dict["scraped_at"] = TIME_NOW
+    if cache and is_unchanged(article.status_code, fresh, validators):
+        return {}
 
-    return article_dict
+    return parse_article(page_text(article.content, article.headers.get("Content-Type")),
+                         article_url, extractor)
 
 
-def scrape_all_articles(urls: list) -> pd.DataFrame:
-    """Scrapes article data from a list of URLs and returns a dataframe"""
+def scrape_all_articles(urls: list, cache: Connection = None, updates: list = None,
+                        extractors: list = None, settled: set = None) -> pd.DataFrame:
+    """Scrapes article data from a list of URLs and returns a dataframe.
+    Each url is parsed with the extractor at the same position in extractors,
+    defaulting to the BBC parser. Urls whose page was downloaded and parsed, or found
+    unchanged, are added to settled."""
     article_list = []
+    settled = set() if settled is None else settled
+    extractors = extractors or [parse_article_text] * len(urls)
 
-    for url in urls:
+    for url, extractor in zip(urls, extractors):
         try:
-            article = scrape_article(url)
+            article = scrape_article(url, cache, updates, extractor)
+            settled.add(url)
+            if not article:
+                continue
             if article["heading"] and article["body"]:
                 article_list.append(article)
             else:
@@ -90,55 +136,116 @@ def scrape_all_articles(urls: list) -> pd.DataFrame:
     return pd.DataFrame(article_list)
 
 
-def get_latest_version_of_article_from_db(conn: connection) -> pd.DataFrame:
-    """Returns data from rds database in a dataframe for comparison"""
+def get_latest_version_hashes(conn: connection, urls: list) -> pd.DataFrame:
+    """Returns the heading and body digests of the given articles' latest versions,
+    without pulling any article text"""
 
     with conn.cursor() as cur:
 
-        cur.execute("""SELECT article_version.body,
-                article_version.heading, article.article_url,
-                article.article_id,
-                article_version.scraped_at
-                FROM article
-                LEFT JOIN article_version
-                ON article_version.article_id = article.article_id
-                WHERE article_version.scraped_at = (SELECT MAX(article_version.scraped_at)
-                FROM article_version WHERE article.article_id = article_version.article_id)
-                GROUP BY article.article_id, article.article_url,
-                article_version.heading, article_version.body,
-                scraped_at
-                ;""")
+        cur.execute("""SELECT a.article_url, v.heading_hash, v.body_hash
+                FROM article a
+                CROSS JOIN LATERAL (SELECT heading_hash, body_hash FROM article_version
+                WHERE article_version.article_id = a.article_id
+                ORDER BY scraped_at DESC LIMIT 1) v
+                WHERE a.article_url = ANY(%s);""", [urls])
 
         data = cur.fetchall()
 
-    return pd.DataFrame(data,
-                        columns=["body", "heading", "article_url", "article_id",
-                                 "scraped_at"])
+    return pd.DataFrame(data, columns=["article_url", "heading_hash", "body_hash"])
+
+
+def get_latest_version_of_article_from_db(conn: connection, urls: list = None) -> pd.DataFrame:
+    """Returns data from rds database in a dataframe for comparison.
+    Reads each article's versions from its latest full body snapshot on, found with an
+    index lookup on article_version (article_id, scraped_at), and rebuilds the latest
+    body from any deltas stored since; pass urls to only fetch those articles."""
 
+    query = """SELECT v.body, v.body_delta, v.heading, a.article_url, a.article_id,
+                v.scraped_at, v.heading_hash, v.body_hash
+                FROM article a
+                CROSS JOIN LATERAL (SELECT scraped_at AS snapshot_at FROM article_version
+                WHERE article_version.article_id = a.article_id AND body IS NOT NULL
+                ORDER BY scraped_at DESC LIMIT 1) s
+                JOIN article_version v
+                ON v.article_id = a.article_id AND v.scraped_at >= s.snapshot_at"""
 
-def extract_data() -> None:
-    """Contains all functions in extract.py to fulfil whole extract process"""
+    with conn.cursor() as cur:
+
+        if urls is None:
+            cur.execute(query + " ORDER BY a.article_id, v.scraped_at;")
+        else:
+            cur.execute(query + """ WHERE a.article_url = ANY(%s)
+                        ORDER BY a.article_id, v.scraped_at;""", [urls])
 
+        data = cur.fetchall()
+
+    return rebuild_latest_versions(
+        pd.DataFrame(data, columns=["body", "body_delta", "heading", "article_url",
+                                    "article_id", "scraped_at", "heading_hash", "body_hash"]))
+
+
+def extract_data(checkpoint: bool = False,
+                 conn: connection = None) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Contains all functions in extract.py to fulfil whole extract process.
+    Returns the scraped articles, their previous versions and the articles whose page
+    was fetched and parsed, or found unchanged, with their new validators, for load_data to record once
+    the run is loaded. Errors are raised, so a failed run records nothing. Each article is parsed with the extractor the feeds registry gives its
+    source. The articles and versions are also saved to csv when checkpoint is set.
+    A connection passed in is left open for the caller to reuse."""
+
+    scraped_article_information = pd.DataFrame()
+    previous_versions = pd.DataFrame()
+    url_list = []
+    updates = []
+    settled = set()
+    db_conn = None
     try:
-        db_conn = get_db_connection()
+        db_conn = conn or get_db_connection()
 
-        url_list = get_urls_from_article_table(db_conn)
-        scraped_article_information = pd.DataFrame()
-        previous_versions = pd.DataFrame()
+        url_list = select_urls_to_scrape(
+            db_conn,
+            budget_seconds=float(environ.get("SCRAPE_BUDGET_SECONDS", SCRAPE_BUDGET_SECONDS)),
+            seconds_per_article=float(environ.get("SECONDS_PER_ARTICLE", SECONDS_PER_ARTICLE)))
         if len(url_list) > 0:
-            scraped_article_information = scrape_all_articles(url_list)
-            previous_versions = get_latest_version_of_article_from_db(db_conn)
-
-        scraped_article_information.to_csv(SCRAPED_ARTICLES, index=False)
-        previous_versions.to_csv(ARTICLES_FROM_DB, index=False)
-    except KeyboardInterrupt:
-        print("User stopped.")
-    except Exception as exc:
-        print(exc)
+            extractors = get_source_extractors(get_article_sources(db_conn, url_list))
+            url_extractors = dict(zip(url_list, extractors))
+            cache = get_cache_connection()
+            try:
+                if environ.get("RESCRAPE_MODE") == "async":
+                    scraped_article_information, stats = rescrape_articles(
+                        url_list,
+                        lambda content, url: parse_article(content, url, url_extractors[url]),
+                        cache=cache, updates=updates, settled=settled,
+                        workers=int(environ.get("RESCRAPE_WORKERS", RESCRAPE_WORKERS)))
+                    print(f"Re-scrape stats: {stats}")
+                else:
+                    scraped_article_information = scrape_all_articles(url_list, cache, updates,
+                                                                      extractors, settled)
+                    print(f"Re-scrape http stats: {get_stats()}")
+            finally:
+                cache.close()
+            if not scraped_article_information.empty:
+                scraped_article_information = add_content_hashes(scraped_article_information)
+                previous_hashes = get_latest_version_hashes(
+                    db_conn, list(scraped_article_information["article_url"]))
+                changed_urls = find_changed_urls(scraped_article_information, previous_hashes)
+                previous_versions = get_latest_version_of_article_from_db(db_conn, changed_urls)
+
+        if checkpoint:
+            scraped_article_information.to_csv(SCRAPED_ARTICLES, index=False)
+            previous_versions.to_csv(ARTICLES_FROM_DB, index=False)
     finally:
-        db_conn.close()
+        if conn is None and db_conn is not None:
+            db_conn.close()
+
+    # pages that failed to download or parse stay due, so are not marked as checked
+    checked = [url for url in url_list if url in settled]
+    checks = pd.DataFrame({"article_url": pd.Series(checked, dtype=object)}).merge(
+        pd.DataFrame(updates, columns=VALIDATOR_COLUMNS), how="left", on="article_url")
+
+    return scraped_article_information, previous_versions, checks
 
 
 if __name__ == "__main__":
 
-    extract_data()
+    extract_data(checkpoint=True)
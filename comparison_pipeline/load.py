@@ -5,62 +5,180 @@ from dotenv import load_dotenv
 import pandas as pd
 from psycopg2 import connect
 from psycopg2.extensions import connection
-from psycopg2.extras import execute_values
 from extract import get_db_connection
+from db_load import copy_rows, record_pipeline_run
+from content_hash import add_content_hashes, paragraph_hashes, to_pg_array
+from version_store import add_body_deltas, SNAPSHOT_EVERY
+from validator_cache import save_validators
+from scheduler import record_checks
 
 
 TRANSFORMED_ARTICLES_FOR_ARTICLE_VERSION = "transformed_data_for_a_v.csv"
 TRANSFORMED_ARTICLES_FOR_ARTICLE_CHANGE = "transformed_data_for_a_c.csv"
 
 
-def add_to_article_version_table(conn: connection, df: pd.DataFrame) -> None:
-    """Converts df into tuples, then adds to article_version table."""
+def add_to_article_version_table(conn: connection, df: pd.DataFrame,
+                                 snapshot_every: int = SNAPSHOT_EVERY) -> None:
+    """Copies df, with heading, body and paragraph digests, into a staging table, then adds
+    any versions not already stored to the article_version table.
+    Rows with a body_delta are stored as that delta, except every snapshot_every-th
+    version of an article, which keeps its full body."""
+
+    if "body_delta" not in df.columns:
+        df = df.assign(body_delta=None)
+    df = add_content_hashes(df[["scraped_at", "heading", "body", "article_id", "body_delta"]])
+    df["paragraph_hashes"] = df["body"].map(paragraph_hashes).map(to_pg_array)
 
     with conn.cursor() as cur:
-        changes = df.to_records(index=False)
-        execute_values(cur, """INSERT INTO article_version
-                    (scraped_at, heading, body, article_id)
-                    VALUES %s;""", changes)
-        conn.commit()
+        cur.execute("""CREATE TEMP TABLE IF NOT EXISTS staging_article_version
+                    (scraped_at TIMESTAMPTZ, heading TEXT, body TEXT, article_id INT,
+                    body_delta TEXT, heading_hash TEXT, body_hash TEXT,
+                    paragraph_hashes TEXT[])
+                    ON COMMIT DROP;""")
+        copy_rows(cur, "staging_article_version",
+                  ["scraped_at", "heading", "body", "article_id", "body_delta",
+                   "heading_hash", "body_hash", "paragraph_hashes"], df)
+        cur.execute("""INSERT INTO article_version (scraped_at, heading, body, body_delta,
+                    article_id, heading_hash, body_hash, paragraph_hashes)
+                    SELECT s.scraped_at, s.heading,
+                    CASE WHEN s.body_delta IS NULL OR chain.deltas >= %(deltas)s
+                        THEN s.body END,
+                    CASE WHEN s.body_delta IS NOT NULL AND chain.deltas < %(deltas)s
+                        THEN s.body_delta END,
+                    s.article_id, s.heading_hash, s.body_hash, s.paragraph_hashes
+                    FROM staging_article_version s
+                    CROSS JOIN LATERAL (SELECT COUNT(*) AS deltas FROM article_version v
+                    WHERE v.article_id = s.article_id AND v.scraped_at >
+                    (SELECT MAX(scraped_at) FROM article_version w
+                    WHERE w.article_id = s.article_id AND w.body IS NOT NULL)) chain
+                    ON CONFLICT (article_id, scraped_at) DO NOTHING;""",
+                    {"deltas": snapshot_every - 1})
 
 
 def add_to_article_change_table(conn: connection, df: pd.DataFrame) -> None:
-    """Converts df into tuples, then adds to article_change table."""
+    """Copies df into a staging table, then adds any changes not already stored
+    to the article_change table. The changes added are kept in new_article_change
+    until commit, for refresh_change_summaries."""
 
     with conn.cursor() as cur:
-        changes = df.to_records(index=False)
-        execute_values(cur, """INSERT INTO changes.article_change (article_id, \
-                    article_url, change_type, previous_version, current_version,\
-                    last_scraped, current_scraped, similarity) VALUES %s;""", \
-                        changes)
-        conn.commit()
-
+        cur.execute("""CREATE TEMP TABLE IF NOT EXISTS staging_article_change
+                    (article_id INT, article_url TEXT, change_type changes.change_types,
+                    diff JSONB, last_scraped TIMESTAMPTZ, current_scraped TIMESTAMPTZ,
+                    similarity FLOAT)
+                    ON COMMIT DROP;
+                    CREATE TEMP TABLE IF NOT EXISTS new_article_change
+                    (article_id INT, article_url TEXT, change_type changes.change_types,
+                    similarity FLOAT)
+                    ON COMMIT DROP;""")
+        copy_rows(cur, "staging_article_change",
+                  ["article_id", "article_url", "change_type", "diff", "last_scraped",
+                   "current_scraped", "similarity"], df)
+        cur.execute("""WITH inserted AS (INSERT INTO changes.article_change (article_id,
+                    article_url, change_type, diff, last_scraped, current_scraped, similarity)
+                    SELECT article_id, article_url, change_type, diff, last_scraped,
+                    current_scraped, similarity
+                    FROM staging_article_change
+                    ON CONFLICT (article_id, change_type, current_scraped) DO NOTHING
+                    RETURNING article_id, article_url, change_type, similarity)
+                    INSERT INTO new_article_change SELECT * FROM inserted;""")
+
+
+def refresh_change_summaries(conn: connection) -> None:
+    """Adds the changes in new_article_change to the dashboard's summary tables:
+    counts per change type, per article, per author, and articles per change count.
+    Only the articles and authors in the batch are touched."""
 
-def load_data() -> None:
-    """Combines functions in load.py to execute whole load process"""
+    with conn.cursor() as cur:
+        cur.execute("""INSERT INTO changes.change_type_count (change_type, change_count)
+                    SELECT change_type, COUNT(*) FROM new_article_change
+                    WHERE change_type IS NOT NULL GROUP BY change_type
+                    ON CONFLICT (change_type) DO UPDATE SET change_count =
+                    change_type_count.change_count + EXCLUDED.change_count;""")
+        # articles leave the histogram bucket of their old count, then join their new one
+        cur.execute("""UPDATE changes.change_count_histogram h
+                    SET article_count = h.article_count - moved.articles
+                    FROM (SELECT c.change_count, COUNT(*) AS articles
+                    FROM changes.article_change_count c
+                    WHERE c.article_id IN (SELECT article_id FROM new_article_change)
+                    GROUP BY c.change_count) moved
+                    WHERE h.change_count = moved.change_count;""")
+        cur.execute("""INSERT INTO changes.article_change_count (article_id, article_url,
+                    change_count, min_similarity)
+                    SELECT article_id, MIN(article_url), COUNT(*), MIN(similarity)
+                    FROM new_article_change GROUP BY article_id
+                    ON CONFLICT (article_id) DO UPDATE SET
+                    change_count = article_change_count.change_count + EXCLUDED.change_count,
+                    min_similarity = LEAST(article_change_count.min_similarity,
+                    EXCLUDED.min_similarity);""")
+        cur.execute("""INSERT INTO changes.change_count_histogram (change_count, article_count)
+                    SELECT change_count, COUNT(*) FROM changes.article_change_count
+                    WHERE article_id IN (SELECT article_id FROM new_article_change)
+                    GROUP BY change_count
+                    ON CONFLICT (change_count) DO UPDATE SET article_count =
+                    change_count_histogram.article_count + EXCLUDED.article_count;
+                    DELETE FROM changes.change_count_histogram WHERE article_count = 0;""")
+        cur.execute("""INSERT INTO changes.author_change_count (author_id, change_count)
+                    SELECT aa.author_id, COUNT(*) FROM new_article_change n
+                    JOIN article_author aa ON aa.article_id = n.article_id
+                    GROUP BY aa.author_id
+                    ON CONFLICT (author_id) DO UPDATE SET change_count =
+                    author_change_count.change_count + EXCLUDED.change_count;""")
+
+
+def load_data(article_version: pd.DataFrame = None, article_change: pd.DataFrame = None,
+              previous_versions: pd.DataFrame = None, checks: pd.DataFrame = None,
+              conn: connection = None) -> None:
+    """Combines functions in load.py to execute whole load process.
+    Reads the transformed csv files for any dataframe not passed in.
+    Versions, changes and the dashboard's change summaries are written in one
+    transaction, and re-loading the same batch adds nothing. With VERSION_STORAGE
+    set to delta and the previous versions passed in, bodies are stored as deltas
+    against them. The articles checked, when passed, are marked as checked in the same
+    transaction, and the validators of the pages fetched are saved to the validator
+    cache only after it commits, so a failed load leaves the next run to fetch and
+    compare those articles again.
+    A connection passed in is left open for the caller to reuse."""
 
     try:
         load_dotenv()
-        db_conn = get_db_connection()
+        db_conn = conn or get_db_connection()
 
-        article_version = pd.read_csv(TRANSFORMED_ARTICLES_FOR_ARTICLE_VERSION)
-        article_change = pd.read_csv(TRANSFORMED_ARTICLES_FOR_ARTICLE_CHANGE)
+        if article_version is None:
+            article_version = pd.read_csv(TRANSFORMED_ARTICLES_FOR_ARTICLE_VERSION)
+        if article_change is None:
+            article_change = pd.read_csv(TRANSFORMED_ARTICLES_FOR_ARTICLE_CHANGE)
 
+        article_version = article_version.copy()
+        article_change = article_change.copy()
         if not article_version.empty:
             article_version["article_id"] = article_version["article_id"].map(str)
-            add_to_article_version_table(db_conn, article_version)
+            if environ.get("VERSION_STORAGE") == "delta" and previous_versions is not None:
+                article_version = add_body_deltas(article_version, previous_versions)
+            add_to_article_version_table(
+                db_conn, article_version,
+                int(environ.get("SNAPSHOT_EVERY", SNAPSHOT_EVERY)))
         if not article_change.empty:
             article_change["article_id"] = article_change["article_id"].map(str)
             article_change["similarity"] = article_change["similarity"].map(str)
             add_to_article_change_table(db_conn, article_change)
+            refresh_change_summaries(db_conn)
+        if checks is not None:
+            record_checks(db_conn, list(checks["article_url"]))
+        record_pipeline_run(db_conn, "comparison")
+        db_conn.commit()
+        if checks is not None:
+            save_validators(checks.dropna(subset=["content_hash"]))
     except KeyboardInterrupt:
+        db_conn.rollback()
         print("User stopped.")
     except pd.errors.EmptyDataError:
         print("No changes at this time")
     except Exception as exc:
+        db_conn.rollback()
         print(exc)
     finally:
-        db_conn.close()
+        if conn is None:
+            db_conn.close()
 
 
 if __name__ == "__main__":
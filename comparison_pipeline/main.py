@@ -1,5 +1,7 @@
 """Main file to be called once"""
 
+from os import environ
+from dotenv import load_dotenv
 from extract import extract_data
 from transform import transform_data
 from compare import compare_data
@@ -8,10 +10,13 @@ from load import load_data
 
 if __name__ == "__main__":
 
-    extract_data()
+    load_dotenv()
+    checkpoint = environ.get("CSV_CHECKPOINTS", "false").lower() == "true"
 
-    transform_data()
+    scraped_articles, previous_versions, checks = extract_data(checkpoint)
 
-    compare_data()
+    changes, article_versions = transform_data(scraped_articles, previous_versions, checkpoint)
 
-    load_data()
+    article_changes = compare_data(changes, checkpoint)
+
+    load_data(article_versions, article_changes, previous_versions, checks)
@@ -0,0 +1,126 @@
+"""Async bulk re-scraper used to refresh every stored article"""
+
+import asyncio
+from sqlite3 import Connection
+from time import monotonic, perf_counter
+from typing import Callable
+from urllib.parse import urlparse
+import aiohttp
+import pandas as pd
+from bbc_parser import page_text
+from validator_cache import get_validators, conditional_headers, is_unchanged, response_validators
+
+RESCRAPE_WORKERS = 20
+REQUESTS_PER_SECOND_PER_DOMAIN = 10
+CONNECTIONS_PER_HOST = 20
+REQUEST_TIMEOUT = 30
+
+
+class DomainRateLimiter:
+    """Spaces out the start of requests to each domain.
+    Only used from a single event loop, so no locking is needed."""
+
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second
+        self.next_slot = {}
+
+    async def wait(self, url: str) -> None:
+        """Sleeps until the url's domain has a free request slot"""
+        domain = urlparse(url).netloc
+        now = monotonic()
+        slot = max(now, self.next_slot.get(domain, now))
+        self.next_slot[domain] = slot + self.interval
+        await asyncio.sleep(slot - now)
+
+
+def summarise_run(latencies: list, failures: int, elapsed: float) -> dict:
+    """Returns throughput and latency statistics for one re-scrape run"""
+
+    latency_series = pd.Series(latencies, dtype=float)
+    pages = len(latencies)
+
+    return {"pages": pages,
+            "failures": failures,
+            "seconds": round(elapsed, 2),
+            "pages_per_second": round(pages / elapsed, 2) if elapsed else 0.0,
+            "p50_latency": round(latency_series.quantile(0.5), 3) if pages else None,
+            "p95_latency": round(latency_series.quantile(0.95), 3) if pages else None}
+
+
+async def rescrape_worker(session: aiohttp.ClientSession, limiter: DomainRateLimiter,
+                          queue: asyncio.Queue, parse: Callable, results: list,
+                          latencies: list, cache: Connection | None,
+                          updates: list | None) -> None:
+    """Fetches and parses queued urls until the queue is empty.
+    Unchanged articles in the validator cache are left as empty dicts, and the
+    validators of successful responses are added to updates."""
+
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            position, url = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        try:
+            validators = get_validators(cache, url) if cache else None
+            await limiter.wait(url)
+            start = perf_counter()
+            async with session.get(url, headers=conditional_headers(validators)) as response:
+                content = await response.read()
+            latencies.append(perf_counter() - start)
+            fresh = response_validators(url, response.status, response.headers, content)
+            if fresh and updates is not None:
+                updates.append(fresh)
+            if cache and is_unchanged(response.status, fresh, validators):
+                results[position] = {}
+                continue
+            text = page_text(content, response.headers.get("Content-Type"))
+            results[position] = await loop.run_in_executor(None, parse, text, url)
+        except Exception as exc:
+            print(f"{url}: {exc}")
+
+
+async def rescrape_all(urls: list, parse: Callable, workers: int,
+                       requests_per_second: float,
+                       cache: Connection | None,
+                       updates: list | None) -> tuple[list, list, float]:
+    """Re-scrapes urls with a pool of workers sharing one keep-alive session"""
+
+    queue = asyncio.Queue()
+    for position, url in enumerate(urls):
+        queue.put_nowait((position, url))
+    results = [None] * len(urls)
+    latencies = []
+    limiter = DomainRateLimiter(requests_per_second)
+    connector = aiohttp.TCPConnector(limit=workers, limit_per_host=CONNECTIONS_PER_HOST)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+
+    start = perf_counter()
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await asyncio.gather(*(rescrape_worker(session, limiter, queue, parse,
+                                               results, latencies, cache, updates)
+                               for _ in range(workers)))
+
+    return results, latencies, perf_counter() - start
+
+
+def rescrape_articles(urls: list, parse: Callable, workers: int = RESCRAPE_WORKERS,
+                      requests_per_second: float = REQUESTS_PER_SECOND_PER_DOMAIN,
+                      cache: Connection = None, updates: list = None,
+                      settled: set = None) -> tuple[pd.DataFrame, dict]:
+    """Re-scrapes every url and returns the articles, in url order, with run statistics.
+    parse is called with the decoded page and url and returns the article dict.
+    Urls whose page was downloaded and parsed, or found unchanged, are added to settled."""
+
+    results, latencies, elapsed = asyncio.run(
+        rescrape_all(urls, parse, workers, requests_per_second, cache, updates))
+    if settled is not None:
+        settled.update(url for url, article in zip(urls, results) if article is not None)
+
+    articles = [article for article in results
+                if article and article.get("heading") and article.get("body")]
+    unchanged = sum(1 for article in results if article == {})
+    stats = summarise_run(latencies, len(urls) - len(articles) - unchanged, elapsed)
+    stats["unchanged"] = unchanged
+
+    return pd.DataFrame(articles), stats
@@ -0,0 +1,92 @@
+"""Chooses which stored articles are worth re-scraping on each comparison run"""
+
+import numpy as np
+import pandas as pd
+from psycopg2.extensions import connection
+
+SCRAPE_BUDGET_SECONDS = 1200
+SECONDS_PER_ARTICLE = 0.5
+MIN_CHECK_INTERVAL_MINUTES = 30
+MAX_CHECK_INTERVAL_MINUTES = 7 * 24 * 60
+AGE_HALF_LIFE_HOURS = 24
+
+
+def get_schedule_candidates(conn: connection) -> pd.DataFrame:
+    """Returns every article with its version, change and check history"""
+
+    with conn.cursor() as cur:
+        cur.execute("""SELECT a.article_id, a.article_url, a.created_at,
+                    v.last_version, COALESCE(v.version_count, 0),
+                    COALESCE(c.change_count, 0), ch.last_checked
+                    FROM article a
+                    LEFT JOIN (SELECT article_id, MAX(scraped_at) AS last_version,
+                    COUNT(*) AS version_count FROM article_version
+                    GROUP BY article_id) v ON v.article_id = a.article_id
+                    LEFT JOIN (SELECT article_id, COUNT(*) AS change_count
+                    FROM changes.article_change GROUP BY article_id) c
+                    ON c.article_id = a.article_id
+                    LEFT JOIN article_check ch ON ch.article_id = a.article_id;""")
+        data = cur.fetchall()
+
+    return pd.DataFrame(data, columns=["article_id", "article_url", "created_at",
+                                       "last_version", "version_count", "change_count",
+                                       "last_checked"])
+
+
+def check_interval(stable_minutes: pd.Series) -> pd.Series:
+    """Returns minutes to wait between checks. The interval doubles each time an
+    article's content has stayed the same for another interval."""
+
+    doublings = np.floor(np.log2(np.maximum(stable_minutes / MIN_CHECK_INTERVAL_MINUTES, 1)))
+
+    return np.minimum(MIN_CHECK_INTERVAL_MINUTES * 2 ** doublings, MAX_CHECK_INTERVAL_MINUTES)
+
+
+def score_articles(candidates: pd.DataFrame, now: pd.Timestamp) -> pd.DataFrame:
+    """Adds a change likelihood score and whether each article is due a check"""
+
+    scored = candidates.copy()
+    created_at = pd.to_datetime(scored["created_at"], utc=True)
+    last_version = pd.to_datetime(scored["last_version"], utc=True).fillna(created_at)
+    last_checked = pd.to_datetime(scored["last_checked"], utc=True)
+
+    age_hours = (now - created_at).dt.total_seconds() / 3600
+    stable_minutes = (now - last_version).dt.total_seconds() / 60
+    since_checked = (now - last_checked).dt.total_seconds() / 60
+
+    change_rate = (scored["change_count"] + 1) / (scored["version_count"] + 2)
+    scored["score"] = change_rate * 0.5 ** (age_hours.clip(lower=0) / AGE_HALF_LIFE_HOURS)
+    scored["due"] = last_checked.isna() | (since_checked >= check_interval(stable_minutes))
+
+    return scored
+
+
+def articles_within_budget(budget_seconds: float, seconds_per_article: float) -> int:
+    """Returns how many articles can be re-scraped within the time budget"""
+
+    return max(int(budget_seconds // seconds_per_article), 0)
+
+
+def select_urls_to_scrape(conn: connection, budget_seconds: float = SCRAPE_BUDGET_SECONDS,
+                          seconds_per_article: float = SECONDS_PER_ARTICLE) -> list:
+    """Returns the urls of the due articles most likely to have changed, up to the budget"""
+
+    candidates = get_schedule_candidates(conn)
+    if candidates.empty:
+        return []
+
+    scored = score_articles(candidates, pd.Timestamp.now(tz="UTC"))
+    due = scored[scored["due"]].sort_values("score", ascending=False)
+
+    return list(due["article_url"].head(articles_within_budget(budget_seconds,
+                                                               seconds_per_article)))
+
+
+def record_checks(conn: connection, urls: list) -> None:
+    """Marks the given articles as checked now. Committed by the caller."""
+
+    with conn.cursor() as cur:
+        cur.execute("""INSERT INTO article_check (article_id, last_checked)
+                    SELECT article_id, NOW() FROM article WHERE article_url = ANY(%s)
+                    ON CONFLICT (article_id) DO UPDATE
+                    SET last_checked = EXCLUDED.last_checked;""", [urls])
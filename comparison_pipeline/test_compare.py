@@ -0,0 +1,76 @@
+# pylint: skip-file
+"""
+Tests compare.py functionality
+"""
+import json
+from unittest.mock import patch
+import pytest
+import pandas as pd
+from conftest import mock_article_changes
+from compare import similarity, batch_similarity, score_changes, compare_data
+
+
+def test_similarity_identical_text():
+    """Tests that identical versions are 100% similar"""
+    assert similarity("some body text", "some body text") == 100
+
+
+def test_batch_similarity_matches_row_by_row():
+    """Tests that batched scores are the same as scoring each pair in turn"""
+    previous = ["old body text", "a heading", "same"]
+    current = ["new body text", "a new heading", "same"]
+    expected = [similarity(old, new) for old, new in zip(previous, current)]
+    assert list(batch_similarity(previous, current)) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("metric, expected", [
+    ("token_set_ratio", 100),
+    ("levenshtein", 100 * 11 / 13),
+])
+def test_batch_similarity_other_metrics(metric, expected):
+    """Tests that the extra metrics score out of 100"""
+    assert batch_similarity(["police said x"], ["police said"], metric)[0] == pytest.approx(expected)
+
+
+def test_score_changes_uses_metric_per_change_type():
+    """Tests that headings and bodies are each scored with their own metric"""
+    changes = pd.DataFrame({"change_type": ["heading", "body", "heading"],
+                            "previous": ["b a", "b a", "x"],
+                            "current": ["a b", "a b", "x"]})
+    scores = score_changes(changes, {"heading": "token_set_ratio"})
+    assert list(scores) == pytest.approx([100, 33.33, 100], abs=0.01)
+
+
+@patch("compare.pd.read_csv")
+def test_compare_data_in_memory(mock_read, mock_article_changes):
+    """Tests that a dataframe passed in is compared without touching csv files"""
+    result = compare_data(mock_article_changes)
+    assert mock_read.call_count == 0
+    assert result.shape[0] == 1
+    assert 0 < result["similarity"][0] < 100
+    assert json.loads(result["diff"][0]) == [[0, [["-", "old"], ["+", "new"], [" ", "body"]]]]
+    assert list(result.columns) == ["article_id", "article_url", "type_of_change", "diff",
+                                    "previous_scraped_at", "current_scraped_at", "similarity"]
+
+
+def test_compare_data_no_changes():
+    """Tests that no changes gives an empty dataframe"""
+    result = compare_data(pd.DataFrame())
+    assert result.empty
+
+
+def test_compare_data_scores_full_bodies_and_diffs_paragraphs():
+    """Tests that an inserted paragraph is scored against the whole body, while only
+    the narrowed paragraphs are diffed"""
+    previous = "first paragraph here\nsecond paragraph here"
+    current = "first paragraph here\nan inserted paragraph\nsecond paragraph here"
+    changes = pd.DataFrame([{"article_id": 1, "article_url": "www.url.com",
+                             "change_type": "paragraph", "previous": previous,
+                             "current": current, "previous_scraped": "then",
+                             "current_scraped": "now", "diff_previous": "",
+                             "diff_current": "an inserted paragraph"}])
+    result = compare_data(changes)
+    assert result.iloc[0]["similarity"] > 50
+    assert json.loads(result.iloc[0]["diff"]) == [[0, [["+", "an inserted paragraph"]]]]
+    assert "diff_previous" not in result.columns
+    assert "previous" not in result.columns
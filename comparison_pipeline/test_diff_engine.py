@@ -0,0 +1,69 @@
+# pylint: skip-file
+"""
+Tests diff_engine.py functionality
+"""
+from difflib import SequenceMatcher
+from unittest.mock import patch
+import random
+from diff_engine import word_hunks, compact_hunks, diff_all, common_affix_lengths, CONTEXT_WORDS
+
+WORDS = ["police", "said", "the", "minister", "report", "week", "council"]
+
+
+def make_pair(words: int, seed: int = 1) -> tuple[str, str]:
+    """Builds a version and an edited copy of it"""
+    rng = random.Random(seed)
+    previous = [rng.choice(WORDS) + str(rng.randrange(100)) for _ in range(words)]
+    current = list(previous)
+    current[words // 3] = "changed"
+    current.insert(2 * words // 3, "inserted")
+    return " ".join(previous), " ".join(current)
+
+
+def full_match_hunks(previous: str, current: str) -> list:
+    """Hunks from matching every word of both versions, without trimming"""
+    previous_words, current_words = previous.split(), current.split()
+    groups = SequenceMatcher(None, previous_words, current_words)\
+        .get_grouped_opcodes(CONTEXT_WORDS)
+    return compact_hunks(previous_words, current_words, list(groups))
+
+
+def test_short_versions_match_full_diff():
+    """Tests that short versions are diffed over every word"""
+    previous, current = make_pair(200)
+    assert word_hunks(previous, current) == full_match_hunks(previous, current)
+
+
+def test_long_versions_match_full_diff():
+    """Tests that trimming the shared start and end gives the same hunks"""
+    previous, current = make_pair(3000)
+    assert word_hunks(previous, current) == full_match_hunks(previous, current)
+
+
+def test_identical_versions_have_no_hunks():
+    """Tests that unchanged long versions give no differences"""
+    previous, _ = make_pair(3000)
+    assert word_hunks(previous, previous) == []
+
+
+@patch("diff_engine.MAX_DIFF_WORDS", 10)
+def test_capped_versions_become_one_replacement():
+    """Tests that past the cap the changed middle is replaced without matching"""
+    previous, current = make_pair(3000)
+    result = word_hunks(previous, current)
+    assert len(result) == 1
+    ops = result[0][1]
+    assert [op for op, _ in ops] == [" ", "-", "+", " "]
+    assert "changed" in ops[2][1]
+    assert "inserted" in ops[2][1]
+
+
+def test_common_affix_lengths_do_not_overlap():
+    """Tests that a repeated word is not counted as both start and end"""
+    assert common_affix_lengths(["a", "a"], ["a", "a", "a"]) == (2, 0)
+
+
+def test_diff_all_pool_matches_inline():
+    """Tests that diffing in a process pool gives the same results in order"""
+    pairs = [make_pair(100, seed) for seed in range(60)]
+    assert diff_all(pairs, workers=2) == diff_all(pairs, workers=1)
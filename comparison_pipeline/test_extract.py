@@ -3,36 +3,49 @@
 Tests extract.py functionality
 """
 
+import json
 import requests
 import pytest
 import pandas as pd
 from unittest.mock import MagicMock, patch
 from conftest import bbc_article_dict, bbc_html, bbc_sport_dict, bbc_sport_html
-from extract import get_db_connection, get_urls_from_article_table, scrape_article, scrape_all_articles, extract_data, get_latest_version_of_article_from_db
+from validator_cache import get_cache_connection, store_validators, get_validators, hash_content
+from content_hash import add_content_hashes
+from bbc_parser import parse_article_text
+from extract import get_db_connection, get_urls_from_article_table, scrape_article, parse_article, scrape_all_articles, extract_data, get_latest_version_of_article_from_db, get_article_sources, get_source_extractors
 
 
 class TestScrapeArticle:
     """Tests for scrape_article function"""
 
-    @patch("extract.requests.get")
+    @patch("extract.fetch")
     def test_scrape_article_returns_dict(self, mock_request, bbc_html, bbc_article_dict):
         """Tests function returns a dict"""
         mock_response = MagicMock()
-        mock_response.content = bbc_html
+        mock_response.content = bbc_html.encode("utf-8")
+        mock_response.headers = {"Content-Type": "text/html; charset=utf-8"}
         mock_request.return_value = mock_response
 
         result = scrape_article("www.fakeurl.com")
         assert mock_request.call_count == 1
         assert isinstance(result, dict)
         assert all(key in result for key in ["heading", "scraped_at", "body", "article_url"])
-        
 
+    def test_parse_article_keeps_paragraphs(self):
+        """Tests that text blocks are kept as separate paragraphs"""
+        html = ("<main id=\"main-content\"><h1>headline</h1>"
+                "<div data-component=\"text-block\"><p>first\nline</p></div>"
+                "<div data-component=\"text-block\"><p>second</p></div></main>")
+        result = parse_article(html, "www.fakeurl.com")
+        assert result["body"] == "first line\nsecond"
 
-    @patch("extract.requests.get")
+
+    @patch("extract.fetch")
     def test_scrape_bbc_sport(self, mock_request, bbc_sport_html, bbc_sport_dict):
         """Tests returns a dict for bbc sport article html"""
         mock_response = MagicMock()
-        mock_response.content = bbc_sport_html
+        mock_response.content = bbc_sport_html.encode("utf-8")
+        mock_response.headers = {"Content-Type": "text/html; charset=utf-8"}
         mock_request.return_value = mock_response
 
         result = scrape_article("fakeurl.com")
@@ -41,8 +54,46 @@ class TestScrapeArticle:
         assert all(key in result for key in ["heading", "scraped_at", "body", "article_url"])
     
 
-    def test_scrape_invalid_url(self):
-        """Tests invalid url raises an exception"""
+    @patch("extract.fetch")
+    def test_scrape_article_uses_declared_charset(self, mock_request):
+        """Tests that a page is decoded with the charset in its Content-Type"""
+        html = ("<main id=\"main-content\"><h1>Café</h1>"
+                "<div data-component=\"text-block\"><p>crème</p></div></main>")
+        mock_request.return_value.content = html.encode("iso-8859-1")
+        mock_request.return_value.headers = {"Content-Type": "text/html; charset=iso-8859-1"}
+
+        result = scrape_article("www.fakeurl.com")
+        assert result["heading"] == "Café"
+        assert result["body"] == "crème"
+
+    @patch("extract.fetch")
+    def test_scrape_unchanged_article_skips_parsing(self, mock_request):
+        """Tests that a 304 from a cached article returns an empty dict"""
+        mock_request.return_value.status_code = 304
+        cache = get_cache_connection(":memory:")
+        store_validators(cache, "www.fakeurl.com", '"v1"', None, "hash")
+
+        result = scrape_article("www.fakeurl.com", cache)
+        assert result == {}
+        assert mock_request.call_args.kwargs["headers"] == {"If-None-Match": '"v1"'}
+
+    @patch("extract.parse_article")
+    @patch("extract.fetch")
+    def test_scrape_article_stages_validators(self, mock_request, mock_parse):
+        """Tests that a fetched page's validators are staged, not written to the cache"""
+        mock_request.return_value.status_code = 200
+        mock_request.return_value.headers = {"ETag": '"v2"'}
+        mock_request.return_value.content = b"<html></html>"
+        cache = get_cache_connection(":memory:")
+        updates = []
+
+        scrape_article("www.fakeurl.com", cache, updates)
+        assert updates == [("www.fakeurl.com", '"v2"', None, hash_content(b"<html></html>"))]
+        assert get_validators(cache, "www.fakeurl.com") is None
+
+    @patch("http_client.sleep")
+    def test_scrape_invalid_url(self, mock_sleep):
+        """Tests invalid url raises an exception once retries run out"""
         with pytest.raises(requests.exceptions.ConnectionError):
             scrape_article("https://www.not-a-url.commm")
 
@@ -76,6 +127,39 @@ class TestScrapeAllArticles:
         assert result.shape[0]==0
 
 
+class TestSourceExtractors:
+    """Tests for choosing each article's extractor by its source"""
+
+    def test_get_article_sources_in_url_order(self):
+        """Tests that sources come back in url order, with None for unknown urls"""
+        mock_conn = MagicMock()
+        mock_conn.cursor().__enter__().fetchall.return_value = [("url2", "Sky"), ("url1", "BBC")]
+        assert get_article_sources(mock_conn, ["url1", "url2", "url3"]) == ["BBC", "Sky", None]
+
+    @patch("extract.fetch")
+    def test_non_bbc_source_uses_registry_rules(self, mock_request, tmp_path, monkeypatch):
+        """Tests that an article from a rules source is parsed with its XPath rules"""
+        registry = tmp_path / "feeds.json"
+        registry.write_text(json.dumps([
+            {"source": "BBC", "feeds": [], "extractor": "bbc"},
+            {"source": "Sky", "feeds": [],
+             "extractor": {"headline": "//h1", "body": "//div[@class='sdc-article-body']/p"}}]))
+        monkeypatch.setenv("FEEDS_FILE", str(registry))
+        mock_request.return_value.headers = {"Content-Type": "text/html; charset=utf-8"}
+        mock_request.return_value.content = (
+            b"<html><body><h1>Sky headline</h1><div class='sdc-article-body'>"
+            b"<p>first</p><p>second</p></div></body></html>")
+
+        result = scrape_all_articles(["https://news.sky.com/story/1"],
+                                     extractors=get_source_extractors(["Sky"]))
+        assert result.iloc[0]["heading"] == "Sky headline"
+        assert result.iloc[0]["body"] == "first\nsecond"
+
+    def test_unregistered_source_uses_bbc_parser(self):
+        """Tests that sources missing from the registry fall back to the BBC parser"""
+        assert get_source_extractors(["Gone"]) == [parse_article_text]
+
+
 class TestGetURLs:
     """Tests the get_url_from_table function"""
 
@@ -97,36 +181,87 @@ class TestGetURLs:
 class TestExtract:
     """Tests the extract_data function"""
     
+    @patch("extract.get_latest_version_hashes")
+    @patch("extract.get_cache_connection")
     @patch("extract.get_latest_version_of_article_from_db")
     @patch("extract.scrape_all_articles")
-    @patch("extract.get_urls_from_article_table")
+    @patch("extract.select_urls_to_scrape")
     @patch("extract.get_db_connection")
-    def test_extract_calls_close(self, mock_conn, mock_urls, mock_scrape, mock_latest):
+    def test_extract_calls_close(self, mock_conn, mock_urls, mock_scrape, mock_latest, mock_cache,
+                                 mock_hashes):
         """Tests that conn.close() is called"""
         conn = MagicMock()
         url_list = ["url1", "url2"]
         mock_conn.return_value = conn
         mock_urls.return_value = url_list
-        extract_data()
+        mock_scrape.side_effect = lambda urls, cache, updates, extractors, settled: (
+            settled.update(urls) or pd.DataFrame([{"article_url": "url1", "heading": "heading",
+                                                   "body": "new body", "scraped_at": "time"}]))
+        mock_hashes.return_value = add_content_hashes(
+            pd.DataFrame([{"article_url": "url1", "heading": "heading", "body": "body"}]))
+        _, _, checks = extract_data()
         assert mock_conn.call_count == 1
         assert mock_urls.call_count ==1
         assert mock_scrape.call_count == 1
         assert mock_latest.call_count == 1
         assert conn.close.call_count == 1
+        assert mock_cache.return_value.commit.call_count == 0
+        assert list(checks["article_url"]) == url_list
+        assert checks["content_hash"].isna().all()
+        assert conn.commit.call_count == 0
+        mock_latest.assert_called_once_with(conn, ["url1"])
     
 
+    @patch("extract.select_urls_to_scrape")
     @patch("extract.get_db_connection")
-    def test_extract_calls_after_exception(self, mock_conn):
-        """Tests that conn.close() is called after exception is handled"""
+    def test_extract_calls_after_exception(self, mock_conn, mock_urls):
+        """Tests that conn.close() is called when an exception is raised"""
         conn = MagicMock()
-        url_list = ["url1", "url2"]
         mock_conn.return_value = conn
-    
-        extract_data()
+        mock_urls.side_effect = Exception("db blip")
+
+        with pytest.raises(Exception):
+            extract_data()
         assert mock_conn.call_count == 1
-      
         assert conn.close.call_count == 1
 
+    @patch("extract.get_latest_version_hashes")
+    @patch("extract.get_cache_connection")
+    @patch("extract.scrape_all_articles")
+    @patch("extract.select_urls_to_scrape")
+    @patch("extract.get_db_connection")
+    def test_extract_failure_returns_no_checks(self, mock_conn, mock_urls, mock_scrape,
+                                               mock_cache, mock_hashes):
+        """Tests that a failure after scraping is raised rather than returning the
+        fetched validators for load_data to save"""
+        mock_urls.return_value = ["url1"]
+        mock_scrape.return_value = pd.DataFrame([{"article_url": "url1", "heading": "heading",
+                                                  "body": "new body", "scraped_at": "time"}])
+        mock_hashes.side_effect = Exception("db blip")
+
+        with pytest.raises(Exception):
+            extract_data()
+
+    @patch("extract.scrape_article")
+    @patch("extract.get_cache_connection")
+    @patch("extract.select_urls_to_scrape")
+    @patch("extract.get_db_connection")
+    def test_extract_only_checks_parsed_pages(self, mock_conn, mock_urls, mock_cache,
+                                                      mock_scrape):
+        """Tests that pages which failed to parse are neither checked nor cached"""
+        mock_urls.return_value = ["url1", "url2"]
+
+        def scrape(url, cache, updates, extractor):
+            updates.append((url, f'"{url}"', None, "hash"))
+            if url == "url2":
+                raise ValueError("No article body found")
+            return {}
+        mock_scrape.side_effect = scrape
+
+        _, _, checks = extract_data()
+        assert list(checks["article_url"]) == ["url1"]
+        assert list(checks["etag"]) == ['"url1"']
+
 
 class TestGetLatestVersion:
     """Tests the get_latest_version... function"""
@@ -143,4 +278,30 @@ class TestGetLatestVersion:
                                     ("scraped_at", "time")]
         result = get_latest_version_of_article_from_db(conn)
         assert mock_execute.call_count == 1
-        assert isinstance(result, pd.DataFrame)
\ No newline at end of file
+        assert isinstance(result, pd.DataFrame)
+
+    def test_get_latest_version_filters_urls(self):
+        """Tests that only the requested urls are fetched when given"""
+        conn = MagicMock()
+        mock_execute = conn.cursor().__enter__().execute
+        conn.cursor().__enter__().fetchall.return_value = [("body", None, "heading", "www.url.com", 1,
+                                                            "time", "heading digest", "body digest")]
+        result = get_latest_version_of_article_from_db(conn, ["www.url.com"])
+        assert "ANY(%s)" in mock_execute.call_args.args[0]
+        assert mock_execute.call_args.args[1] == [["www.url.com"]]
+        assert list(result["article_url"]) == ["www.url.com"]
+        assert list(result["body"]) == ["body"]
+
+    def test_get_latest_version_rebuilds_deltas(self):
+        """Tests that the latest body is rebuilt from the snapshot and the deltas after it"""
+        conn = MagicMock()
+        conn.cursor().__enter__().fetchall.return_value = [
+            ("police said", None, "heading", "www.url.com", 1, "t1", "h", "b1"),
+            (None, '[2,-1,"told"]', "heading", "www.url.com", 1, "t2", "h", "b2"),
+            (None, '[2,-1,"told today"]', "new heading", "www.url.com", 1, "t3", "h", "b3"),
+            ("other", None, "other heading", "www.other.com", 2, "t1", "h", "b")]
+        result = get_latest_version_of_article_from_db(conn)
+        assert list(result["body"]) == ["police told today", "other"]
+        assert list(result["scraped_at"]) == ["t3", "t1"]
+        assert "body_delta" not in result.columns
+
@@ -4,28 +4,90 @@ Tests load.py functionality
 """
 from unittest.mock import MagicMock, patch
 import pandas as pd
-from load import add_to_article_change_table, add_to_article_version_table, load_data
-from conftest import mock_loading_df, mock_article_changes
+from load import (add_to_article_change_table, add_to_article_version_table, load_data,
+                  refresh_change_summaries)
+from conftest import mock_loading_df, mock_article_changes, mock_article_version, mock_article_change_diffs
 
 
-@patch("load.execute_values")
-@patch("pandas.DataFrame.to_records")
-def test_add_to_article_version_executes_sql(mock_to_records, mock_execute, mock_loading_df):
-    """Tests that the db connection executes sql"""
+def test_add_to_article_version_copies_rows(mock_loading_df):
+    """Tests that versions are streamed with COPY and merged idempotently without committing"""
     conn = MagicMock()
+    cur = conn.cursor().__enter__()
     result = add_to_article_version_table(conn, mock_loading_df)
-    assert mock_execute.call_count == 1
-    assert conn.commit.call_count == 1
+    assert cur.copy_expert.call_count == 1
+    assert "ON CONFLICT (article_id, scraped_at) DO NOTHING" in cur.execute.call_args.args[0]
+    assert conn.commit.call_count == 0
 
 
-@patch("load.execute_values")
-@patch("pandas.DataFrame.to_records")
-def test_add_to_article_change_executes_sql(mock_to_records, mock_execute, mock_loading_df):
-    """Tests that the db connection executes sql"""
+def test_add_to_article_version_stores_deltas_between_snapshots(mock_article_version):
+    """Tests that deltas are copied and only kept while the article is between snapshots"""
     conn = MagicMock()
-    result = add_to_article_change_table(conn, mock_loading_df)
-    assert mock_execute.call_count == 1
-    assert conn.commit.call_count == 1
+    cur = conn.cursor().__enter__()
+    add_to_article_version_table(conn, mock_article_version.assign(body_delta='[1,"x"]'), 5)
+    copied = cur.copy_expert.call_args.args[1].getvalue()
+    assert '"[1,""x""]"' in copied
+    assert cur.execute.call_args.args[1] == {"deltas": 4}
+
+
+@patch.dict("load.environ", {"VERSION_STORAGE": "delta"})
+@patch("load.add_to_article_version_table")
+@patch("load.add_to_article_change_table")
+@patch("load.get_db_connection")
+@patch("load.load_dotenv")
+def test_load_data_adds_deltas(mock_envs, mock_conn, mock_add_change, mock_add_version,
+                               mock_article_version):
+    """Tests that delta storage encodes bodies against the previous versions passed in"""
+    previous = pd.DataFrame({"article_id": [1], "body": ["old body"]})
+    load_data(mock_article_version, pd.DataFrame(), previous)
+    versions = mock_add_version.call_args.args[1]
+    assert versions["body_delta"].iloc[0] == '[-2,1]'
+
+
+def test_add_to_article_change_copies_rows(mock_article_change_diffs):
+    """Tests that changes are streamed with COPY and merged idempotently without committing"""
+    conn = MagicMock()
+    cur = conn.cursor().__enter__()
+    result = add_to_article_change_table(conn, mock_article_change_diffs)
+    copied = cur.copy_expert.call_args.args[1].getvalue()
+    assert copied.startswith('1,www.url.com,body,"[[0,[[""-"",""old""]')
+    assert "diff" in cur.copy_expert.call_args.args[0]
+    assert "ON CONFLICT (article_id, change_type, current_scraped)" in cur.execute.call_args.args[0]
+    assert conn.commit.call_count == 0
+
+
+def test_add_to_article_change_keeps_inserted_rows(mock_article_change_diffs):
+    """Tests that only the changes actually inserted are kept for the summary refresh"""
+    conn = MagicMock()
+    cur = conn.cursor().__enter__()
+    add_to_article_change_table(conn, mock_article_change_diffs)
+    insert = cur.execute.call_args.args[0]
+    assert "RETURNING" in insert
+    assert "INSERT INTO new_article_change" in insert
+
+
+def test_refresh_change_summaries_adds_to_counts():
+    """Tests that summaries are incremented from the new changes, without committing"""
+    conn = MagicMock()
+    cur = conn.cursor().__enter__()
+    refresh_change_summaries(conn)
+    statements = " ".join(call.args[0] for call in cur.execute.call_args_list)
+    for table in ["change_type_count", "article_change_count", "change_count_histogram",
+                  "author_change_count"]:
+        assert f"changes.{table}" in statements
+    assert "FROM new_article_change" in statements
+    assert "changes.article_change " not in statements
+    assert conn.commit.call_count == 0
+
+
+def test_refresh_change_summaries_moves_articles_between_buckets():
+    """Tests that articles leave their old histogram bucket before their count grows"""
+    conn = MagicMock()
+    cur = conn.cursor().__enter__()
+    refresh_change_summaries(conn)
+    statements = [call.args[0] for call in cur.execute.call_args_list]
+    leave = next(i for i, sql in enumerate(statements) if "UPDATE changes.change_count_histogram" in sql)
+    grow = next(i for i, sql in enumerate(statements) if "INSERT INTO changes.article_change_count" in sql)
+    assert leave < grow
 
 
 
@@ -54,5 +116,106 @@ def test_load_data_calls_sub_routines(mock_envs, mock_conn, mock_read, mock_add_
     load_data()
     assert mock_add_change.call_count == 1
     assert mock_add_version.call_count == 1
+    assert conn.commit.call_count == 1
 
 
+@patch("load.refresh_change_summaries")
+@patch("load.add_to_article_version_table")
+@patch("load.add_to_article_change_table")
+@patch("load.get_db_connection")
+@patch("load.load_dotenv")
+def test_load_data_refreshes_summaries(mock_envs, mock_conn, mock_add_change, mock_add_version,
+                                       mock_refresh, mock_article_changes):
+    """Tests that summaries are refreshed after the changes are added, in the same transaction"""
+    conn = MagicMock()
+    mock_conn.return_value = conn
+    load_data(mock_article_changes, mock_article_changes)
+    assert mock_refresh.call_args.args[0] is conn
+    assert conn.commit.call_count == 1
+
+
+@patch("load.add_to_article_version_table")
+@patch("load.add_to_article_change_table")
+@patch("load.get_db_connection")
+@patch("load.load_dotenv")
+def test_load_data_rolls_back_on_error(mock_envs, mock_conn, mock_add_change, mock_add_version,
+                                       mock_article_changes, mock_article_version):
+    """Tests that a failed change insert also undoes the version insert"""
+    conn = MagicMock()
+    mock_conn.return_value = conn
+    mock_add_change.side_effect = Exception("copy failed")
+    load_data(mock_article_version, mock_article_changes)
+    assert mock_add_version.call_count == 1
+    assert conn.commit.call_count == 0
+    assert conn.rollback.call_count == 1
+
+
+
+
+@patch("load.add_to_article_version_table")
+@patch("load.add_to_article_change_table")
+@patch("load.get_db_connection")
+@patch("load.load_dotenv")
+def test_load_data_leaves_passed_connection_open(mock_envs, mock_conn, mock_add_change,
+                                                 mock_add_version, mock_article_changes):
+    """Tests that a connection passed in is committed but not closed or replaced"""
+    conn = MagicMock()
+    load_data(mock_article_changes, mock_article_changes, conn=conn)
+    assert mock_conn.call_count == 0
+    assert conn.commit.call_count == 1
+    assert conn.close.call_count == 0
+
+
+@patch("load.record_pipeline_run")
+@patch("load.add_to_article_version_table")
+@patch("load.add_to_article_change_table")
+@patch("load.get_db_connection")
+@patch("load.load_dotenv")
+def test_load_data_marks_pipeline_run(mock_envs, mock_conn, mock_add_change, mock_add_version,
+                                      mock_run, mock_article_changes):
+    """Tests that a load marks the comparison run, before committing, for the dashboard cache"""
+    load_data(mock_article_changes, mock_article_changes)
+    assert mock_run.call_args.args[1] == "comparison"
+    assert mock_conn.return_value.commit.call_count == 1
+
+
+@patch("load.record_checks")
+@patch("load.save_validators")
+@patch("load.add_to_article_version_table")
+@patch("load.add_to_article_change_table")
+@patch("load.get_db_connection")
+@patch("load.load_dotenv")
+def test_load_data_records_checks_and_saves_validators(mock_envs, mock_conn, mock_add_change,
+                                                       mock_add_version, mock_save, mock_record,
+                                                       mock_article_changes):
+    """Tests that checks are recorded in the load transaction, and staged validators
+    saved once it commits, skipping articles with no new validators"""
+    conn = MagicMock()
+    mock_conn.return_value = conn
+    conn.commit.side_effect = lambda: mock_save.assert_not_called()
+    checks = pd.DataFrame([("www.url.com", None, None, "hash"), ("www.other.com", None, None, None)],
+                          columns=["article_url", "etag", "last_modified", "content_hash"])
+    load_data(mock_article_changes, mock_article_changes, checks=checks)
+    mock_record.assert_called_once_with(conn, ["www.url.com", "www.other.com"])
+    assert list(mock_save.call_args.args[0]["article_url"]) == ["www.url.com"]
+
+
+@patch("load.save_validators")
+@patch("load.add_to_article_version_table")
+@patch("load.add_to_article_change_table")
+@patch("load.get_db_connection")
+@patch("load.load_dotenv")
+def test_load_data_failure_keeps_validators(mock_envs, mock_conn, mock_add_change,
+                                            mock_add_version, mock_save, mock_article_changes):
+    """Tests that a failed load saves no validators and rolls back its checks,
+    so the articles are checked again"""
+    conn = MagicMock()
+    mock_conn.return_value = conn
+    mock_add_change.side_effect = Exception("copy failed")
+    load_data(mock_article_changes, mock_article_changes,
+              checks=pd.DataFrame([("www.url.com", None, None, "hash")],
+                                  columns=["article_url", "etag", "last_modified",
+                                           "content_hash"]))
+    assert mock_save.call_count == 0
+    assert conn.commit.call_count == 0
+    assert conn.rollback.call_count == 1
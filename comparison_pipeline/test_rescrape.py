@@ -0,0 +1,95 @@
+# pylint: skip-file
+"""
+Tests rescrape.py functionality
+"""
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import monotonic
+import pytest
+from conftest import bbc_html
+from extract import parse_article
+from rescrape import DomainRateLimiter, summarise_run, rescrape_articles
+
+
+@pytest.fixture
+def stub_server(bbc_html):
+    """Local server returning the bbc fixture page, or a 404 for /missing"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            page = bbc_html.encode() if self.path != "/missing" else b"<html></html>"
+            self.send_response(200 if self.path != "/missing" else 404)
+            self.send_header("Content-Length", str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+class TestDomainRateLimiter:
+    """Tests for the DomainRateLimiter class"""
+
+    def test_requests_to_one_domain_are_spaced(self):
+        """Tests that the third request to a domain waits two intervals"""
+        limiter = DomainRateLimiter(20)
+
+        async def three_requests():
+            start = monotonic()
+            for _ in range(3):
+                await limiter.wait("https://www.bbc.co.uk/news/1")
+            return monotonic() - start
+
+        assert asyncio.run(three_requests()) >= 0.09
+
+    def test_domains_are_limited_separately(self):
+        """Tests that a different domain does not wait"""
+        limiter = DomainRateLimiter(1)
+
+        async def two_domains():
+            await limiter.wait("https://www.bbc.co.uk/news/1")
+            start = monotonic()
+            await limiter.wait("https://www.theguardian.com/1")
+            return monotonic() - start
+
+        assert asyncio.run(two_domains()) < 0.5
+
+
+def test_summarise_run():
+    """Tests that throughput and latency percentiles are reported"""
+    result = summarise_run([0.1, 0.2, 0.3, 0.4], 1, 2.0)
+    assert result["pages"] == 4
+    assert result["failures"] == 1
+    assert result["pages_per_second"] == 2.0
+    assert result["p50_latency"] == 0.25
+
+
+def test_summarise_run_no_pages():
+    """Tests that an empty run has no latency figures"""
+    result = summarise_run([], 3, 1.0)
+    assert result["pages_per_second"] == 0
+    assert result["p95_latency"] is None
+
+
+def test_rescrape_articles_keeps_url_order(stub_server):
+    """Tests that articles come back in url order and failures are counted"""
+    urls = [f"{stub_server}/news/{i}" for i in range(5)] + [f"{stub_server}/missing"]
+    articles, stats = rescrape_articles(urls, parse_article, workers=3,
+                                        requests_per_second=100)
+    assert list(articles["article_url"]) == urls[:5]
+    assert stats["pages"] == 6
+    assert stats["failures"] == 1
+
+
+def test_rescrape_articles_settles_parsed_pages(stub_server):
+    """Tests that only urls whose page was fetched and parsed are settled"""
+    urls = [f"{stub_server}/news/1", f"{stub_server}/missing"]
+    settled = set()
+    rescrape_articles(urls, parse_article, workers=2, requests_per_second=100,
+                      settled=settled)
+    assert settled == {urls[0]}
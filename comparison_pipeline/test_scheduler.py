@@ -0,0 +1,81 @@
+# pylint: skip-file
+"""
+Tests scheduler.py functionality
+"""
+from unittest.mock import MagicMock, patch
+import pandas as pd
+from scheduler import (check_interval, score_articles, articles_within_budget,
+                       select_urls_to_scrape, record_checks)
+
+NOW = pd.Timestamp("2023-09-11 12:00:00", tz="UTC")
+
+
+def candidate(url, created_hours_ago, last_version_hours_ago=None, versions=1,
+              changes=0, checked_minutes_ago=None):
+    """Builds one scheduling candidate row"""
+    hours = pd.Timedelta(hours=1)
+    return {"article_id": url, "article_url": url,
+            "created_at": NOW - created_hours_ago * hours,
+            "last_version": None if last_version_hours_ago is None
+            else NOW - last_version_hours_ago * hours,
+            "version_count": versions, "change_count": changes,
+            "last_checked": None if checked_minutes_ago is None
+            else NOW - pd.Timedelta(minutes=checked_minutes_ago)}
+
+
+def test_check_interval_backs_off_exponentially():
+    """Tests that the interval doubles as an article stays unchanged, up to the cap"""
+    result = check_interval(pd.Series([0, 59, 60, 130, 10 ** 7]))
+    assert list(result) == [30, 30, 60, 120, 7 * 24 * 60]
+
+
+def test_recent_articles_score_higher():
+    """Tests that a new article outranks a three week old one"""
+    candidates = pd.DataFrame([candidate("old", 21 * 24), candidate("new", 0.2)])
+    scored = score_articles(candidates, NOW)
+    assert scored.loc[1, "score"] > scored.loc[0, "score"]
+
+
+def test_frequently_changed_articles_score_higher():
+    """Tests that past changes raise an article's score"""
+    candidates = pd.DataFrame([candidate("stable", 5, versions=1),
+                               candidate("changing", 5, versions=4, changes=6)])
+    scored = score_articles(candidates, NOW)
+    assert scored.loc[1, "score"] > scored.loc[0, "score"]
+
+
+def test_stable_article_not_due_until_interval_passes():
+    """Tests that an article unchanged for 10 hours is not due 2 hours after a check"""
+    candidates = pd.DataFrame([candidate("stable", 12, 10, checked_minutes_ago=120),
+                               candidate("never checked", 12, 10),
+                               candidate("fresh change", 12, 0.5, checked_minutes_ago=40)])
+    scored = score_articles(candidates, NOW)
+    assert list(scored["due"]) == [False, True, True]
+
+
+def test_articles_within_budget():
+    """Tests that the budget knob sets the number of articles"""
+    assert articles_within_budget(60, 0.5) == 120
+    assert articles_within_budget(0, 0.5) == 0
+
+
+@patch("scheduler.pd.Timestamp.now")
+@patch("scheduler.get_schedule_candidates")
+def test_select_urls_to_scrape_takes_top_n(mock_candidates, mock_now):
+    """Tests that only the best scoring due articles fit in the budget"""
+    mock_now.return_value = NOW
+    mock_candidates.return_value = pd.DataFrame([
+        candidate("old", 24 * 21, 24 * 21, checked_minutes_ago=60 * 24),
+        candidate("new", 1),
+        candidate("changing", 3, 0.1, versions=3, changes=4, checked_minutes_ago=31),
+        candidate("not due", 2, 2, checked_minutes_ago=5)])
+    result = select_urls_to_scrape(MagicMock(), budget_seconds=1, seconds_per_article=0.5)
+    assert result == ["changing", "new"]
+
+
+def test_record_checks_leaves_commit_to_caller():
+    """Tests that checks are upserted without committing"""
+    conn = MagicMock()
+    record_checks(conn, ["www.url.com"])
+    assert conn.cursor().__enter__().execute.call_count == 1
+    assert conn.commit.call_count == 0
@@ -2,101 +2,133 @@
 """
 Tests transform.py functionality
 """
-from unittest.mock import MagicMock, patch
+import pytest
+from unittest.mock import patch
 import pandas as pd
-from transform import (identify_changes, format_comparison, changes_to_article, double_change_to_article, format_article_version_update,
-                       retrieve_article_id, transform_data)
-from conftest import mock_loading_df, mock_changed_df, mock_compared_df, mock_compared_double_diff_df
+from content_hash import add_content_hashes
+from transform import (identify_changes, split_changes, format_both_changes,
+                       format_changes_version, transform_data, changed_paragraphs)
+
+
+def previous_version(**changes):
+    """Builds one stored latest version, shaped as extract returns it"""
+    version = {"body": "body", "heading": "headline", "article_url": "www.test.com",
+               "article_id": 1, "scraped_at": "old time"}
+    version.update(changes)
+    return pd.DataFrame([version])
+
+
+def scraped_article(**changes):
+    """Builds one freshly scraped article"""
+    article = {"body": "body", "heading": "headline", "article_url": "www.test.com",
+               "scraped_at": "new time"}
+    article.update(changes)
+    return pd.DataFrame([article])
 
 
 class TestIdentifyChanges:
     """Tests for the identify_changes function"""
-    
-    def test_identify_changes_returns_dataframe(self, mock_changed_df, mock_loading_df):
-        """Tests that a dataframe is returned"""
-
-        result = identify_changes(mock_changed_df, mock_loading_df)
-       
-        assert isinstance(result, pd.DataFrame)
-        assert result["heading"]["updated"][0] == "new headline"
-        assert all([col in result.columns for col in ["body", "heading"]])
-
-
-class TestFormatComparison:
-    """Tests for the format_comparison function"""
-
-    @patch("transform.retrieve_article_id")
-    def test_format_comparison_return_df(self, mock_retrieve, mock_compared_df):
-        """Tests the format_comparison function returns a df"""
-        conn = MagicMock()
-    
-        result = format_comparison(mock_compared_df, conn)
-        assert mock_retrieve.call_count == 1
-        assert isinstance(result, pd.DataFrame)
-        assert all(col in result.columns for col in ["article_url", "article_id", \
-        "type_of_change", "previous", "current", "previous_scraped_at", "current_scraped_at"])
-
-class TestFormatArticleVersionUpdate():
-    """Tests for the format_article_version_update function"""
-
-    @patch("transform.retrieve_article_id")
-    def test_format_article_returns_df(self, mock_retrieve, mock_compared_df):
-        """Tests that a dataframe is returned"""
-        conn = MagicMock()
-        result = format_article_version_update(mock_compared_df, conn)
-        assert mock_retrieve.call_count == 1
-        assert isinstance(result, pd.DataFrame)
-        assert all(col in result.columns for col in ["scraped_at", "heading", "body", "article_id"])
-    
-
-class TestChangesToArticle:
-    """Tests for the changes_to_article function"""
-    
-    def test_changes_to_article_body(self, mock_compared_df):
-        """Tests function returns dataframe"""
-        result = changes_to_article(mock_compared_df, "body", "heading")
-        
-        assert isinstance(result, pd.DataFrame)
-        assert "heading" not in result.columns
-        assert all(col in result.columns for col in ["current", "previous", "article_url", \
-                    "current_scraped_at", "previous_scraped_at", "type_of_change"])
-
-class TestRetrieveArticleId:
-    """Tests for retrieve_id function"""
-    
-    def test_data_fetched(self):
-        conn = MagicMock()
-        mock_fetch = conn.cursor().__enter__().fetchone
-        mock_fetch.return_value = ("1")
-        result = retrieve_article_id(conn, "www.test.com")
-        assert mock_fetch.call_count == 1
-        assert result == "1"
-
-class TestDoubleChanges:
-    """Tests for the double_changes_to_article function"""
-    
-    def test_changes_to_article_body_and_heading(self, mock_compared_double_diff_df):
-        """Tests function returns dataframe"""
-        result = double_change_to_article(mock_compared_double_diff_df)
-        
-        assert isinstance(result, pd.DataFrame)
-        assert "body" not in result.columns
-        assert "heading" not in result.columns
-        assert all(col in result.columns for col in ["current", "previous", "article_url", \
-                    "current_scraped_at", "previous_scraped_at", "type_of_change"])
-        
 
-@patch("transform.identify_changes")
-@patch("transform.get_db_connection")
-class TestTransformData:
-    """Tests for the transform_data function"""
-
-    def test_transform_data_closes_conn(self, mock_conn, mock_identify):
-        """Tests that connection is closed during function"""
-        conn = MagicMock()
-        mock_conn.return_value = conn
-        mock_close = conn.close
-        result = transform_data()
-        assert mock_conn.call_count == 1
-        assert mock_close.call_count == 1
+    def test_text_comparison_finds_changed_heading(self):
+        """Tests that a changed heading is found by comparing text"""
+        result = identify_changes(scraped_article(heading="new headline"), previous_version())
+        assert len(result) == 1
+        assert result["heading_y"].iloc[0] == "new headline"
+
+    def test_text_comparison_skips_unchanged(self):
+        """Tests that unchanged articles are dropped"""
+        assert identify_changes(scraped_article(), previous_version()).empty
+
+    def test_hash_comparison_drops_hash_columns(self):
+        """Tests that digests are compared when both sides have them and then removed"""
+        result = identify_changes(add_content_hashes(scraped_article(body="new body")),
+                                  add_content_hashes(previous_version()))
+        assert len(result) == 1
+        assert not any("hash" in column for column in result.columns)
+
+    def test_hash_comparison_ignores_text(self):
+        """Tests that matching digests mean no change without comparing text"""
+        previous = add_content_hashes(previous_version())
+        scraped = add_content_hashes(scraped_article())
+        scraped["body"] = "text is not compared"
+        assert identify_changes(scraped, previous).empty
+
+
+def test_split_changes_puts_double_changes_in_both():
+    """Tests that an article with both heading and body changed is in both frames"""
+    differences = identify_changes(scraped_article(heading="new headline", body="new body"),
+                                   previous_version())
+    heading_change, body_change = split_changes(differences)
+    assert len(heading_change) == 1
+    assert len(body_change) == 1
+
+
+def test_format_both_changes_columns():
+    """Tests that changes are shaped for the article_change table"""
+    differences = identify_changes(scraped_article(body="new body"), previous_version())
+    result = format_both_changes(*split_changes(differences))
+    assert list(result.columns) == ["article_id", "article_url", "change_type", "previous",
+                                    "current", "previous_scraped", "current_scraped",
+                                    "diff_previous", "diff_current"]
+    assert result.iloc[0]["change_type"] == "body"
+    assert result.iloc[0]["current"] == "new body"
+
 
+def test_split_changes_ignores_paragraph_breaks():
+    """Tests that a body only gaining paragraph breaks is not a body change"""
+    differences = identify_changes(scraped_article(body="first\nsecond", heading="new"),
+                                   previous_version(body="first second"))
+    heading_change, body_change = split_changes(differences)
+    assert len(heading_change) == 1
+    assert body_change.empty
+
+
+def test_changed_paragraphs_only_returns_edits():
+    """Tests that unchanged paragraphs are left out, and inserts and edits kept"""
+    previous = "one\ntwo\nthree\nfour"
+    current = "one\ntwo edited\nthree\nnew\nfour"
+    assert changed_paragraphs(previous, current) == ("two", "two edited\nnew")
+
+
+def test_format_both_changes_paragraph_type():
+    """Tests that body changes with known paragraphs become paragraph changes"""
+    differences = identify_changes(scraped_article(body="one\ntwo edited\nthree"),
+                                   previous_version(body="one\ntwo\nthree"))
+    result = format_both_changes(*split_changes(differences))
+    assert result.iloc[0]["change_type"] == "paragraph"
+    assert result.iloc[0]["diff_previous"] == "two"
+    assert result.iloc[0]["diff_current"] == "two edited"
+    assert result.iloc[0]["previous"] == "one\ntwo\nthree"
+    assert result.iloc[0]["current"] == "one\ntwo edited\nthree"
+
+
+def test_format_changes_version_columns():
+    """Tests that new versions are shaped for the article_version table"""
+    differences = identify_changes(scraped_article(body="new body"), previous_version())
+    result = format_changes_version(differences)
+    assert list(result.columns) == ["scraped_at", "heading", "body", "article_id"]
+    assert result.iloc[0]["scraped_at"] == "new time"
+
+
+def test_transform_data_in_memory():
+    """Tests that frames passed in are transformed without touching csv files"""
+    comparison_df, version_df = transform_data(
+        add_content_hashes(scraped_article(heading="new headline")),
+        add_content_hashes(previous_version()))
+    assert len(comparison_df) == 1
+    assert len(version_df) == 1
+
+
+def test_transform_data_nothing_to_compare():
+    """Tests that empty frames are returned when nothing was scraped"""
+    comparison_df, version_df = transform_data(pd.DataFrame(), previous_version())
+    assert comparison_df.empty
+    assert version_df.empty
+
+
+@patch("transform.identify_changes")
+def test_transform_data_raises_errors(mock_identify):
+    """Tests that a failed transform is raised, so the run loads nothing"""
+    mock_identify.side_effect = KeyError("body_x")
+    with pytest.raises(KeyError):
+        transform_data(scraped_article(heading="new headline"), previous_version())
@@ -0,0 +1,77 @@
+# pylint: skip-file
+"""
+Tests validator_cache.py functionality
+"""
+import pytest
+import pandas as pd
+from validator_cache import (get_cache_connection, hash_content, get_validators,
+                             conditional_headers, store_validators, is_unchanged,
+                             response_validators, save_validators, VALIDATOR_COLUMNS)
+
+
+@pytest.fixture
+def cache():
+    """In-memory validator cache"""
+    cache = get_cache_connection(":memory:")
+    yield cache
+    cache.close()
+
+
+def test_get_validators_missing_url(cache):
+    """Tests that an unseen url has no validators"""
+    assert get_validators(cache, "www.url.com") is None
+
+
+def test_store_validators_overwrites(cache):
+    """Tests that storing twice keeps only the latest validators"""
+    store_validators(cache, "www.url.com", '"v1"', None, "hash1")
+    store_validators(cache, "www.url.com", '"v2"', "Mon, 11 Sep 2023 12:00:00 GMT", "hash2")
+    assert get_validators(cache, "www.url.com") == ('"v2"', "Mon, 11 Sep 2023 12:00:00 GMT",
+                                                    "hash2")
+
+
+def test_conditional_headers():
+    """Tests that stored validators become conditional request headers"""
+    headers = conditional_headers(('"v1"', "Mon, 11 Sep 2023 12:00:00 GMT", "hash"))
+    assert headers == {"If-None-Match": '"v1"',
+                       "If-Modified-Since": "Mon, 11 Sep 2023 12:00:00 GMT"}
+    assert conditional_headers(None) == {}
+    assert conditional_headers((None, None, "hash")) == {}
+
+
+def test_not_modified_is_unchanged():
+    """Tests that a 304 response counts as unchanged"""
+    validators = ('"v1"', None, "hash")
+    assert is_unchanged(304, None, validators)
+
+
+def test_same_body_hash_is_unchanged():
+    """Tests that a 200 with an identical body counts as unchanged"""
+    validators = (None, None, hash_content(b"<html></html>"))
+    fresh = response_validators("www.url.com", 200, {}, b"<html></html>")
+    assert is_unchanged(200, fresh, validators)
+
+
+def test_new_body_is_changed_and_not_stored(cache):
+    """Tests that a new body is reported as changed without touching the cache"""
+    fresh = response_validators("www.url.com", 200, {"ETag": '"v2"'}, b"<html>")
+    assert fresh == ("www.url.com", '"v2"', None, hash_content(b"<html>"))
+    assert not is_unchanged(200, fresh, None)
+    assert get_validators(cache, "www.url.com") is None
+
+
+def test_error_response_has_no_validators():
+    """Tests that error responses are neither unchanged nor given validators to store"""
+    assert response_validators("www.url.com", 500, {}, b"error") is None
+    assert not is_unchanged(500, None, None)
+
+
+def test_save_validators_commits(tmp_path):
+    """Tests that staged validators are written, with missing headers stored as NULL"""
+    path = str(tmp_path / "cache.db")
+    updates = pd.DataFrame([("www.url.com", None, float("nan"), "hash")],
+                           columns=VALIDATOR_COLUMNS)
+    save_validators(updates, path)
+    cache = get_cache_connection(path)
+    assert get_validators(cache, "www.url.com") == (None, None, "hash")
+    cache.close()
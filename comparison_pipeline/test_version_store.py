@@ -0,0 +1,49 @@
+# pylint: skip-file
+"""
+Tests version_store.py functionality
+"""
+import random
+import pandas as pd
+from version_store import tokenize, make_delta, apply_delta, add_body_deltas, rebuild_latest_versions
+
+
+def test_tokenize_keeps_whitespace():
+    """Tests that joining the tokens gives back the exact text"""
+    text = "A  line\n\nNew paragraph "
+    assert "".join(tokenize(text)) == text
+
+
+def test_make_delta_is_small_for_one_word_change():
+    """Tests that a one word correction only stores the new word"""
+    assert make_delta("The police said on Monday", "The police told on Monday") == '[4,-1,"told",4]'
+
+
+def test_apply_delta_round_trips():
+    """Tests that applying a delta always rebuilds the current body exactly"""
+    rng = random.Random(1)
+    for _ in range(200):
+        previous = "".join(rng.choice(["police ", "said\n", "the  ", "£5 "]) for _ in range(40))
+        tokens = tokenize(previous)
+        for _ in range(3):
+            tokens[rng.randrange(len(tokens))] = rng.choice(["told", "", " new words "])
+        current = "".join(tokens)
+        assert apply_delta(previous, make_delta(previous, current)) == current
+
+
+def test_add_body_deltas_only_for_known_articles(mock_article_version):
+    """Tests that articles without a previous body are left without a delta"""
+    versions = pd.concat([mock_article_version,
+                          mock_article_version.assign(article_id="2", body="new body")])
+    previous = pd.DataFrame({"article_id": [2], "body": ["old body"]})
+    result = add_body_deltas(versions, previous)
+    assert pd.isna(result["body_delta"].iloc[0])
+    assert apply_delta("old body", result["body_delta"].iloc[1]) == "new body"
+    assert "body_delta" not in versions.columns
+
+
+def test_rebuild_latest_versions_restarts_at_snapshot():
+    """Tests that a full body in the chain replaces the body rebuilt so far"""
+    chains = pd.DataFrame({"body": ["a b", None, "c d", None],
+                           "body_delta": [None, '[2,-1,"x"]', None, '[2,-1,"y"]'],
+                           "article_id": [1, 1, 1, 1]})
+    assert list(rebuild_latest_versions(chains)["body"]) == ["c y"]
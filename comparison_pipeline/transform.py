@@ -1,6 +1,9 @@
 """Comparison file to compare scraped data with data in the db"""
 # pylint: disable=invalid-name
+from difflib import SequenceMatcher
 import pandas as pd
+from content_hash import (HASH_COLUMNS, PARAGRAPH_SEPARATOR, canonical_body,
+                          paragraph_hashes)
 
 
 TRANSFORMED_ARTICLES_FOR_ARTICLE_VERSION = "transformed_data_for_a_v.csv"
@@ -10,10 +13,20 @@ SCRAPED_ARTICLES = "scraped_articles.csv"
 
 
 def identify_changes(scraped_df: pd.DataFrame, rds_df: pd.DataFrame) -> pd.DataFrame:
-    """Identifies changes in the scraped df and returns a df with the article changes"""
+    """Identifies changes in the scraped df and returns a df with the article changes.
+    When both sides carry heading/body digests these are compared instead of the full text."""
 
-    differences = rds_df.merge(scraped_df, how="left", on="article_url")
+    differences = rds_df.merge(scraped_df, how="inner", on="article_url")
 
+    hash_columns = [column + suffix for column in HASH_COLUMNS for suffix in ("_x", "_y")]
+    if all(column in differences.columns for column in hash_columns):
+        differences = differences[
+            (differences["heading_hash_x"] != differences["heading_hash_y"]) |\
+            (differences["body_hash_x"] != differences["body_hash_y"])]
+        return differences.drop(columns=hash_columns)
+
+    differences = differences.drop(columns=[column for column in differences.columns
+                                            if column in hash_columns + HASH_COLUMNS])
     differences = differences[(differences["body_x"] != differences["body_y"]) |\
                 (differences["heading_x"] != differences["heading_y"])]
 
@@ -21,20 +34,23 @@ def identify_changes(scraped_df: pd.DataFrame, rds_df: pd.DataFrame) -> pd.DataF
 
 
 def split_changes(differences: pd.DataFrame) -> pd.DataFrame:
-    """Split the changes in dataframe by body or heading or both"""
+    """Split the changes in dataframe by body or heading or both.
+    Bodies are compared with their paragraphs joined by spaces, so a body stored
+    before paragraphs were kept does not count as changed on its own."""
+
+    body_changed = differences["body_x"].map(canonical_body) !=\
+        differences["body_y"].map(canonical_body)
 
-    heading_change = differences[(differences["body_x"] == differences["body_y"]) &\
+    heading_change = differences[~body_changed &\
                 (differences["heading_x"] != differences["heading_y"])].copy()
-    body_change = differences[(differences["body_x"] != differences["body_y"]) &\
+    body_change = differences[body_changed &\
                 (differences["heading_x"] == differences["heading_y"])].copy()
 
-    double_change = differences[(differences["body_x"] != differences["body_y"]) &\
+    double_change = differences[body_changed &\
                 (differences["heading_x"] != differences["heading_y"])].copy()
 
-    split_heading_change = double_change[(double_change["body_x"] != double_change["body_y"]) &\
-                (double_change["heading_x"] != double_change["heading_y"])].copy()
-    split_body_change = double_change[(double_change["body_x"] != double_change["body_y"]) &\
-                (double_change["heading_x"] != double_change["heading_y"])].copy()
+    split_heading_change = double_change.copy()
+    split_body_change = double_change.copy()
 
     heading_change = pd.concat([heading_change, split_heading_change])
     body_change = pd.concat([body_change, split_body_change])
@@ -56,11 +72,54 @@ def format_changes_comparison(df: pd.DataFrame, type_of_change: str, other_chang
     return df
 
 
+def changed_paragraphs(previous: str, current: str) -> tuple[str, str]:
+    """Returns only the paragraphs inserted, removed or edited between two bodies,
+    matched by their digests"""
+
+    previous_paragraphs = previous.split(PARAGRAPH_SEPARATOR)
+    current_paragraphs = current.split(PARAGRAPH_SEPARATOR)
+    matcher = SequenceMatcher(None, paragraph_hashes(previous), paragraph_hashes(current),
+                              autojunk=False)
+
+    removed, added = [], []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            removed.extend(previous_paragraphs[i1:i2])
+            added.extend(current_paragraphs[j1:j2])
+
+    return PARAGRAPH_SEPARATOR.join(removed), PARAGRAPH_SEPARATOR.join(added)
+
+
+def with_diff_text(changes: pd.DataFrame) -> pd.DataFrame:
+    """Adds the text each change is diffed over, by default its full versions"""
+
+    return changes.assign(diff_previous=changes["previous"], diff_current=changes["current"])
+
+
+def narrow_to_paragraphs(body_change: pd.DataFrame) -> pd.DataFrame:
+    """Turns body changes whose previous version kept its paragraphs into paragraph
+    changes diffed over just the changed paragraphs, so only those are stored.
+    The full versions are kept for scoring similarity."""
+
+    body_change = with_diff_text(body_change)
+    has_paragraphs = body_change["previous"].str.contains(PARAGRAPH_SEPARATOR, regex=False)
+    if has_paragraphs.any():
+        narrowed = [changed_paragraphs(previous, current) for previous, current in
+                    zip(body_change.loc[has_paragraphs, "previous"],
+                        body_change.loc[has_paragraphs, "current"])]
+        body_change.loc[has_paragraphs, "diff_previous"] = [previous for previous, _ in narrowed]
+        body_change.loc[has_paragraphs, "diff_current"] = [current for _, current in narrowed]
+        body_change.loc[has_paragraphs, "change_type"] = "paragraph"
+
+    return body_change
+
+
 def format_both_changes(heading_df: pd.DataFrame, body_df: pd.DataFrame) -> pd.DataFrame:
-    """Formats both heading and body changes into one df"""
+    """Formats both heading and body changes into one df, with body changes
+    narrowed to paragraph changes where paragraphs are known"""
 
-    heading_change = format_changes_comparison(heading_df, "heading", "body")
-    body_change = format_changes_comparison(body_df, "body", "heading")
+    heading_change = with_diff_text(format_changes_comparison(heading_df, "heading", "body"))
+    body_change = narrow_to_paragraphs(format_changes_comparison(body_df, "body", "heading"))
 
     return pd.concat([heading_change, body_change])
 
@@ -75,31 +134,39 @@ def format_changes_version(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def transform_data() -> None:
-    """Compares scraped data with the data in the db and identifies where there are difference"""
+def transform_data(scraped_data: pd.DataFrame = None, previous_versions: pd.DataFrame = None,
+                   checkpoint: bool = False) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Compares scraped data with the data in the db and identifies where there are difference.
+    Reads the extract csv files for any dataframe not passed in, and returns the changes for
+    comparison and the new article versions, also saving them to csv when checkpoint is set.
+    Errors are raised, so a failed run loads nothing."""
 
+    comparison_df = pd.DataFrame()
+    version_df = pd.DataFrame()
     try:
-        scraped_data = pd.read_csv(SCRAPED_ARTICLES)
-        previous_versions = pd.read_csv(ARTICLES_FROM_DB)
-        comparison_df = pd.DataFrame()
-        version_df = pd.DataFrame()
-
-        differences = identify_changes(scraped_data, previous_versions)
-        if not differences.empty:
-            heading_change, body_change = split_changes(differences)
-            comparison_df = format_both_changes(heading_change, body_change)
-            version_df = format_changes_version(pd.concat([heading_change, body_change]))
-
-        comparison_df.to_csv(ARTICLES_FOR_COMPARISON, index=False)
-        version_df.to_csv(TRANSFORMED_ARTICLES_FOR_ARTICLE_VERSION, index=False)
-    except KeyboardInterrupt:
-        print("User stopped.")
+        if scraped_data is None:
+            scraped_data = pd.read_csv(SCRAPED_ARTICLES)
+        if previous_versions is None:
+            previous_versions = pd.read_csv(ARTICLES_FROM_DB)
+
+        if scraped_data.empty or previous_versions.empty:
+            print("No changes at this time")
+        else:
+            differences = identify_changes(scraped_data, previous_versions)
+            if not differences.empty:
+                heading_change, body_change = split_changes(differences)
+                comparison_df = format_both_changes(heading_change, body_change)
+                version_df = format_changes_version(pd.concat([heading_change, body_change]))
+
+        if checkpoint:
+            comparison_df.to_csv(ARTICLES_FOR_COMPARISON, index=False)
+            version_df.to_csv(TRANSFORMED_ARTICLES_FOR_ARTICLE_VERSION, index=False)
     except pd.errors.EmptyDataError:
         print("No changes at this time")
-    except Exception as exc:
-        print(exc)
+
+    return comparison_df, version_df
 
 
 if __name__ == "__main__":
 
-    transform_data()
+    transform_data(checkpoint=True)
@@ -0,0 +1,112 @@
+"""Persistent cache of HTTP validators used to skip re-scraping unchanged articles"""
+
+from os import environ
+import hashlib
+import sqlite3
+import pandas as pd
+
+VALIDATOR_CACHE = "validator_cache.db"
+VALIDATOR_COLUMNS = ["article_url", "etag", "last_modified", "content_hash"]
+
+
+def get_cache_connection(path: str = None) -> sqlite3.Connection:
+    """Returns a connection to the validator cache, creating it if needed"""
+
+    cache = sqlite3.connect(path or environ.get("VALIDATOR_CACHE_PATH", VALIDATOR_CACHE))
+    cache.execute("""CREATE TABLE IF NOT EXISTS validator (
+                  article_url TEXT PRIMARY KEY,
+                  etag TEXT,
+                  last_modified TEXT,
+                  content_hash TEXT NOT NULL);""")
+
+    return cache
+
+
+def hash_content(content: bytes | str) -> str:
+    """Returns a hex digest of a page body"""
+
+    if isinstance(content, str):
+        content = content.encode()
+
+    return hashlib.sha256(content).hexdigest()
+
+
+def get_validators(cache: sqlite3.Connection, article_url: str) -> tuple | None:
+    """Returns the stored (etag, last_modified, content_hash) for a url, if any"""
+
+    return cache.execute("""SELECT etag, last_modified, content_hash FROM validator
+                         WHERE article_url = ?;""", [article_url]).fetchone()
+
+
+def conditional_headers(validators: tuple | None) -> dict:
+    """Returns the If-None-Match/If-Modified-Since headers for stored validators"""
+
+    headers = {}
+    if validators is not None:
+        etag, last_modified, _ = validators
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    return headers
+
+
+def store_validators(cache: sqlite3.Connection, article_url: str, etag: str | None,
+                     last_modified: str | None, content_hash: str) -> None:
+    """Saves the validators of the latest response for a url. Committed by the caller."""
+
+    cache.execute("""INSERT INTO validator (article_url, etag, last_modified, content_hash)
+                  VALUES (?, ?, ?, ?)
+                  ON CONFLICT (article_url) DO UPDATE SET etag = excluded.etag,
+                  last_modified = excluded.last_modified,
+                  content_hash = excluded.content_hash;""",
+                  [article_url, etag, last_modified, content_hash])
+
+
+def response_validators(article_url: str, status: int, headers: dict,
+                        content: bytes) -> tuple | None:
+    """Returns (article_url, etag, last_modified, content_hash) to store for a successful
+    response, or None for any other response"""
+
+    if status != 200:
+        return None
+
+    return (article_url, headers.get("ETag"), headers.get("Last-Modified"),
+            hash_content(content))
+
+
+def is_unchanged(status: int, fresh: tuple | None, validators: tuple | None) -> bool:
+    """Returns True if a response shows the article has not changed since the last
+    scrape, given the stored validators and the response's own (fresh) validators"""
+
+    if status == 304:
+        return validators is not None
+    if fresh is None:
+        return False
+
+    return validators is not None and validators[2] == fresh[3]
+
+
+def none_if_missing(value):
+    """Returns None for a value pandas has read as missing"""
+
+    return None if pd.isna(value) else value
+
+
+def save_validators(updates: pd.DataFrame, path: str = None) -> None:
+    """Stores and commits the validators of a run's successful responses. Only called
+    once the run's changes are loaded, so a failed run re-checks its articles in full."""
+
+    if updates.empty:
+        return
+
+    cache = get_cache_connection(path)
+    try:
+        for article_url, etag, last_modified, content_hash in \
+                updates[VALIDATOR_COLUMNS].astype(object).itertuples(index=False, name=None):
+            store_validators(cache, article_url, none_if_missing(etag),
+                             none_if_missing(last_modified), content_hash)
+        cache.commit()
+    finally:
+        cache.close()
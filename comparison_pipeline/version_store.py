@@ -0,0 +1,92 @@
+"""Delta encoding of article bodies, so near identical versions are not stored in full.
+A delta is a json list over whitespace-preserving tokens of the previous body: a positive
+int copies that many tokens, a negative int skips that many and a string is inserted."""
+
+import json
+import re
+from difflib import SequenceMatcher
+import pandas as pd
+from diff_engine import common_affix_lengths
+
+TOKEN_PATTERN = re.compile(r"(\s+)")
+SNAPSHOT_EVERY = 10
+
+
+def tokenize(text: str) -> list:
+    """Splits text into words and the whitespace between them, so joining gives it back"""
+
+    return TOKEN_PATTERN.split(text)
+
+
+def make_delta(previous: str, current: str) -> str:
+    """Returns the delta that turns the previous body into the current one"""
+
+    previous_tokens, current_tokens = tokenize(previous), tokenize(current)
+    prefix, suffix = common_affix_lengths(previous_tokens, current_tokens)
+    matcher = SequenceMatcher(None, previous_tokens[prefix:len(previous_tokens) - suffix],
+                              current_tokens[prefix:len(current_tokens) - suffix],
+                              autojunk=False)
+
+    delta = [prefix] if prefix else []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            delta.append(i2 - i1)
+            continue
+        if tag in {"replace", "delete"}:
+            delta.append(i1 - i2)
+        if tag in {"replace", "insert"}:
+            delta.append("".join(current_tokens[prefix + j1:prefix + j2]))
+    if suffix:
+        delta.append(suffix)
+
+    return json.dumps(delta, ensure_ascii=False, separators=(",", ":"))
+
+
+def apply_delta(previous: str, delta: str) -> str:
+    """Rebuilds a body from the previous body and its delta"""
+
+    previous_tokens = tokenize(previous)
+    position = 0
+    parts = []
+    for step in json.loads(delta):
+        if isinstance(step, str):
+            parts.append(step)
+        elif step > 0:
+            parts.extend(previous_tokens[position:position + step])
+            position += step
+        else:
+            position -= step
+
+    return "".join(parts)
+
+
+def add_body_deltas(versions: pd.DataFrame, previous_versions: pd.DataFrame) -> pd.DataFrame:
+    """Returns a copy of versions with a body_delta column against each article's
+    previous body, left empty for articles without one"""
+
+    previous_bodies = dict(zip(previous_versions["article_id"].map(str),
+                               previous_versions["body"]))
+    versions = versions.copy()
+    versions["body_delta"] = [
+        make_delta(previous_bodies[article_id], body)
+        if article_id in previous_bodies else None
+        for article_id, body in zip(versions["article_id"].map(str), versions["body"])]
+
+    return versions
+
+
+def rebuild_latest_versions(chains: pd.DataFrame) -> pd.DataFrame:
+    """Returns each article's latest version with its body rebuilt, from rows running
+    from its latest full snapshot to its latest version in scraped_at order"""
+
+    latest = []
+    for _, chain in chains.groupby("article_id", sort=False):
+        body = None
+        for snapshot, delta in zip(chain["body"], chain["body_delta"]):
+            body = snapshot if isinstance(snapshot, str) else apply_delta(body, delta)
+        version = chain.iloc[-1].copy()
+        version["body"] = body
+        latest.append(version)
+
+    return pd.DataFrame(latest, columns=chains.columns).drop(columns=["body_delta"])\
+        .reset_index(drop=True)
@@ -0,0 +1,34 @@
+"""Benchmark of the start-up cost a one-shot pipeline run pays before doing any work:
+starting python and importing the pipeline's stages, which the daemon pays once."""
+
+import subprocess
+import sys
+from os import environ
+from statistics import median
+from time import perf_counter
+from daemon import ROOT
+
+REPEATS = 5
+PIPELINES = {"pipeline": "import extract, transform, load",
+             "comparison_pipeline": "import extract, transform, compare, load"}
+
+
+def cold_start_seconds(directory: str, imports: str) -> float:
+    """Returns the median time to start python and import a pipeline's stages"""
+
+    env = {**environ, "PYTHONPATH": str(ROOT / "shared")}
+    timings = []
+    for _ in range(REPEATS):
+        started = perf_counter()
+        subprocess.run([sys.executable, "-c", imports], cwd=ROOT / directory, env=env,
+                       check=True)
+        timings.append(perf_counter() - started)
+
+    return median(timings)
+
+
+if __name__ == "__main__":
+
+    for folder, stage_imports in PIPELINES.items():
+        print(f"{folder}: {cold_start_seconds(folder, stage_imports):.2f}s start-up per "
+              f"one-shot run, paid once by the daemon")
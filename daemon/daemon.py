@@ -0,0 +1,175 @@
+"""Long running entry point that runs the scraping and comparison pipelines on their own
+intervals in one process. Imports, database connections and the pooled http session
+are set up once and kept warm between runs."""
+
+import importlib
+import multiprocessing
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from os import environ
+from pathlib import Path
+from threading import Event, Lock
+from time import monotonic, perf_counter
+from typing import Callable
+from dotenv import load_dotenv
+from psycopg2 import OperationalError, InterfaceError
+from psycopg2.extensions import connection
+
+ROOT = Path(__file__).resolve().parent.parent
+STAGE_MODULES = ("extract", "transform", "compare", "load")
+INGEST_INTERVAL_SECONDS = 1800
+COMPARISON_INTERVAL_SECONDS = 3600
+
+
+class Job:
+    """A pipeline run on a fixed interval. Its lock stops runs overlapping, and its
+    database connection stays open from one run to the next."""
+
+    def __init__(self, name: str, run: Callable, connect: Callable, interval: float):
+        self.name = name
+        self.run = run
+        self.connect = connect
+        self.interval = interval
+        self.lock = Lock()
+        self.conn = None
+        self.next_run = monotonic()
+
+    def schedule_next(self, now: float) -> None:
+        """Moves the next run on by one interval, skipping any runs already missed"""
+        self.next_run += self.interval
+        if self.next_run <= now:
+            self.next_run = now + self.interval
+
+
+def import_pipeline(directory: Path, names: list) -> dict:
+    """Imports a pipeline's stage modules from its folder and returns them by name.
+    Both pipelines name their stages extract, transform and load, so the stages are
+    taken back out of sys.modules to let the other pipeline import its own."""
+
+    sys.path.insert(0, str(directory))
+    for name in STAGE_MODULES:
+        sys.modules.pop(name, None)
+    try:
+        return {name: importlib.import_module(name) for name in names}
+    finally:
+        for name in STAGE_MODULES:
+            sys.modules.pop(name, None)
+
+
+def healthy_connection(conn: connection, connect: Callable) -> connection:
+    """Returns the open connection if it still answers, otherwise a new one"""
+
+    if conn is not None and not conn.closed:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return conn
+        except (OperationalError, InterfaceError):
+            conn.close()
+
+    return connect()
+
+
+def run_ingest(stages: dict, conn: connection) -> None:
+    """One run of the scraping pipeline, as pipeline/main.py does, over a kept connection"""
+
+    articles, rss_feed, feed_polls = stages["extract"].extract_data(conn=conn)
+    transformed_articles = stages["transform"].transform_data(articles, rss_feed)
+    stages["load"].load_data(transformed_articles, rss_feed, feed_polls, conn=conn)
+
+
+def run_comparison(stages: dict, conn: connection) -> None:
+    """One run of the comparison pipeline, as comparison_pipeline/main.py does,
+    over a kept connection"""
+
+    scraped_articles, previous_versions, checks = stages["extract"].extract_data(
+        conn=conn)
+    changes, article_versions = stages["transform"].transform_data(scraped_articles,
+                                                                   previous_versions)
+    article_changes = stages["compare"].compare_data(changes)
+    stages["load"].load_data(article_versions, article_changes, previous_versions,
+                             checks, conn=conn)
+
+
+def end_transaction(job: Job) -> None:
+    """Rolls back anything a run left open on the job's connection. A connection that
+    fails to roll back is closed and dropped, for the next run to reconnect."""
+
+    if job.conn is None or job.conn.closed:
+        return
+    try:
+        job.conn.rollback()
+    except (OperationalError, InterfaceError) as exc:
+        print(f"{job.name}: dropping broken connection: {exc}")
+        try:
+            job.conn.close()
+        finally:
+            job.conn = None
+
+
+def run_job(job: Job) -> None:
+    """Runs a job unless its previous run is still going, reconnecting first if its
+    connection has dropped and ending any transaction left open afterwards"""
+
+    if not job.lock.acquire(blocking=False):
+        print(f"{job.name}: previous run still going; skipping this one")
+        return
+
+    try:
+        started = perf_counter()
+        job.conn = healthy_connection(job.conn, job.connect)
+        if job.conn is None:
+            print(f"{job.name}: no database connection; skipping this run")
+            return
+        job.run(job.conn)
+        print(f"{job.name}: run took {perf_counter() - started:.2f}s")
+    except Exception as exc:
+        print(f"{job.name}: run failed: {exc}")
+    finally:
+        try:
+            end_transaction(job)
+        finally:
+            job.lock.release()
+
+
+def run_forever(jobs: list, stop: Event) -> None:
+    """Starts each job whenever it is due until stop is set, then waits for running jobs"""
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        while not stop.is_set():
+            now = monotonic()
+            for job in jobs:
+                if job.next_run <= now:
+                    job.schedule_next(now)
+                    executor.submit(run_job, job)
+            stop.wait(max(min(job.next_run for job in jobs) - monotonic(), 0))
+
+
+def build_jobs() -> list:
+    """Imports both pipelines and returns their jobs, with intervals from the environment"""
+
+    sys.path.append(str(ROOT / "shared"))
+    ingest = import_pipeline(ROOT / "pipeline", ["extract", "transform", "load"])
+    comparison = import_pipeline(ROOT / "comparison_pipeline",
+                                 ["extract", "transform", "compare", "load"])
+
+    return [Job("ingest", lambda conn: run_ingest(ingest, conn),
+                ingest["load"].get_db_connection,
+                float(environ.get("INGEST_INTERVAL_SECONDS", INGEST_INTERVAL_SECONDS))),
+            Job("comparison", lambda conn: run_comparison(comparison, conn),
+                comparison["extract"].get_db_connection,
+                float(environ.get("COMPARISON_INTERVAL_SECONDS", COMPARISON_INTERVAL_SECONDS)))]
+
+
+if __name__ == "__main__":
+
+    load_dotenv()
+    # diff workers are started from a clean server process, not forked from threads
+    multiprocessing.set_start_method("forkserver")
+    stop_event = Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    run_forever(build_jobs(), stop_event)
@@ -0,0 +1,124 @@
+# pylint: skip-file
+"""
+Tests daemon.py scheduling, locking and connection reuse
+"""
+from threading import Event, Thread
+from unittest.mock import MagicMock, patch
+from psycopg2 import OperationalError
+from daemon import Job, import_pipeline, healthy_connection, run_job, run_forever, run_ingest, ROOT
+
+
+def test_import_pipeline_keeps_stages_apart():
+    """Tests that both pipelines' extract and load modules are imported side by side"""
+    import sys
+    sys.path.append(str(ROOT / "shared"))
+    ingest = import_pipeline(ROOT / "pipeline", ["extract", "load"])
+    comparison = import_pipeline(ROOT / "comparison_pipeline", ["extract", "load"])
+
+    assert ingest["extract"] is not comparison["extract"]
+    assert ingest["extract"].__file__.endswith("pipeline/extract.py")
+    assert comparison["load"].__file__.endswith("comparison_pipeline/load.py")
+    assert comparison["load"].get_db_connection is comparison["extract"].get_db_connection
+    assert "extract" not in sys.modules
+
+
+def test_healthy_connection_is_reused():
+    """Tests that an open connection that answers is kept"""
+    conn = MagicMock(closed=0)
+    connect = MagicMock()
+    assert healthy_connection(conn, connect) is conn
+    assert connect.call_count == 0
+
+
+def test_dropped_connection_is_replaced():
+    """Tests that a connection failing its check is closed and replaced"""
+    conn = MagicMock(closed=0)
+    conn.cursor().__enter__().execute.side_effect = OperationalError
+    connect = MagicMock()
+    assert healthy_connection(conn, connect) is connect.return_value
+    assert conn.close.call_count == 1
+
+
+def test_run_job_reuses_connection_between_runs():
+    """Tests that a job connects once and ends each run's transaction"""
+    run = MagicMock()
+    connect = MagicMock()
+    connect.return_value.closed = 0
+    job = Job("ingest", run, connect, 60)
+
+    run_job(job)
+    run_job(job)
+    assert connect.call_count == 1
+    assert run.call_count == 2
+    assert connect.return_value.rollback.call_count == 3
+
+
+def test_run_job_skips_while_running():
+    """Tests that a run is skipped while the job's previous run holds its lock"""
+    run = MagicMock()
+    job = Job("comparison", run, MagicMock(), 60)
+    job.lock.acquire()
+    run_job(job)
+    assert run.call_count == 0
+
+
+def test_run_job_survives_failures():
+    """Tests that a failing run releases the lock for the next one"""
+    job = Job("ingest", MagicMock(side_effect=Exception("boom")), MagicMock(), 60)
+    run_job(job)
+    assert not job.lock.locked()
+
+
+def test_run_job_drops_connection_that_fails_rollback():
+    """Tests that a broken connection still reporting open releases the lock and is
+    replaced on the next run"""
+    broken = MagicMock(closed=0)
+    broken.rollback.side_effect = OperationalError("server closed the connection")
+    fresh = MagicMock(closed=0)
+    run = MagicMock()
+    job = Job("comparison", run, MagicMock(side_effect=[broken, fresh]), 60)
+
+    with patch("daemon.healthy_connection", side_effect=lambda conn, connect: conn or connect()):
+        run_job(job)
+        assert not job.lock.locked()
+        assert job.conn is None
+        assert broken.close.call_count == 1
+        run_job(job)
+    assert run.call_args.args == (fresh,)
+
+
+def test_schedule_next_skips_missed_runs():
+    """Tests that a job running late is not started repeatedly to catch up"""
+    job = Job("ingest", MagicMock(), MagicMock(), 10)
+    job.next_run = 0
+    job.schedule_next(now=35)
+    assert job.next_run == 45
+
+
+def test_run_forever_runs_jobs_on_their_intervals():
+    """Tests that each job runs at its own interval until stopped"""
+    stop = Event()
+    fast = Job("fast", MagicMock(), MagicMock(), 0.05)
+    slow = Job("slow", MagicMock(), MagicMock(), 10)
+    thread = Thread(target=run_forever, args=([fast, slow], stop))
+    thread.start()
+    stop.wait(0.22)
+    stop.set()
+    thread.join(timeout=2)
+
+    assert not thread.is_alive()
+    assert fast.run.call_count >= 3
+    assert slow.run.call_count == 1
+
+
+def test_run_ingest_passes_connection_through():
+    """Tests that the ingest stages run in order over the job's connection"""
+    stages = {"extract": MagicMock(), "transform": MagicMock(), "load": MagicMock()}
+    stages["extract"].extract_data.return_value = ("articles", "feed", "polls")
+    conn = MagicMock()
+
+    run_ingest(stages, conn)
+    assert stages["extract"].extract_data.call_args.kwargs == {"conn": conn}
+    stages["transform"].transform_data.assert_called_with("articles", "feed")
+    stages["load"].load_data.assert_called_with(
+        stages["transform"].transform_data.return_value, "feed", "polls", conn=conn)
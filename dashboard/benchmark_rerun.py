@@ -0,0 +1,53 @@
+"""Benchmark of dashboard rerun latency, run from the dashboard folder against the
+database in .env. Each rerun is timed with the query cache cleared first, as every
+rerun was before caching, and with the cache kept, as repeat interactions are now.
+Database round trips are counted by the pooled connections checked out for cache misses."""
+
+from statistics import median
+from time import perf_counter
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+import data_access
+
+RERUNS = 5
+APP_TIMEOUT_SECONDS = 300
+
+
+def count_connections() -> dict:
+    """Wraps the pool's checkout so every connection used for a query is counted"""
+
+    counter = {"connections": 0}
+    checkout = data_access.BlockingConnectionPool.checkout
+
+    def counted_checkout(pool):
+        counter["connections"] += 1
+        return checkout(pool)
+
+    data_access.BlockingConnectionPool.checkout = counted_checkout
+    return counter
+
+
+def time_reruns(app: AppTest, counter: dict, clear_cache: bool) -> tuple[float, float]:
+    """Returns the median rerun time and round trips per rerun of the homepage"""
+
+    timings = []
+    counter["connections"] = 0
+    for _ in range(RERUNS):
+        if clear_cache:
+            st.cache_data.clear()
+        started = perf_counter()
+        app.run()
+        timings.append(perf_counter() - started)
+
+    return median(timings), counter["connections"] / RERUNS
+
+
+if __name__ == "__main__":
+
+    connection_counter = count_connections()
+    homepage = AppTest.from_file("main.py", default_timeout=APP_TIMEOUT_SECONDS)
+    homepage.run()
+
+    for label, clear in [("uncached", True), ("cached", False)]:
+        seconds, round_trips = time_reruns(homepage, connection_counter, clear)
+        print(f"{label}: {seconds * 1000:.0f}ms per rerun, {round_trips:.0f} round trips")
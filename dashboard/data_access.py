@@ -0,0 +1,306 @@
+"""Cached queries for the dashboard. Results are kept until a pipeline run finishes,
+so reruns of the page for the same data cost no database round trips. Chart counts
+are read from the summary tables the comparison pipeline keeps up to date."""
+
+from contextlib import contextmanager
+from os import environ
+from threading import BoundedSemaphore
+from time import monotonic
+from dotenv import load_dotenv
+import pandas as pd
+from psycopg2 import OperationalError, InterfaceError
+from psycopg2.extensions import connection
+from psycopg2.pool import ThreadedConnectionPool
+import streamlit as st
+
+MARKER_TTL_SECONDS = 30
+CACHE_TTL_SECONDS = 3600
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 10
+HEALTH_CHECK_IDLE_SECONDS = 60
+SEARCH_PAGE_SIZE = 50
+SEARCH_CACHE_ENTRIES = 1000
+
+
+class BlockingConnectionPool(ThreadedConnectionPool):
+    """Thread-safe connection pool that waits for a free connection rather than raising
+    when all are checked out, and checks connections left idle before handing them out"""
+
+    def __init__(self, minconn: int, maxconn: int, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.slots = BoundedSemaphore(maxconn)
+        self.returned_at = {}
+
+    def checkout(self) -> connection:
+        """Waits for a connection, replacing it if it has closed or fails a check
+        after being idle for HEALTH_CHECK_IDLE_SECONDS"""
+
+        self.slots.acquire()
+        try:
+            conn = self.getconn()
+            idle = monotonic() - self.returned_at.get(id(conn), monotonic())
+            if conn.closed or (idle > HEALTH_CHECK_IDLE_SECONDS and not is_healthy(conn)):
+                self.putconn(conn, close=True)
+                conn = self.getconn()
+            return conn
+        except Exception:
+            self.slots.release()
+            raise
+
+    def checkin(self, conn: connection, broken: bool = False) -> None:
+        """Returns a connection to the pool, closing it if it is broken"""
+
+        try:
+            self.returned_at[id(conn)] = monotonic()
+            self.putconn(conn, close=broken or bool(conn.closed))
+        finally:
+            self.slots.release()
+
+
+def is_healthy(conn: connection) -> bool:
+    """Returns whether a connection still answers a trivial query"""
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+        conn.rollback()
+        return True
+    except (OperationalError, InterfaceError):
+        return False
+
+
+@st.cache_resource
+def get_connection_pool() -> BlockingConnectionPool:
+    """Returns the connection pool shared by every session of the dashboard"""
+
+    load_dotenv()
+
+    return BlockingConnectionPool(POOL_MIN_CONNECTIONS,
+                                  int(environ.get("DB_POOL_SIZE", POOL_MAX_CONNECTIONS)),
+                                  host=environ["DB_HOST"],
+                                  user=environ["DB_USER"],
+                                  password=environ["DB_PASSWORD"],
+                                  port=environ["DB_PORT"],
+                                  dbname=environ["DB_NAME"])
+
+
+@contextmanager
+def db_cursor():
+    """Yields a cursor on a pooled connection for one query, ending its transaction and
+    returning the connection afterwards. Connections that error are discarded."""
+
+    pool = get_connection_pool()
+    conn = pool.checkout()
+    broken = False
+    try:
+        with conn.cursor() as cur:
+            yield cur
+    except (OperationalError, InterfaceError):
+        broken = True
+        raise
+    finally:
+        if not broken and not conn.closed:
+            conn.rollback()
+        pool.checkin(conn, broken)
+
+
+@st.cache_data(ttl=MARKER_TTL_SECONDS, show_spinner=False)
+def get_run_marker() -> str:
+    """Returns when a pipeline last finished loading. Every other query takes this as
+    run_marker, so their cached results are dropped when new data arrives. It is itself
+    cached for MARKER_TTL_SECONDS, so new data shows up within that time."""
+
+    with db_cursor() as cur:
+        cur.execute("SELECT MAX(finished_at) FROM pipeline_run;")
+        return str(cur.fetchone()[0])
+
+
+# setup data
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def retrieve_highest_change_count(run_marker: str) -> str:
+    """Retrieves the higest article change count"""
+
+    with db_cursor() as cur:
+        cur.execute("""SELECT COALESCE(MAX(change_count), 0)
+                    FROM changes.change_count_histogram;""")
+
+        data = cur.fetchone()[0]
+
+        return data
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def retrieve_article_change_with_id(article_id: int, run_marker: str) -> pd.DataFrame:
+    """Retrieves article information from article_change by id"""
+
+    with db_cursor() as cur:
+
+        cur.execute("""SELECT article_id, article_url, change_type,\
+            previous_version, current_version, last_scraped, current_scraped,
+                    similarity, diff FROM changes.article_change WHERE article_id = %s;""", [str(article_id)])
+
+        data = cur.fetchall()
+
+    return pd.DataFrame(data, columns=["article_id", "article_url",
+                                       "change_type", "previous_version", "current_version",
+                                       "last_scraped", "current_scraped", "similarity", "diff"])
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def retrieve_authors_by_id(article_id: int, run_marker: str) -> list:
+    """Retrieves all authors for the given article_id"""
+
+    with db_cursor() as cur:
+        cur.execute("""SELECT author_name FROM author a LEFT JOIN article_author
+                    aa ON a.author_id = aa.author_id WHERE aa.article_id = %s;"""\
+                    , [str(article_id)])
+        data = cur.fetchall()
+        if len(data) > 0:
+            return ", ".join([author[0] for author in data])
+        else:
+            return "None recorded"
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def retrieve_article_with_most_changes(run_marker: str) -> pd.DataFrame:
+    """Retrieves article with most changes"""
+
+    with db_cursor() as cur:
+        cur.execute("""SELECT a.first_heading, c.article_url, c.change_count
+                    FROM changes.article_change_count c
+                    JOIN article a ON a.article_id = c.article_id
+                    ORDER BY c.change_count DESC LIMIT 10;""")
+
+        data = cur.fetchall()
+
+    return pd.DataFrame(data, columns=["Heading", "URL",
+                                       "Number of Changes"])
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def retrieve_article_count(run_marker: str) -> str:
+    """Retrieves a current article count"""
+
+    with db_cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM article;")
+        data = cur.fetchone()[0]
+        return data
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def retrieve_author_count(run_marker: str) -> str:
+    """Retrieves a current author count"""
+
+    with db_cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM author;")
+        data = cur.fetchone()[0]
+        return data
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def retrieve_article_count_above_number(above: str, run_marker: str) -> str:
+    """Retrieves article count with changes above number"""\
+
+    with db_cursor() as cur:
+        cur.execute("""SELECT COALESCE(SUM(article_count), 0)
+                    FROM changes.change_count_histogram WHERE change_count > %s;""", [above])
+        data = cur.fetchone()[0]
+        return data
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def retrieve_articles_per_source(run_marker: str) -> pd.DataFrame:
+    """Returns the amount of articles per source"""
+    with db_cursor() as cur:
+        cur.execute("""SELECT count(article_id), source from article GROUP BY source;""")
+        data = cur.fetchall()
+        return pd.DataFrame(data, columns=["Count", "Source"])
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def retrieve_author_change_count(run_marker: str) -> pd.DataFrame:
+    """Retrieves amount of changes per author"""
+    with db_cursor() as cur:
+        cur.execute("""SELECT ar.author_name, c.change_count
+                FROM changes.author_change_count c
+                JOIN author ar ON ar.author_id = c.author_id
+                ORDER BY c.change_count DESC LIMIT 12;""")
+        data = cur.fetchall()
+        return pd.DataFrame(data, columns=["Author Name", "Changes"])
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def retrieve_author_count_per_change(run_marker: str) -> pd.DataFrame:
+    """Retrieves number of authors per number of changes, counting authors
+    without changes as having none"""
+
+    with db_cursor() as cur:
+        cur.execute("""SELECT COUNT(*), change_count FROM changes.author_change_count
+                GROUP BY change_count
+                UNION ALL
+                SELECT (SELECT COUNT(*) FROM author)
+                - (SELECT COUNT(*) FROM changes.author_change_count), 0
+                ORDER BY change_count ASC;""")
+        data = cur.fetchall()
+        return pd.DataFrame(data, columns=["Author Count", "Changes"])
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def retrieve_changed_vs_unchaged_counts(run_marker: str) -> pd.DataFrame:
+    """Retrieves counts for articles in changes.article_change and articles
+    not on the table"""
+
+    with db_cursor() as cur:
+        cur.execute("""SELECT COALESCE(SUM(article_count), 0)
+                    FROM changes.change_count_histogram;""")
+        changed = cur.fetchone()[0]
+    # counted after the cursor is returned, so one call never holds two pooled connections
+    unchanged = retrieve_article_count(run_marker) - changed
+    return pd.DataFrame({"Status": ["Changed", "Unchanged"], "Count": [changed, unchanged]})
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def retrieve_change_type_counts(run_marker: str) -> pd.DataFrame:
+    """Retrieves counts for change_types"""
+
+    with db_cursor() as cur:
+        cur.execute("""SELECT change_type, change_count
+        FROM changes.change_type_count;""")
+        data = cur.fetchall()
+        return pd.DataFrame(data, columns=["Change Type", "Count"])
+
+
+# searchbar
+def like_pattern(text: str) -> str:
+    """Returns an ILIKE pattern matching text anywhere, with its wildcards escaped"""
+
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, max_entries=SEARCH_CACHE_ENTRIES, show_spinner=False)
+def search_articles(text: str, similarity: tuple, changes: tuple, source: str | None,
+                    after_id: int, run_marker: str,
+                    page_size: int = SEARCH_PAGE_SIZE) -> pd.DataFrame:
+    """Retrieves the next page of changed articles after after_id, in id order, whose
+    original heading contains text and whose lowest similarity, change count and source
+    match the filters. One row more than page_size is returned when there is a next page."""
+
+    with db_cursor() as cur:
+        cur.execute("""SELECT c.article_id, a.first_heading, c.min_similarity, c.change_count
+                FROM changes.article_change_count c
+                JOIN article a ON a.article_id = c.article_id
+                WHERE c.article_id > %(after_id)s
+                AND c.min_similarity >= %(min_similarity)s
+                AND c.min_similarity < %(max_similarity)s + 1
+                AND c.change_count BETWEEN %(min_changes)s AND %(max_changes)s
+                AND (%(source)s IS NULL OR a.source = %(source)s)
+                AND (%(text)s = '' OR a.first_heading ILIKE %(pattern)s)
+                ORDER BY c.article_id ASC LIMIT %(limit)s;""",
+                    {"after_id": after_id, "min_similarity": similarity[0],
+                     "max_similarity": similarity[1], "min_changes": changes[0],
+                     "max_changes": changes[1], "source": source, "text": text,
+                     "pattern": like_pattern(text), "limit": page_size + 1})
+        data = cur.fetchall()
+        return pd.DataFrame(data, columns=["article_id", "heading", "similarity",
+                                           "change_count"])
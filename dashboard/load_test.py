@@ -0,0 +1,71 @@
+"""Load test of the dashboard's database access, run from the dashboard folder against
+the (local) database in .env. Simulates concurrent viewers each rendering the homepage
+queries without the result cache, first over one connection shared by every session,
+as the dashboard used to, then over the connection pool."""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from statistics import quantiles
+from threading import Lock
+from time import perf_counter
+import data_access
+
+SESSIONS = [1, 2, 4, 8, 16]
+RENDERS_PER_SESSION = 10
+HOMEPAGE_QUERIES = [
+    data_access.retrieve_article_count,
+    data_access.retrieve_author_count,
+    data_access.retrieve_articles_per_source,
+    data_access.retrieve_highest_change_count,
+    data_access.retrieve_change_type_counts,
+    data_access.retrieve_changed_vs_unchaged_counts,
+    data_access.retrieve_author_change_count,
+    data_access.retrieve_article_with_most_changes]
+
+
+def render_homepage() -> float:
+    """Runs the homepage queries once, past the result cache, and returns the seconds taken"""
+
+    started = perf_counter()
+    for query in HOMEPAGE_QUERIES:
+        query.__wrapped__("load test")
+    data_access.retrieve_article_count_above_number.__wrapped__("5", "load test")
+
+    return perf_counter() - started
+
+
+def run_sessions(sessions: int) -> tuple[float, float]:
+    """Returns homepage renders per second and the p95 render time for concurrent sessions"""
+
+    started = perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        timings = list(executor.map(lambda _: render_homepage(),
+                                    range(sessions * RENDERS_PER_SESSION)))
+    elapsed = perf_counter() - started
+
+    return len(timings) / elapsed, quantiles(timings, n=20)[-1]
+
+
+@contextmanager
+def shared_connection_cursor():
+    """Stands in for db_cursor with one connection that every session queues for"""
+
+    with SHARED_LOCK:
+        with SHARED_CONNECTION.cursor() as cur:
+            yield cur
+        SHARED_CONNECTION.rollback()
+
+
+if __name__ == "__main__":
+
+    pooled_cursor = data_access.db_cursor
+    SHARED_LOCK = Lock()
+    SHARED_CONNECTION = data_access.get_connection_pool().checkout()
+
+    for label, cursor in [("shared connection", shared_connection_cursor),
+                          ("connection pool", pooled_cursor)]:
+        data_access.db_cursor = cursor
+        for session_count in SESSIONS:
+            renders, p95 = run_sessions(session_count)
+            print(f"{label}, {session_count} sessions: {renders:.1f} renders/s, "
+                  f"p95 {p95 * 1000:.0f}ms")
@@ -0,0 +1,8 @@
+-- Tracks when the comparison pipeline last re-scraped each article
+
+CREATE TABLE IF NOT EXISTS article_check (
+    article_id INT NOT NULL,
+    last_checked TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (article_id),
+    FOREIGN KEY (article_id) REFERENCES article(article_id)
+);
@@ -0,0 +1,28 @@
+-- Unique constraints relied on by the loaders' ON CONFLICT clauses.
+-- Fails if the existing data already holds duplicates, which must be removed first.
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'unique_article_url') THEN
+        ALTER TABLE article ADD CONSTRAINT unique_article_url UNIQUE (article_url);
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'unique_author_name') THEN
+        ALTER TABLE author ADD CONSTRAINT unique_author_name UNIQUE (author_name);
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'unique_article_author') THEN
+        ALTER TABLE article_author
+        ADD CONSTRAINT unique_article_author UNIQUE (article_id, author_id);
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'unique_article_version') THEN
+        ALTER TABLE article_version
+        ADD CONSTRAINT unique_article_version UNIQUE (article_id, scraped_at);
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'unique_article_change') THEN
+        ALTER TABLE changes.article_change
+        ADD CONSTRAINT unique_article_change UNIQUE (article_id, change_type, current_scraped);
+    END IF;
+END $$;
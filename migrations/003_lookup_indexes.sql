@@ -0,0 +1,13 @@
+-- Indexes for lookups not already served by a unique constraint.
+-- article_url, author_name, article_version(article_id, scraped_at) and
+-- article_change(article_id, ...) are indexed by their unique constraints.
+
+-- joins from author to article_author (author change charts)
+CREATE INDEX IF NOT EXISTS article_author_author_id_idx ON article_author (author_id);
+
+-- per-article minimum similarity for the dashboard searchbar, as an index-only scan
+CREATE INDEX IF NOT EXISTS article_change_similarity_idx
+    ON changes.article_change (article_id, similarity);
+
+-- articles per source
+CREATE INDEX IF NOT EXISTS article_source_idx ON article (source);
@@ -0,0 +1,10 @@
+-- md5 digests of each version's heading and body, so change detection can
+-- compare fixed-size hashes and only pull full text for changed articles.
+ALTER TABLE article_version ADD COLUMN IF NOT EXISTS heading_hash TEXT;
+ALTER TABLE article_version ADD COLUMN IF NOT EXISTS body_hash TEXT;
+
+UPDATE article_version SET heading_hash = md5(heading), body_hash = md5(body)
+WHERE heading_hash IS NULL OR body_hash IS NULL;
+
+ALTER TABLE article_version ALTER COLUMN heading_hash SET NOT NULL;
+ALTER TABLE article_version ALTER COLUMN body_hash SET NOT NULL;
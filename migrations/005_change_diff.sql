@@ -0,0 +1,7 @@
+-- Changes are stored once as json diff hunks, [word offset, [[op, text], ...]],
+-- instead of two sentinel-joined strings. Older rows keep their
+-- previous_version/current_version text, which the dashboard still reads.
+ALTER TABLE changes.article_change ADD COLUMN IF NOT EXISTS diff JSONB;
+
+ALTER TABLE changes.article_change ALTER COLUMN previous_version DROP NOT NULL;
+ALTER TABLE changes.article_change ALTER COLUMN current_version DROP NOT NULL;
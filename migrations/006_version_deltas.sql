@@ -0,0 +1,9 @@
+-- Versions may store their body as a delta against the previous version instead of
+-- in full (VERSION_STORAGE=delta). Every article keeps periodic full snapshots.
+ALTER TABLE article_version ADD COLUMN IF NOT EXISTS body_delta TEXT;
+
+ALTER TABLE article_version ALTER COLUMN body DROP NOT NULL;
+
+ALTER TABLE article_version DROP CONSTRAINT IF EXISTS article_version_body_check;
+ALTER TABLE article_version ADD CONSTRAINT article_version_body_check
+    CHECK (body IS NOT NULL OR body_delta IS NOT NULL);
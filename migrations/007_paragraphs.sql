@@ -0,0 +1,8 @@
+-- Bodies now keep their paragraphs, separated by newlines. Each version stores the
+-- digest of every paragraph, and body changes where paragraphs are known are recorded
+-- as 'paragraph' changes holding only the inserted, removed or edited paragraphs.
+-- body_hash stays the digest of the paragraphs joined by spaces, so it still matches
+-- versions stored before.
+ALTER TABLE article_version ADD COLUMN IF NOT EXISTS paragraph_hashes TEXT[];
+
+ALTER TYPE changes.change_types ADD VALUE IF NOT EXISTS 'paragraph';
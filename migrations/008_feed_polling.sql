@@ -0,0 +1,22 @@
+-- The scraping pipeline polls each feed with the ETag and Last-Modified it last
+-- returned, and skips entries it has already scraped, so a poll with no news
+-- downloads no articles. Existing articles are marked as seen so the first poll
+-- after this migration does not scrape them again.
+CREATE TABLE IF NOT EXISTS feed_state (
+    feed_url TEXT NOT NULL,
+    etag TEXT,
+    modified TEXT,
+    last_polled TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (feed_url)
+);
+
+CREATE TABLE IF NOT EXISTS feed_entry_seen (
+    entry_url TEXT NOT NULL,
+    source TEXT NOT NULL,
+    first_seen TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (entry_url)
+);
+
+INSERT INTO feed_entry_seen (entry_url, source, first_seen)
+SELECT article_url, source, created_at FROM article
+ON CONFLICT (entry_url) DO NOTHING;
@@ -0,0 +1,7 @@
+-- Each pipeline records when its last load committed. The dashboard keys its query
+-- cache on the latest of these, so cached results are dropped when new data arrives.
+CREATE TABLE IF NOT EXISTS pipeline_run (
+    pipeline TEXT NOT NULL,
+    finished_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (pipeline)
+);
@@ -0,0 +1,54 @@
+-- Pre-aggregated counts behind the dashboard charts, kept up to date by the comparison
+-- pipeline as it inserts changes, so the charts read a few rows instead of grouping
+-- every change. Re-running this recomputes them from changes.article_change.
+CREATE TABLE IF NOT EXISTS changes.change_type_count (
+    change_type changes.change_types NOT NULL,
+    change_count INT NOT NULL,
+    PRIMARY KEY (change_type)
+);
+
+CREATE TABLE IF NOT EXISTS changes.article_change_count (
+    article_id INT NOT NULL,
+    article_url TEXT NOT NULL,
+    change_count INT NOT NULL,
+    min_similarity FLOAT NOT NULL,
+    PRIMARY KEY (article_id)
+);
+
+CREATE INDEX IF NOT EXISTS article_change_count_change_count_idx
+    ON changes.article_change_count (change_count);
+
+CREATE TABLE IF NOT EXISTS changes.change_count_histogram (
+    change_count INT NOT NULL,
+    article_count INT NOT NULL,
+    PRIMARY KEY (change_count)
+);
+
+CREATE TABLE IF NOT EXISTS changes.author_change_count (
+    author_id INT NOT NULL,
+    change_count INT NOT NULL,
+    PRIMARY KEY (author_id)
+);
+
+CREATE INDEX IF NOT EXISTS author_change_count_change_count_idx
+    ON changes.author_change_count (change_count);
+
+TRUNCATE changes.change_type_count, changes.article_change_count,
+    changes.change_count_histogram, changes.author_change_count;
+
+INSERT INTO changes.change_type_count (change_type, change_count)
+SELECT change_type, COUNT(*) FROM changes.article_change
+WHERE change_type IS NOT NULL GROUP BY change_type;
+
+INSERT INTO changes.article_change_count (article_id, article_url, change_count,
+    min_similarity)
+SELECT article_id, MIN(article_url), COUNT(*), MIN(similarity)
+FROM changes.article_change GROUP BY article_id;
+
+INSERT INTO changes.change_count_histogram (change_count, article_count)
+SELECT change_count, COUNT(*) FROM changes.article_change_count GROUP BY change_count;
+
+INSERT INTO changes.author_change_count (author_id, change_count)
+SELECT aa.author_id, COUNT(*) FROM changes.article_change c
+JOIN article_author aa ON aa.article_id = c.article_id
+GROUP BY aa.author_id;
@@ -0,0 +1,9 @@
+-- Each article stores the heading it was first scraped with, written by the scraping
+-- pipeline with the article, so the dashboard reads it with a join rather than
+-- finding each article's earliest version. Existing articles are backfilled.
+ALTER TABLE article ADD COLUMN IF NOT EXISTS first_heading TEXT;
+
+UPDATE article a SET first_heading = v.heading
+FROM (SELECT DISTINCT ON (article_id) article_id, heading FROM article_version
+ORDER BY article_id, scraped_at ASC) v
+WHERE a.article_id = v.article_id AND a.first_heading IS NULL;
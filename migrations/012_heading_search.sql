@@ -0,0 +1,6 @@
+-- Trigram index on original headings, so the dashboard's article search can match any
+-- part of a heading with ILIKE in the database instead of filtering every heading in pandas.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS article_first_heading_trgm_idx
+    ON article USING GIN (first_heading gin_trgm_ops);
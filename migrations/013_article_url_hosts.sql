@@ -0,0 +1,3 @@
+-- Article urls are no longer required to contain "www.", which rejected sources
+-- registered in feeds.json whose hosts have none, such as news.sky.com.
+ALTER TABLE article DROP CONSTRAINT IF EXISTS check_article_url;
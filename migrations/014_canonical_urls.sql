@@ -0,0 +1,38 @@
+-- The scraping pipeline identifies feed entries by their canonical url (feeds.canonical_url:
+-- no fragment or utm_/at_/cmp/ocid parameters, lower case scheme and host), but articles
+-- and the seen index seeded by 008 hold the raw feed urls, so every stored article read
+-- as new to the first poll after it. Stored urls are rewritten to the same canonical
+-- form. Other query parameters are kept as stored rather than re-encoded.
+CREATE FUNCTION pg_temp.canonical_url(url TEXT) RETURNS TEXT LANGUAGE SQL IMMUTABLE AS $$
+SELECT COALESCE(lower(parts[1]) || parts[2] || COALESCE('?' || (
+    SELECT string_agg(param, '&' ORDER BY position)
+    FROM unnest(string_to_array(parts[3], '&')) WITH ORDINALITY AS p(param, position)
+    WHERE param <> '' AND lower(param) !~ '^(utm_|at_|cmp|ocid)'), ''),
+    split_part(btrim(url), '#', 1))
+FROM (SELECT regexp_match(split_part(btrim(url), '#', 1),
+    '^([^/?]*//[^/?]*)([^?]*)\??(.*)$') AS parts) m
+$$;
+
+-- an article already stored under its canonical url, or under another raw form of it,
+-- keeps its url; the earliest of the others takes the canonical one
+UPDATE article a SET article_url = c.canonical
+FROM (SELECT DISTINCT ON (pg_temp.canonical_url(article_url)) article_id,
+    pg_temp.canonical_url(article_url) AS canonical
+    FROM article ORDER BY pg_temp.canonical_url(article_url), article_id) c
+WHERE a.article_id = c.article_id AND a.article_url <> c.canonical
+AND NOT EXISTS (SELECT 1 FROM article b WHERE b.article_url = c.canonical);
+
+UPDATE changes.article_change c SET article_url = a.article_url
+FROM article a WHERE c.article_id = a.article_id AND c.article_url <> a.article_url;
+
+UPDATE changes.article_change_count c SET article_url = a.article_url
+FROM article a WHERE c.article_id = a.article_id AND c.article_url <> a.article_url;
+
+INSERT INTO feed_entry_seen (entry_url, source, first_seen)
+SELECT pg_temp.canonical_url(entry_url), source, MIN(first_seen) FROM feed_entry_seen
+GROUP BY pg_temp.canonical_url(entry_url), source
+ON CONFLICT (entry_url) DO NOTHING;
+
+DELETE FROM feed_entry_seen WHERE entry_url <> pg_temp.canonical_url(entry_url);
+
+DROP FUNCTION pg_temp.canonical_url(TEXT);
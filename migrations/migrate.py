@@ -0,0 +1,78 @@
+"""Applies the numbered sql migrations in this folder that the database has not seen yet"""
+
+from os import environ
+from pathlib import Path
+from dotenv import load_dotenv
+from psycopg2 import connect
+from psycopg2.extensions import connection
+
+MIGRATIONS_DIR = Path(__file__).parent
+
+
+def get_db_connection() -> connection:
+    """Returns connection to the rds database"""
+
+    load_dotenv()
+
+    return connect(host=environ["DB_HOST"],
+                   user=environ["DB_USER"],
+                   password=environ["DB_PASSWORD"],
+                   port=environ["DB_PORT"],
+                   dbname=environ["DB_NAME"])
+
+
+def get_migration_files(directory: Path = MIGRATIONS_DIR) -> list:
+    """Returns the migration files in version order"""
+
+    return sorted(directory.glob("[0-9][0-9][0-9]_*.sql"))
+
+
+def get_applied_versions(conn: connection) -> set:
+    """Returns the versions already applied, creating the tracking table if needed"""
+
+    with conn.cursor() as cur:
+        cur.execute("""CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    PRIMARY KEY (version));""")
+        cur.execute("SELECT version FROM schema_migrations;")
+        applied = {row[0] for row in cur.fetchall()}
+    conn.commit()
+
+    return applied
+
+
+def apply_migration(conn: connection, migration: Path) -> None:
+    """Runs one migration file and records it, in a single transaction"""
+
+    with conn.cursor() as cur:
+        cur.execute(migration.read_text())
+        cur.execute("INSERT INTO schema_migrations (version) VALUES (%s);", [migration.stem])
+    conn.commit()
+
+
+def migrate(conn: connection) -> list:
+    """Applies every pending migration in order and returns their versions"""
+
+    applied = get_applied_versions(conn)
+    pending = [migration for migration in get_migration_files()
+               if migration.stem not in applied]
+
+    for migration in pending:
+        try:
+            apply_migration(conn, migration)
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Applied {migration.stem}")
+
+    return [migration.stem for migration in pending]
+
+
+if __name__ == "__main__":
+
+    db_conn = get_db_connection()
+    try:
+        migrate(db_conn)
+    finally:
+        db_conn.close()
@@ -0,0 +1,171 @@
+# pylint: skip-file
+"""
+EXPLAIN based checks that the pipeline and dashboard lookups use indexes.
+Runs against an empty scratch database named by TEST_DB_NAME (using the usual
+DB_HOST/DB_USER/DB_PASSWORD/DB_PORT), and is skipped when that is not set.
+"""
+from os import environ
+from pathlib import Path
+import pytest
+from dotenv import load_dotenv
+from psycopg2 import connect
+from migrate import migrate, get_migration_files
+
+SCHEMA_FILE = Path(__file__).parent.parent / "schema.sql"
+SEED_SQL = """
+INSERT INTO article (article_url, source, created_at)
+SELECT 'https://www.bbc.co.uk/news/' || n, 'BBC', NOW() - n * INTERVAL '1 minute'
+FROM generate_series(1, 20000) n;
+
+UPDATE article SET first_heading = 'Heading ' || article_id;
+
+INSERT INTO author (author_name) SELECT 'Author ' || n FROM generate_series(1, 5000) n;
+
+INSERT INTO article_author (article_id, author_id)
+SELECT article_id, 1 + article_id % 5000 FROM article;
+
+INSERT INTO article_version (scraped_at, heading, body, article_id, heading_hash, body_hash)
+SELECT a.created_at + v * INTERVAL '30 minutes', 'Heading ' || a.article_id,
+repeat('body text ', 50), a.article_id, md5('Heading ' || a.article_id),
+md5(repeat('body text ', 50))
+FROM article a, generate_series(0, 4) v;
+
+INSERT INTO changes.article_change (article_id, article_url, change_type, previous_version,
+current_version, last_scraped, current_scraped, similarity)
+SELECT a.article_id, a.article_url, 'body', 'old', 'new', a.created_at,
+a.created_at + v * INTERVAL '30 minutes', 90
+FROM article a, generate_series(1, 2) v WHERE a.article_id % 3 = 0;
+
+ANALYZE;
+"""
+
+
+def schema_statements() -> str:
+    """Returns schema.sql without the psql-only database create and connect lines"""
+    lines = SCHEMA_FILE.read_text().splitlines()
+    return "\n".join(line for line in lines
+                     if not line.startswith(("DROP DATABASE", "CREATE DATABASE", "\\c")))
+
+
+@pytest.fixture(scope="module")
+def seeded_conn():
+    """Connection to the scratch database with the schema, migrations and seed data"""
+    load_dotenv()
+    if "TEST_DB_NAME" not in environ:
+        pytest.skip("TEST_DB_NAME not set")
+
+    conn = connect(host=environ["DB_HOST"], user=environ["DB_USER"],
+                   password=environ["DB_PASSWORD"], port=environ["DB_PORT"],
+                   dbname=environ["TEST_DB_NAME"])
+    with conn.cursor() as cur:
+        cur.execute("""DROP SCHEMA IF EXISTS changes CASCADE;
+                    DROP SCHEMA public CASCADE; CREATE SCHEMA public;""")
+        cur.execute(schema_statements())
+        cur.execute("SET search_path TO public;")
+    conn.commit()
+    migrate(conn)
+    with conn.cursor() as cur:
+        cur.execute(SEED_SQL)
+    conn.commit()
+
+    yield conn
+    conn.close()
+
+
+def plan_nodes(plan: dict) -> list:
+    """Returns every node in an EXPLAIN (FORMAT JSON) plan"""
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+def explain(conn, query: str, params: list) -> list:
+    """Returns the plan nodes for a query"""
+    with conn.cursor() as cur:
+        cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+        return plan_nodes(cur.fetchone()[0][0]["Plan"])
+
+
+@pytest.mark.parametrize("query, params, table", [
+    ("SELECT article_url FROM article WHERE article_url = ANY(%s);",
+     [["https://www.bbc.co.uk/news/1", "https://www.bbc.co.uk/news/2"]], "article"),
+    ("SELECT author_name, author_id FROM author WHERE author_name = ANY(%s);",
+     [["Author 1", "Author 2"]], "author"),
+    ("""SELECT heading FROM article_version WHERE article_id = %s
+     ORDER BY scraped_at ASC LIMIT 1;""", ["500"], "article_version"),
+    ("""SELECT article_id, similarity FROM changes.article_change
+     WHERE article_id = %s;""", ["300"], "article_change"),
+    ("SELECT article_id FROM article_author WHERE author_id = %s;", [10], "article_author"),
+    ("SELECT article_id FROM article WHERE first_heading ILIKE %s;", ["%ding 1234%"], "article"),
+])
+def test_lookup_uses_index(seeded_conn, query, params, table):
+    """Tests that each lookup reads its table through an index, not a sequential scan"""
+    nodes = [node for node in explain(seeded_conn, query, params)
+             if node.get("Relation Name") == table]
+    assert nodes
+    assert all(node["Node Type"] != "Seq Scan" for node in nodes)
+
+
+def test_migrations_are_idempotent(seeded_conn):
+    """Tests that re-running migrations on an up to date database applies nothing"""
+    assert migrate(seeded_conn) == []
+
+
+def test_migration_files_are_ordered():
+    """Tests that migrations are found and sorted by version number"""
+    versions = [migration.stem for migration in get_migration_files()]
+    assert versions == sorted(versions)
+    assert versions[0].startswith("001_")
+
+
+
+def test_change_summaries_match_changes(seeded_conn):
+    """Tests that the recomputed change summaries agree with grouping the changes"""
+    summaries = Path(__file__).parent / "010_change_summaries.sql"
+    with seeded_conn.cursor() as cur:
+        cur.execute(summaries.read_text())
+        cur.execute("""SELECT change_count, COUNT(*) FROM (SELECT COUNT(*) AS change_count
+                    FROM changes.article_change GROUP BY article_id) c
+                    GROUP BY change_count ORDER BY change_count;""")
+        grouped = cur.fetchall()
+        cur.execute("""SELECT change_count, article_count FROM changes.change_count_histogram
+                    ORDER BY change_count;""")
+        assert cur.fetchall() == grouped
+        cur.execute("SELECT SUM(change_count) FROM changes.change_type_count;")
+        summed = cur.fetchone()[0]
+        cur.execute("SELECT COUNT(*) FROM changes.article_change;")
+        assert summed == cur.fetchone()[0]
+    seeded_conn.rollback()
+
+
+def test_article_url_without_www_is_accepted(seeded_conn):
+    """Tests that articles from hosts without www. can be stored"""
+    with seeded_conn.cursor() as cur:
+        cur.execute("""INSERT INTO article (article_url, source, created_at)
+                    VALUES ('https://news.sky.com/story/1', 'Sky', NOW())
+                    RETURNING article_id;""")
+        assert cur.fetchone()
+    seeded_conn.rollback()
+
+
+def test_canonical_urls_match_feed_ids(seeded_conn):
+    """Tests that stored urls are rewritten to the canonical form feed entries are read as"""
+    canonicalise = Path(__file__).parent / "014_canonical_urls.sql"
+    with seeded_conn.cursor() as cur:
+        cur.execute("""INSERT INTO article (article_url, source, created_at) VALUES
+                    (' https://WWW.BBC.co.uk/news/uk-1?at_medium=RSS&at_campaign=KARANGA#top ',
+                    'BBC', NOW()),
+                    ('https://www.a.com/story?id=4&utm_source=rss', 'A', NOW());
+                    INSERT INTO feed_entry_seen (entry_url, source, first_seen)
+                    SELECT article_url, source, created_at FROM article
+                    WHERE source IN ('BBC', 'A') AND article_url NOT LIKE 'https://www.bbc.co.uk/news/%';""")
+        cur.execute(canonicalise.read_text())
+        cur.execute("""SELECT article_url FROM article WHERE source = 'A'
+                    OR article_url LIKE '%uk-1' ORDER BY article_url;""")
+        assert [row[0] for row in cur.fetchall()] == ["https://www.a.com/story?id=4",
+                                                      "https://www.bbc.co.uk/news/uk-1"]
+        cur.execute("SELECT entry_url FROM feed_entry_seen ORDER BY entry_url;")
+        assert [row[0] for row in cur.fetchall()] == ["https://www.a.com/story?id=4",
+                                                      "https://www.bbc.co.uk/news/uk-1"]
+    seeded_conn.rollback()
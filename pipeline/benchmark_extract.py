@@ -0,0 +1,57 @@
+"""Benchmarks sequential vs concurrent article scraping against a local stub server"""
+# pylint: disable=invalid-name
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+import time
+from extract import scrape_all_articles
+
+ARTICLE_COUNT = 40
+LATENCY = 0.25
+BBC_PAGE = """<html><body><main id="main-content"><article>
+<header><h1>Stub headline {number}</h1></header>
+<div class="ssrcss-68pt20-Text-TextContributorName e8mq1e96">By Stub Reporter</div>
+<div data-component="text-block"><p>First paragraph of stub article {number}.</p></div>
+<div data-component="text-block"><p>Second paragraph of stub article {number}.</p></div>
+</article></main></body></html>"""
+
+
+class StubBBCHandler(BaseHTTPRequestHandler):
+    """Serves a canned BBC article page after an injected delay"""
+
+    def do_GET(self):
+        """Responds to every path with the canned article"""
+        time.sleep(LATENCY)
+        page = BBC_PAGE.format(number=self.path.rsplit("/", 1)[-1]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Silences per-request logging"""
+
+
+def time_scrape(urls: list, **kwargs) -> float:
+    """Returns the seconds taken to scrape all urls"""
+    start = time.perf_counter()
+    articles = scrape_all_articles(urls, **kwargs)
+    elapsed = time.perf_counter() - start
+    assert articles.shape[0] == len(urls)
+    return elapsed
+
+
+if __name__ == "__main__":
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubBBCHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    stub_urls = [f"http://{host}:{port}/news/{number}" for number in range(ARTICLE_COUNT)]
+
+    sequential = time_scrape(stub_urls, max_workers=1)
+    print(f"sequential: {sequential:.2f}s for {ARTICLE_COUNT} articles")
+    for workers in (4, 8, 16):
+        concurrent = time_scrape(stub_urls, max_workers=workers, per_host_limit=workers)
+        print(f"{workers} workers: {concurrent:.2f}s ({sequential / concurrent:.1f}x)")
+
+    server.shutdown()
@@ -1,7 +1,12 @@
 """Pytest fixtures file"""
+import sys
+from pathlib import Path
 import pytest
 import pandas as pd
 
+# the shared parser is copied next to each pipeline in its docker image
+sys.path.append(str(Path(__file__).parent.parent / "shared"))
+
 @pytest.fixture
 def rss_feed():
     """rss feed dictionary fixture"""
@@ -85,7 +90,8 @@ def mock_dataframe():
     return pd.DataFrame([{
         "id": "https://www.bbc.co.uk/news/uk-politics-66707569	",
         "published": "Mon, 04 Sep 2023 12:02:28 GMT",
-        "title": "Angela Rayner handed new role"
+        "title": "Angela Rayner handed new role",
+        "source": "BBC"
     }])
 
 @pytest.fixture
@@ -114,4 +120,5 @@ def mock_loading_df():
         "body" : "body",
         "author" : "Miss Chanandler Bong",
         "published" : "2023-09-07 14:05:53+01:00",
+        "source" : "BBC",
     }])
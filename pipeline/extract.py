@@ -1,65 +1,150 @@
 """Main extract file"""
-import requests
+from os import environ
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import BoundedSemaphore
+from typing import Callable
+from urllib.parse import urlparse
 import feedparser
-from feedparser.util import FeedParserDict
-from bs4 import BeautifulSoup as bs
 import pandas as pd
-import re
+from psycopg2.extensions import connection
+from bbc_parser import parse_news_article, page_text
+from http_client import fetch, get_stats
+from feeds import FEEDS_FILE, load_registry, canonical_url, get_extractor
 
-RSS_FEED = "https://feeds.bbci.co.uk/news/rss.xml?edition=uk#"
 SCRAPED_ARTICLES = "scraped_articles.csv"
 RSS_FEED_CSV = "rss_feed.csv"
+MAX_WORKERS = 16
+PER_HOST_LIMIT = 6
+SCRAPE_DEADLINE = 120
+FEED_WORKERS = 8
 
 
-def read_feed(feed: str):
-    """Reads RSS feed"""
-    parsed_feed = feedparser.parse(feed)
+def read_feed(feed: str, etag: str = None, modified: str = None):
+    """Reads RSS feed, conditionally on the ETag and Last-Modified of the last read"""
+    parsed_feed = feedparser.parse(feed, etag=etag, modified=modified)
     return parsed_feed
 
 
-def transform_to_pandas(feed: FeedParserDict) -> pd.DataFrame:
-    """Converts RSS feed list of articles into a pandas dataframe"""
-    return pd.DataFrame(feed.entries)
+def read_source_feed(source: str, feed_url: str, validators: dict = None) -> tuple[list, dict]:
+    """Returns the entries of one source's feed, tagged with the source, the feed and a
+    canonical url, and the feed's validators for the next read. An unchanged feed has
+    no entries."""
 
+    validators = validators or {}
+    feed = read_feed(feed_url, validators.get("etag"), validators.get("modified"))
 
-def extract_urls(feed: FeedParserDict) -> list:
-    """Extracts URLS from RSS feed"""
-    return [entry["id"] for entry in feed.entries]
+    entries = []
+    for entry in feed["entries"]:
+        url = entry.get("id") or entry.get("link")
+        if url:
+            entries.append({**entry, "id": canonical_url(url), "source": source,
+                            "feed_url": feed_url})
 
+    return entries, {"feed_url": feed_url,
+                     "etag": feed.get("etag", validators.get("etag")),
+                     "modified": feed.get("modified", validators.get("modified"))}
 
-def scrape_article(article_url: str) -> dict:
-    """For a given url, scrape relevant data using BS4, return as a dict"""
-    article_dict = {}
 
-    article = requests.get(article_url, timeout=10)
-    soup = bs(article.content, 'lxml')
-    body = soup.find('main', id='main-content')
-    headline = soup.find('h1').text
-    if body is not None:
-        relevant_divs = body.findAll('div', attrs={"data-component": "text-block"})
-        text = " ".join(div.find('p').text for div in relevant_divs)
-        author = body.find('div', attrs= {"class": re.compile(".*TextContributorName")})
+def read_all_feeds(registry: list, feed_validators: dict = None,
+                   workers: int = FEED_WORKERS) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Reads every feed in the registry concurrently, passing each the validators stored
+    for it in feed_validators. Returns their entries, keeping the first entry for each
+    canonical url in registry order, and each feed's validators for the next read."""
 
-        article_dict["body"] = text
-        article_dict["headline"] = headline
+    feed_validators = feed_validators or {}
+    feeds = [(source["source"], feed_url, feed_validators.get(feed_url))
+             for source in registry for feed_url in source["feeds"]]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        feed_reads = list(executor.map(lambda feed: read_source_feed(*feed), feeds))
+
+    polls = pd.DataFrame([validators for _, validators in feed_reads],
+                         columns=["feed_url", "etag", "modified"])
+    entries = pd.DataFrame([entry for entry_list, _ in feed_reads for entry in entry_list])
+    if entries.empty:
+        return pd.DataFrame(columns=["id", "title", "published", "source", "feed_url"]), polls
+
+    return entries.drop_duplicates(subset=["id"]).reset_index(drop=True), polls
+
+
+def get_feed_validators(conn: connection, feed_urls: list) -> dict:
+    """Returns the ETag and Last-Modified stored for each feed by url"""
+
+    with conn.cursor() as cur:
+        cur.execute("""SELECT feed_url, etag, modified FROM feed_state
+                    WHERE feed_url = ANY(%s);""", [feed_urls])
+        return {feed_url: {"etag": etag, "modified": modified}
+                for feed_url, etag, modified in cur.fetchall()}
+
+
+def get_seen_urls(conn: connection, urls: list) -> set:
+    """Returns which of the given entry urls were scraped by an earlier poll"""
+
+    with conn.cursor() as cur:
+        cur.execute("""SELECT entry_url FROM feed_entry_seen WHERE entry_url = ANY(%s);""",
+                    [urls])
+        return {row[0] for row in cur.fetchall()}
+
+
+def scrape_article(article_url: str, extractor: Callable = parse_news_article) -> dict:
+    """For a given url, scrape relevant data with its source's extractor, return as a dict"""
+
+    article = fetch(article_url, timeout=10)
+    article_dict = extractor(page_text(article.content, article.headers.get("Content-Type")))
+    if article_dict:
         article_dict["url"] = article_url
-        article_dict["author"] = getattr(author, "text", None)
 
     return article_dict
 
 
-def scrape_all_articles(urls: list) -> pd.DataFrame:
-    """Scrapes article data from a list of URLs and returns a dataframe"""
+def get_host(url: str) -> str:
+    """Returns the host part of a url, used to limit requests per site"""
+    try:
+        return urlparse(url).netloc
+    except (AttributeError, TypeError, ValueError):
+        return ""
+
+
+def scrape_with_limit(url: str, host_limit: BoundedSemaphore, extractor: Callable) -> dict:
+    """Scrapes an article while holding a slot of its host's concurrency limit"""
+    with host_limit:
+        return scrape_article(url, extractor)
+
+
+def scrape_all_articles(urls: list, max_workers: int = MAX_WORKERS,
+                        per_host_limit: int = PER_HOST_LIMIT,
+                        deadline: float = SCRAPE_DEADLINE,
+                        extractors: list = None, settled: set = None) -> pd.DataFrame:
+    """Scrapes article data from a list of URLs concurrently and returns a dataframe.
+    Each url is parsed with the extractor at the same position in extractors,
+    defaulting to the BBC parser. Articles are kept in feed order; any not finished
+    by the deadline are skipped. Urls whose page was downloaded and parsed, whether
+    or not it held an article, are added to settled."""
+    settled = set() if settled is None else settled
+    extractors = extractors or [parse_news_article] * len(urls)
+    host_limits = {host: BoundedSemaphore(per_host_limit)
+                   for host in {get_host(url) for url in urls}}
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [executor.submit(scrape_with_limit, url, host_limits[get_host(url)], extractor)
+                   for url, extractor in zip(urls, extractors)]
+        done, _ = wait(futures, timeout=deadline)
+    except KeyboardInterrupt:
+        raise KeyboardInterrupt("Stopped by user")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
     article_list = []
-    for url in urls:
+    for url, future in zip(urls, futures):
+        if future not in done:
+            print(f"Scrape deadline reached; skipping {url}")
+            continue
         try:
-            article = scrape_article(url)
+            article = future.result()
+            settled.add(url)
             if article["headline"] and article["body"]:
                 article_list.append(article)
             else:
                 continue
-        except KeyboardInterrupt:
-            raise KeyboardInterrupt("Stopped by user")
         except KeyError:
             print("Sports article found; continuing.")
         except Exception as exc:
@@ -67,24 +152,38 @@ def scrape_all_articles(urls: list) -> pd.DataFrame:
     return pd.DataFrame(article_list)
 
 
-def extract_data() -> None:
-    """Whole extract process"""
-    rss_feed = read_feed(RSS_FEED)
-    rss_df = transform_to_pandas(rss_feed)
-
-    article_urls = extract_urls(rss_feed)
-    articles = scrape_all_articles(article_urls)
-
-    articles.to_csv(SCRAPED_ARTICLES, index=False)
-    rss_df.to_csv(RSS_FEED_CSV, index=False)
+def extract_data(checkpoint: bool = False,
+                 conn: connection = None) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Whole extract process. Reads every feed in the registry, scrapes their articles
+    and returns the scraped articles, RSS feed entries and each feed's validators,
+    also saving the first two to csv when checkpoint is set.
+    With a connection, feeds are read conditionally on their stored validators and
+    entries scraped by an earlier poll are skipped. Entries gain a scraped column
+    marking those the load should record as seen."""
+    registry = load_registry(environ.get("FEEDS_FILE", FEEDS_FILE))
+    feed_urls = [feed_url for source in registry for feed_url in source["feeds"]]
+    feed_validators = get_feed_validators(conn, feed_urls) if conn else {}
+    rss_df, feed_polls = read_all_feeds(registry, feed_validators)
+
+    if conn and not rss_df.empty:
+        rss_df = rss_df[~rss_df["id"].isin(get_seen_urls(conn, list(rss_df["id"])))]\
+            .reset_index(drop=True)
+
+    source_extractors = {source["source"]: get_extractor(source) for source in registry}
+    settled = set()
+    articles = scrape_all_articles(list(rss_df["id"]),
+                                   extractors=list(rss_df["source"].map(source_extractors)),
+                                   settled=settled)
+    rss_df["scraped"] = rss_df["id"].isin(settled)
+    print(f"Polled {len(feed_urls)} feeds: {len(rss_df)} new entries, "
+          f"{len(articles)} articles; http stats: {get_stats()}")
+
+    if checkpoint:
+        articles.to_csv(SCRAPED_ARTICLES, index=False)
+        rss_df.to_csv(RSS_FEED_CSV, index=False)
+
+    return articles, rss_df, feed_polls
 
 if __name__ == "__main__":
 
-    rss_feed = read_feed(RSS_FEED)
-    rss_df = transform_to_pandas(rss_feed)
-
-    article_urls = extract_urls(rss_feed)
-    articles = scrape_all_articles(article_urls)
-
-    articles.to_csv(SCRAPED_ARTICLES, index=False)
-    rss_df.to_csv(RSS_FEED_CSV, index=False)
+    extract_data(checkpoint=True)
@@ -6,12 +6,12 @@ import re
 import pandas as pd
 from dotenv import load_dotenv
 from psycopg2 import connect
-from psycopg2 import connect
 from psycopg2.extensions import connection
 from psycopg2.extras import execute_values
+from db_load import copy_rows, record_pipeline_run
+from content_hash import add_content_hashes, paragraph_hashes, to_pg_array
 
 TRANSFORMED_DATA = "transformed_data.csv"
-TIME_NOW = datetime.datetime.now()
 
 
 def get_db_connection() -> connection:
@@ -29,37 +29,38 @@ def get_db_connection() -> connection:
     return None
 
 
-def check_for_duplicate_articles(conn: connection, url: str) -> str:
-    """Checks for a duplicates in article table. Returns None if duplicate found."""
+def retrieve_existing_urls(conn: connection, urls: list) -> set:
+    """Returns which of the given urls are already in the article table, in one query"""
 
     with conn.cursor() as cur:
-        cur.execute("""SELECT * FROM article where article_url = %s;""", [url])
-        duplicate = cur.fetchall()
-        if len(duplicate) > 0:
-            return None
-    return url
+        cur.execute("""SELECT article_url FROM article WHERE article_url = ANY(%s);""",
+                    [urls])
+        return {row[0] for row in cur.fetchall()}
 
 
-def check_for_duplicate_authors(conn: connection, name: str) -> str:
-    """Checks for a duplicates in author table. Returns None if duplicate found."""
+def insert_articles(conn: connection, df: pd.DataFrame) -> dict:
+    """Inserts new articles, with the heading they were first scraped with,
+    and returns a dict of their generated ids by url"""
 
     with conn.cursor() as cur:
-        cur.execute("""SELECT * FROM author where author_name = %s;""", [name])
-        duplicate = cur.fetchall()
-        if len(duplicate) > 0:
-            return None
-    return name
+        tuples = df.to_records(index=False)
+        inserted = execute_values(cur, """INSERT INTO article (article_url, source, created_at,
+                       first_heading)
+                       VALUES %s ON CONFLICT (article_url) DO NOTHING
+                       RETURNING article_url, article_id;""", tuples, fetch=True)
+    return dict(inserted)
 
 
-def add_to_article_table(conn: connection, df: pd.DataFrame) -> None:
-    """Converts df into tuples, then adds to article table.
-    NB: needs author column converted into foreign key reference"""
+def insert_authors(conn: connection, names: list) -> dict:
+    """Inserts any new authors and returns a dict of author ids by name for all names"""
 
     with conn.cursor() as cur:
-        tuples = df.to_records(index=False)
-        execute_values(cur, """INSERT INTO article (article_url, source, created_at)
-                       VALUES %s;""", tuples)
-        conn.commit()
+        execute_values(cur, """INSERT INTO author (author_name) VALUES %s
+                       ON CONFLICT (author_name) DO NOTHING;""", [(name,) for name in names])
+        cur.execute("""SELECT author_name, author_id FROM author
+                    WHERE author_name = ANY(%s);""", [names])
+        author_ids = dict(cur.fetchall())
+    return author_ids
 
 
 def add_to_article_author_table(conn: connection, df: pd.DataFrame) -> None:
@@ -69,110 +70,129 @@ def add_to_article_author_table(conn: connection, df: pd.DataFrame) -> None:
     with conn.cursor() as cur:
         tuples = df.to_records(index=False)
         execute_values(cur, """INSERT INTO article_author (article_id, author_id)
-                       VALUES %s;""", tuples)
-        conn.commit()
+                       VALUES %s ON CONFLICT (article_id, author_id) DO NOTHING;""", tuples)
 
 
-def retrieve_author_id(conn: connection, name: str) -> str:
-    """Retrieves author_id from author table."""
-
-    with conn.cursor() as cur:
-        cur.execute(
-            """SELECT author_id from author where author_name = %s;""", [name])
-        author_id = cur.fetchall()
-        if len(author_id) == 1:
-            return author_id[0][0]
-    return None
+def add_to_article_version_table(conn: connection, df: pd.DataFrame) -> None:
+    """Copies df, with heading, body and paragraph digests, into a staging table, then adds
+    any versions not already stored to the article_version table.
+    NB: needs article_id column converted into foreign key reference"""
 
+    df = add_content_hashes(df.set_axis(["scraped_at", "heading", "body", "article_id"], axis=1))
+    df["paragraph_hashes"] = df["body"].map(paragraph_hashes).map(to_pg_array)
 
-def retrieve_article_id(conn: connection, url: str) -> str:
-    """Retrieves article_id from author table."""
+    with conn.cursor() as cur:
+        cur.execute("""CREATE TEMP TABLE IF NOT EXISTS staging_article_version
+                    (scraped_at TIMESTAMPTZ, heading TEXT, body TEXT, article_id INT,
+                    heading_hash TEXT, body_hash TEXT, paragraph_hashes TEXT[])
+                    ON COMMIT DROP;""")
+        copy_rows(cur, "staging_article_version",
+                  ["scraped_at", "heading", "body", "article_id", "heading_hash", "body_hash",
+                   "paragraph_hashes"], df)
+        cur.execute("""INSERT INTO article_version (scraped_at, heading, body, article_id,
+                    heading_hash, body_hash, paragraph_hashes)
+                    SELECT scraped_at, heading, body, article_id, heading_hash, body_hash,
+                    paragraph_hashes
+                    FROM staging_article_version
+                    ON CONFLICT (article_id, scraped_at) DO NOTHING;""")
+
+
+def record_seen_entries(conn: connection, entries: pd.DataFrame) -> None:
+    """Adds the url and source of feed entries that were scraped to the seen index,
+    so later polls skip them"""
 
     with conn.cursor() as cur:
-        cur.execute(
-            """SELECT article_id from article where article_url = %s;""", [url])
-        url = cur.fetchall()
-        if len(url) == 1:
-            return url[0][0]
-    return None
+        execute_values(cur, """INSERT INTO feed_entry_seen (entry_url, source, first_seen)
+                       VALUES %s ON CONFLICT (entry_url) DO NOTHING;""",
+                       list(zip(entries["id"], entries["source"])), template="(%s, %s, NOW())")
 
 
-def add_to_author_table(conn: connection, df: pd.DataFrame) -> None:
-    """Converts df into tuples, then adds to authors table.
-    NB: needs article_id column converted into foreign key reference"""
+def record_feed_polls(conn: connection, feed_polls: pd.DataFrame) -> None:
+    """Stores the ETag and Last-Modified each feed returned, for the next conditional poll"""
 
     with conn.cursor() as cur:
-        tuples = df.to_records(index=False)
-        execute_values(
-            cur, """INSERT INTO author (author_name) VALUES %s;""", tuples)
-        conn.commit()
+        execute_values(cur, """INSERT INTO feed_state (feed_url, etag, modified, last_polled)
+                       VALUES %s ON CONFLICT (feed_url) DO UPDATE
+                       SET etag = EXCLUDED.etag, modified = EXCLUDED.modified,
+                       last_polled = EXCLUDED.last_polled;""",
+                       list(feed_polls[["feed_url", "etag", "modified"]].itertuples(index=False,
+                                                                                    name=None)),
+                       template="(%s, %s, %s, NOW())")
 
 
-def add_to_article_version_table(conn: connection, df: pd.DataFrame) -> None:
-    """Converts df into tuples, then adds to article_version table.
-    NB: needs article_id column converted into foreign key reference"""
+def parse_authors(authors: list | str) -> list:
+    """Returns the author list, parsing it back from its string form if read from csv"""
 
-    with conn.cursor() as cur:
-        tuples = df.to_records(index=False)
-        execute_values(cur, """INSERT INTO article_version (scraped_at, heading, body, article_id)\
-                 VALUES %s;""", tuples)
-        conn.commit()
+    if isinstance(authors, list):
+        return authors
 
+    return re.findall("'([^']*)'", authors)
 
-def load_data():
-    """Complete data loading in one function. Used for main.py"""
+
+def load_data(df_transformed: pd.DataFrame = None, rss_df: pd.DataFrame = None,
+              feed_polls: pd.DataFrame = None, conn: connection = None):
+    """Complete data loading in one function. Used for main.py.
+    Reads the transformed csv if no dataframe is passed in. Scraped feed entries and
+    feed validators, when passed, are recorded alongside the articles. A feed with any
+    entry left unscraped keeps its stored validators, so the next poll lists it again.
+    Everything is written in one transaction, so a failed run leaves no partial data
+    and its entries are scraped again by the next poll. A connection passed in is
+    left open for the caller to reuse."""
     try:
-        db_conn = get_db_connection()
-        df_transformed = pd.read_csv(TRANSFORMED_DATA)
+        db_conn = conn or get_db_connection()
+        if df_transformed is None:
+            df_transformed = pd.read_csv(TRANSFORMED_DATA)
+        df_transformed = df_transformed.copy()
+
+        if rss_df is not None:
+            record_seen_entries(db_conn, rss_df[rss_df["scraped"].astype(bool)])
+        if feed_polls is not None:
+            if rss_df is not None:
+                unscraped = rss_df.loc[~rss_df["scraped"].astype(bool), "feed_url"]
+                feed_polls = feed_polls[~feed_polls["feed_url"].isin(unscraped)]
+            record_feed_polls(db_conn, feed_polls)
 
         # removes duplicates
-        df_transformed["url"] = df_transformed["url"].apply(
-            lambda x: check_for_duplicate_articles(db_conn, x))
-        df_transformed = df_transformed.dropna(subset=["url"])
+        existing_urls = retrieve_existing_urls(db_conn, list(df_transformed["url"]))
+        df_transformed = df_transformed[~df_transformed["url"].isin(existing_urls)]
+        df_transformed = df_transformed.drop_duplicates(subset=["url"])
 
         # inserts articles
-        df_for_article = df_transformed[["url", "published"]].copy()
-        df_for_article["source"] = "BBC"
-        df_for_article = df_for_article.reindex(
-            columns=["url", "source", "published"])
-        add_to_article_table(db_conn, df_for_article)
+        df_for_article = df_transformed[["url", "source", "published", "title"]].copy()
+        article_ids = insert_articles(db_conn, df_for_article)
 
         # inserts authors
-        df_for_author = df_transformed[["author"]].copy().dropna()
-        df_for_author["author"] = df_for_author["author"].apply(
-            lambda x: re.findall("'([^']*)'", x))
-        df_for_author = df_for_author.explode(column=["author"]).dropna()
-        df_for_author = df_for_author.drop_duplicates(subset=["author"])
-        df_for_author["author"] = df_for_author["author"].apply(
-            lambda x: check_for_duplicate_authors(db_conn, x))
-        df_for_author = df_for_author.dropna()
-        add_to_author_table(db_conn, df_for_author)
-
-        # inserts article-author table entries
         df_author_article = df_transformed[["url", "author"]].copy().dropna()
-        df_author_article["author"] = df_author_article["author"].apply(
-            lambda x: re.findall("'([^']*)'", x))
+        df_author_article["author"] = df_author_article["author"].apply(parse_authors)
         df_author_article = df_author_article.explode(
-            column=["author"]).dropna()
-        df_author_article["url"] = df_author_article["url"].apply(
-            lambda x: retrieve_article_id(db_conn, x)).map(str)
-        df_author_article["author"] = df_author_article["author"].apply(
-            lambda x: retrieve_author_id(db_conn, x)).map(str)
+            column=["author"]).dropna().drop_duplicates()
+        author_ids = insert_authors(db_conn, list(df_author_article["author"].unique()))
+
+        # inserts article-author table entries
+        df_author_article["url"] = df_author_article["url"].map(article_ids)
+        df_author_article["author"] = df_author_article["author"].map(author_ids)
+        df_author_article = df_author_article.dropna().astype(int).astype(str)
         add_to_article_author_table(db_conn, df_author_article)
 
         # insert article_version
         df_for_version = df_transformed[[
             "published", "title", "body", "url"]].copy()
-        df_for_version["url"] = df_for_version["url"].apply(
-            lambda x: retrieve_article_id(db_conn, x)).map(str)
-        df_for_version["published"] = str(TIME_NOW)
+        df_for_version["url"] = df_for_version["url"].map(article_ids)
+        df_for_version = df_for_version.dropna(subset=["url"])
+        df_for_version["url"] = df_for_version["url"].astype(int).map(str)
+        df_for_version["published"] = str(datetime.datetime.now())
         add_to_article_version_table(db_conn, df_for_version)
+        record_pipeline_run(db_conn, "ingest")
+        db_conn.commit()
     except KeyboardInterrupt:
+        db_conn.rollback()
         print("Keyboard interrupt")
     except Exception as exc:
+        db_conn.rollback()
         print(exc)
     finally:
-        db_conn.close()
+        if conn is None:
+            db_conn.close()
 
 if __name__ == "__main__":
     load_data()
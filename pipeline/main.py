@@ -1,13 +1,23 @@
 """Main file where whole etl will run in docker"""
 
+from os import environ
+from dotenv import load_dotenv
 from extract import extract_data
 from transform import transform_data
-from load import load_data
+from load import load_data, get_db_connection
 
 if __name__ == "__main__":
 
-    extract_data()
+    load_dotenv()
+    checkpoint = environ.get("CSV_CHECKPOINTS", "false").lower() == "true"
 
-    transform_data()
+    poll_conn = get_db_connection()
+    try:
+        articles, rss_feed, feed_polls = extract_data(checkpoint, poll_conn)
+    finally:
+        if poll_conn:
+            poll_conn.close()
 
-    load_data()
+    transformed_articles = transform_data(articles, rss_feed, checkpoint)
+
+    load_data(transformed_articles, rss_feed, feed_polls)
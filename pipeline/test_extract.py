@@ -2,12 +2,15 @@
 """
 Tests extract.py functionality
 """
+import time
+from threading import Lock
 import pytest
 import requests.exceptions
 import pandas as pd
 from unittest.mock import MagicMock, patch
 from conftest import rss_feed, bbc_html, bbc_sport_html, bbc_article_dict, bbc_sport_dict
-from extract import read_feed, scrape_article, scrape_all_articles
+from extract import (read_feed, scrape_article, scrape_all_articles, get_host, read_all_feeds,
+                     read_source_feed, extract_data)
 
 
 class TestReadFeed:
@@ -31,14 +34,118 @@ class TestReadFeed:
         assert result["entries"] == []
 
 
+class TestReadAllFeeds:
+    """Tests for the read_all_feeds function"""
+
+    @patch("extract.read_feed")
+    def test_entries_merged_by_canonical_url(self, mock_read):
+        """Tests that an article in two feeds is kept once, from the first source"""
+        feeds = {
+            "bbc-top": {"entries": [{"id": "https://www.bbc.co.uk/news/1", "title": "one"}]},
+            "bbc-uk": {"entries": [{"id": "https://www.bbc.co.uk/news/1?at_medium=RSS",
+                                    "title": "one again"},
+                                   {"id": "https://www.bbc.co.uk/news/2", "title": "two"}]},
+            "guardian": {"entries": [{"link": "https://www.theguardian.com/3#comments",
+                                      "title": "three"}]}}
+        mock_read.side_effect = lambda url, etag, modified: feeds[url]
+        registry = [{"source": "BBC", "feeds": ["bbc-top", "bbc-uk"], "extractor": "bbc"},
+                    {"source": "Guardian", "feeds": ["guardian"], "extractor": "bbc"}]
+
+        result, polls = read_all_feeds(registry)
+        assert list(polls["feed_url"]) == ["bbc-top", "bbc-uk", "guardian"]
+        assert result[["id", "title", "source"]].values.tolist() == [
+            ["https://www.bbc.co.uk/news/1", "one", "BBC"],
+            ["https://www.bbc.co.uk/news/2", "two", "BBC"],
+            ["https://www.theguardian.com/3", "three", "Guardian"]]
+
+    @patch("extract.read_feed")
+    def test_empty_feeds(self, mock_read):
+        """Tests that empty feeds still give the columns transform needs"""
+        mock_read.return_value = {"entries": []}
+        result, _ = read_all_feeds([{"source": "BBC", "feeds": ["bbc"], "extractor": "bbc"}])
+        assert result.empty
+        assert {"id", "title", "published", "source"} <= set(result.columns)
+
+
+class TestConditionalPolling:
+    """Tests feeds are read conditionally and seen entries are not scraped again"""
+
+    @patch("extract.feedparser.parse")
+    def test_validators_sent_and_returned(self, mock_parse):
+        """Tests the stored validators are sent and the feed's new ones returned"""
+        mock_parse.return_value = {"entries": [], "etag": '"v2"', "modified": "Tue"}
+        entries, validators = read_source_feed("BBC", "bbc", {"etag": '"v1"', "modified": "Mon"})
+        assert mock_parse.call_args.kwargs == {"etag": '"v1"', "modified": "Mon"}
+        assert validators == {"feed_url": "bbc", "etag": '"v2"', "modified": "Tue"}
+
+    @patch("extract.feedparser.parse")
+    def test_unchanged_feed_keeps_validators(self, mock_parse):
+        """Tests that a 304 without validators keeps the stored ones"""
+        mock_parse.return_value = {"entries": [], "status": 304}
+        entries, validators = read_source_feed("BBC", "bbc", {"etag": '"v1"', "modified": None})
+        assert entries == []
+        assert validators["etag"] == '"v1"'
+
+    @patch("extract.scrape_article")
+    @patch("extract.read_feed")
+    @patch("extract.load_registry")
+    def test_seen_entries_not_scraped(self, mock_registry, mock_read, mock_scrape):
+        """Tests that only entries missing from the seen index are downloaded"""
+        mock_registry.return_value = [{"source": "BBC", "feeds": ["bbc"], "extractor": "bbc"}]
+        mock_read.return_value = {"entries": [{"id": "https://www.bbc.co.uk/news/1"},
+                                              {"id": "https://www.bbc.co.uk/news/2"},
+                                              {"id": "https://www.bbc.co.uk/news/3"}]}
+        mock_scrape.side_effect = lambda url, extractor: (
+            {} if url.endswith("3") else {"body": "body", "headline": url})
+        conn = MagicMock()
+        conn.cursor().__enter__().fetchall.side_effect = [
+            [], [("https://www.bbc.co.uk/news/1",)]]
+
+        articles, rss_df, polls = extract_data(conn=conn)
+        assert [call.args[0] for call in mock_scrape.call_args_list] == [
+            "https://www.bbc.co.uk/news/2", "https://www.bbc.co.uk/news/3"]
+        assert list(articles["headline"]) == ["https://www.bbc.co.uk/news/2"]
+        assert list(rss_df["scraped"]) == [True, True]
+
+    @patch("extract.scrape_article")
+    @patch("extract.read_feed")
+    @patch("extract.load_registry")
+    def test_unchanged_feeds_scrape_nothing(self, mock_registry, mock_read, mock_scrape):
+        """Tests that a poll where every feed is unchanged downloads no articles"""
+        mock_registry.return_value = [{"source": "BBC", "feeds": ["bbc"], "extractor": "bbc"}]
+        mock_read.return_value = {"entries": [], "status": 304}
+        conn = MagicMock()
+        conn.cursor().__enter__().fetchall.return_value = [("bbc", '"v1"', None)]
+
+        articles, rss_df, polls = extract_data(conn=conn)
+        assert mock_read.call_count == 1
+        assert mock_read.call_args.args == ("bbc", '"v1"', None)
+        assert mock_scrape.call_count == 0
+        assert articles.empty and rss_df.empty
+        assert polls.values.tolist() == [["bbc", '"v1"', None]]
+
+    @patch("extract.scrape_article")
+    def test_failed_scrapes_not_settled(self, mock_scrape):
+        """Tests that only urls whose page was parsed count as settled"""
+        def fake_scrape(url, extractor):
+            if url == "down":
+                raise ConnectionError("down")
+            return {} if url == "video" else {"body": "body", "headline": url}
+        mock_scrape.side_effect = fake_scrape
+        settled = set()
+        scrape_all_articles(["www.a.com/1", "down", "video"], settled=settled)
+        assert settled == {"www.a.com/1", "video"}
+
+
 class TestScrapeArticle:
     """Tests for scrape_article function"""
 
-    @patch("extract.requests.get")
+    @patch("extract.fetch")
     def test_scrape_article_returns_dict(self, mock_request, bbc_html, bbc_article_dict):
         """Tests function returns a dict"""
         mock_response = MagicMock()
-        mock_response.content = bbc_html
+        mock_response.content = bbc_html.encode("utf-8")
+        mock_response.headers = {"Content-Type": "text/html; charset=utf-8"}
         mock_request.return_value = mock_response
 
         result = scrape_article("fakeurl.com")
@@ -47,11 +154,12 @@ class TestScrapeArticle:
         assert result == bbc_article_dict
 
 
-    @patch("extract.requests.get")
+    @patch("extract.fetch")
     def test_scrape_bbc_sport(self, mock_request, bbc_sport_html, bbc_sport_dict):
         """Tests returns a dict for bbc sport article html"""
         mock_response = MagicMock()
-        mock_response.content = bbc_sport_html
+        mock_response.content = bbc_sport_html.encode("utf-8")
+        mock_response.headers = {"Content-Type": "text/html; charset=utf-8"}
         mock_request.return_value = mock_response
 
         result = scrape_article("fakeurl.com")
@@ -60,8 +168,9 @@ class TestScrapeArticle:
         assert result == bbc_sport_dict
     
 
-    def test_scrape_invalid_url(self):
-        """Tests invalid url raises an exception"""
+    @patch("http_client.sleep")
+    def test_scrape_invalid_url(self, mock_sleep):
+        """Tests invalid url raises an exception once retries run out"""
         with pytest.raises(requests.exceptions.ConnectionError):
             scrape_article("https://www.not-a-url.commm")
 
@@ -78,8 +187,63 @@ class TestScrapeAllArticles:
         assert isinstance(result, pd.DataFrame)
         assert result.shape[0] == 3
     
+    @patch("extract.fetch")
+    def test_each_url_uses_its_extractor(self, mock_fetch):
+        """Tests that articles are parsed by the extractor given for their source"""
+        mock_fetch.return_value.content = b"page"
+        extractors = [lambda content: {"body": "body", "headline": "bbc"},
+                      lambda content: {"body": "body", "headline": "guardian"}]
+        result = scrape_all_articles(["www.a.com/1", "www.b.com/2"], extractors=extractors)
+        assert list(result["headline"]) == ["bbc", "guardian"]
+
     def test_invalid_urls_not_added(self):
         urls = ["url", ["url2"]]
         result = scrape_all_articles(urls)
         assert result.shape[0]==0
 
+    @patch("extract.scrape_article")
+    def test_results_kept_in_feed_order(self, mock_scrape):
+        """Tests that slower early articles still come first in the dataframe"""
+        def fake_scrape(url, extractor):
+            time.sleep(0.05 if url.endswith("1") else 0)
+            return {"body": "body", "headline": url}
+        mock_scrape.side_effect = fake_scrape
+        urls = ["www.a.com/1", "www.a.com/2", "www.b.com/3"]
+        result = scrape_all_articles(urls)
+        assert list(result["headline"]) == urls
+
+    @patch("extract.scrape_article")
+    def test_per_host_limit_respected(self, mock_scrape):
+        """Tests that no more than per_host_limit requests run against one host"""
+        lock = Lock()
+        running = {"now": 0, "max": 0}
+        def fake_scrape(url, extractor):
+            with lock:
+                running["now"] += 1
+                running["max"] = max(running["max"], running["now"])
+            time.sleep(0.02)
+            with lock:
+                running["now"] -= 1
+            return {"body": "body", "headline": "headline"}
+        mock_scrape.side_effect = fake_scrape
+        urls = [f"https://www.bbc.co.uk/news/{i}" for i in range(12)]
+        result = scrape_all_articles(urls, max_workers=10, per_host_limit=3)
+        assert result.shape[0] == 12
+        assert running["max"] <= 3
+
+    @patch("extract.scrape_article")
+    def test_deadline_skips_slow_articles(self, mock_scrape):
+        """Tests that articles not scraped before the deadline are dropped"""
+        def fake_scrape(url, extractor):
+            if url == "slow":
+                time.sleep(0.5)
+            return {"body": "body", "headline": url}
+        mock_scrape.side_effect = fake_scrape
+        result = scrape_all_articles(["fast", "slow"], deadline=0.1)
+        assert list(result["headline"]) == ["fast"]
+
+
+def test_get_host():
+    """Tests that the host is taken from a url and invalid urls give an empty host"""
+    assert get_host("https://www.bbc.co.uk/news/uk-1") == "www.bbc.co.uk"
+    assert get_host(["url"]) == ""
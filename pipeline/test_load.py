@@ -1,10 +1,12 @@
 # pylint: skip-file
 from unittest.mock import MagicMock, patch
 import pandas as pd
+from content_hash import hash_text
 from conftest import mock_dataframe, mock_loading_df
-from load import (get_db_connection, check_for_duplicate_articles, check_for_duplicate_authors,
-                add_to_article_table, add_to_article_author_table, add_to_author_table, add_to_article_version_table,
-                retrieve_article_id, retrieve_author_id, load_data)
+from load import (get_db_connection, add_to_article_author_table, add_to_article_version_table,
+                load_data, parse_authors,
+                retrieve_existing_urls, insert_articles, insert_authors,
+                record_seen_entries, record_feed_polls)
 
 
 @patch("load.load_dotenv")
@@ -15,147 +17,222 @@ def test_get_connection_raises_error(mock_env):
     assert result == None
 
 
-def test_duplicate_article_returns_none():
-    """Tests that check_duplicate_article returns None if it is a duplicate"""
+@patch("load.execute_values")
+def test_add_article_author_table_executes(mock_execute, mock_dataframe):
+    """Tests that execute_values is called with a mock connection inside add_article_author function"""
     conn = MagicMock()
-    fake_fetch = conn.cursor().__enter__().fetchall
-    fake_fetch.return_value = [1, 1]
-    result = check_for_duplicate_articles(conn, "test.com")
-    assert fake_fetch.call_count == 1
-    assert result == None
-
 
-def test_duplicate_article_returns_url():
-    """Tests that url is returned if not a duplicate article"""
-    conn = MagicMock()
-    fake_fetch = conn.cursor().__enter__().fetchall
-    fake_fetch.return_value = []
-    result = check_for_duplicate_articles(conn, "test.com")
-    assert fake_fetch.call_count == 1
-    assert result == "test.com"
+    add_to_article_author_table(conn, mock_dataframe)
+    assert mock_execute.call_count == 1
+    assert conn.commit.call_count == 0
 
 
-def test_duplicate_author_returns_none():
-    """Tests that check_duplicate_author returns None if it is a duplicate"""
+def test_add_article_version_table_copies():
+    """Tests that versions are streamed with COPY, with digests, and merged without committing"""
     conn = MagicMock()
-    fake_fetch = conn.cursor().__enter__().fetchall
-    fake_fetch.return_value = [1, 1]
-    result = check_for_duplicate_articles(conn, "Bob Vance")
-    assert fake_fetch.call_count == 1
-    assert result == None
+    cur = conn.cursor().__enter__()
+    versions = pd.DataFrame([("2023-09-07 14:05:53", "title", "body", "1")],
+                            columns=["published", "title", "body", "url"])
 
+    add_to_article_version_table(conn, versions)
+    assert cur.copy_expert.call_count == 1
+    copied = cur.copy_expert.call_args.args[1].getvalue()
+    assert copied.strip().endswith(f"{hash_text('title')},{hash_text('body')},"
+                                   f"{{{hash_text('body')}}}")
+    assert "ON CONFLICT (article_id, scraped_at) DO NOTHING" in cur.execute.call_args.args[0]
+    assert conn.commit.call_count == 0
 
-def test_duplicate_author_returns_author():
-    """Tests that url is returned if not a duplicate article"""
+
+def test_add_article_version_table_hashes_paragraphs():
+    """Tests that the body digest ignores paragraph breaks and each paragraph is hashed"""
     conn = MagicMock()
-    fake_fetch = conn.cursor().__enter__().fetchall
-    fake_fetch.return_value = []
-    result = check_for_duplicate_authors(conn, "Bob Vance")
-    assert fake_fetch.call_count == 1
-    assert result == "Bob Vance"
+    cur = conn.cursor().__enter__()
+    versions = pd.DataFrame([("2023-09-07 14:05:53", "title", "first\nsecond", "1")])
 
+    add_to_article_version_table(conn, versions)
+    copied = cur.copy_expert.call_args.args[1].getvalue()
+    assert hash_text("first second") in copied
+    assert f'"{{{hash_text("first")},{hash_text("second")}}}"' in copied
+    
 
 @patch("load.execute_values")
-def test_add_article_table_executes(mock_execute, mock_dataframe):
-    """Tests that execute_values is called within a mock connection"""
-    conn = MagicMock()
+@patch("load.pd.read_csv")
+@patch("load.get_db_connection")
+def test_load_data_conn_close_called(mock_connection, mock_read_csv, mock_execute, mock_loading_df):
+    """Tests that conn.close is called in function"""
+    mock_conn = MagicMock()
+    mock_read_csv.return_value = mock_loading_df
+    mock_connection.return_value = mock_conn
 
-    add_to_article_table(conn, mock_dataframe)
-    assert mock_execute.call_count == 1
-    assert conn.commit.call_count == 1
+    load_data()
+    assert mock_conn.close.call_count == 1
 
 
 @patch("load.execute_values")
-def test_add_article_author_table_executes(mock_execute, mock_dataframe):
-    """Tests that execute_values is called with a mock connection inside add_article_author function"""
-    conn = MagicMock()
+@patch("load.pd.read_csv")
+@patch("load.get_db_connection")
+def test_load_data_conn_commit_called(mock_connection, mock_read_csv, mock_execute, mock_loading_df):
+    """Tests that the whole load is committed once"""
+    mock_conn = MagicMock()
+    mock_read_csv.return_value = mock_loading_df
+    mock_connection.return_value = mock_conn
 
-    add_to_article_author_table(conn, mock_dataframe)
-    assert mock_execute.call_count == 1
-    assert conn.commit.call_count == 1
+    load_data()
+    assert mock_conn.commit.call_count == 1
+    assert mock_conn.rollback.call_count == 0
 
 
-@patch("load.execute_values")
-def test_add_author_table_executes(mock_execute, mock_dataframe):
-    """Tests that execute_values is called with a mock connection inside add_author function"""
-    conn = MagicMock()
+@patch("load.add_to_article_version_table")
+@patch("load.pd.read_csv")
+@patch("load.get_db_connection")
+def test_load_data_rolls_back_on_error(mock_connection, mock_read_csv, mock_version, mock_loading_df):
+    """Tests that a failure part way through rolls the whole load back"""
+    mock_conn = MagicMock()
+    mock_read_csv.return_value = mock_loading_df
+    mock_connection.return_value = mock_conn
+    mock_version.side_effect = Exception("copy failed")
 
-    add_to_author_table(conn, mock_dataframe)
-    assert mock_execute.call_count == 1
-    assert conn.commit.call_count == 1
+    load_data()
+    assert mock_conn.commit.call_count == 0
+    assert mock_conn.rollback.call_count == 1
 
 
-@patch("load.execute_values")
-def test_add_article_version_table_executes(mock_execute, mock_dataframe):
-    """Tests that execute_values is called with a mock connection inside add_article_version function"""
-    conn = MagicMock()
+def test_parse_authors():
+    """Tests that authors are parsed from csv strings and lists pass through"""
+    assert parse_authors("['Bob Vance', 'Phyllis Vance']") == ["Bob Vance", "Phyllis Vance"]
+    assert parse_authors(["Bob Vance"]) == ["Bob Vance"]
 
-    add_to_article_version_table(conn, mock_dataframe)
-    assert mock_execute.call_count == 1
-    assert conn.commit.call_count == 1
-    
 
-def test_retrieve_author_id():
-    """Tests that retrieve author ids returns an id"""
+def test_retrieve_existing_urls_one_query():
+    """Tests that all urls are checked in a single query"""
     conn = MagicMock()
-    fake_fetch = conn.cursor().__enter__().fetchall
-    fake_fetch.return_value = [(1,)]
-    result = retrieve_author_id(conn, "Sylvia Plath")
-    assert result == 1
-    assert fake_fetch.call_count == 1
+    cur = conn.cursor().__enter__()
+    cur.fetchall.return_value = [("www.a.com",)]
+    result = retrieve_existing_urls(conn, ["www.a.com", "www.b.com", "www.c.com"])
+    assert result == {"www.a.com"}
+    assert cur.execute.call_count == 1
 
 
-def test_retrieve_author_id_no_match():
-    """Tests that retrieve author ids returns None when no id found"""
+@patch("load.execute_values")
+def test_insert_articles_returns_ids(mock_execute, mock_dataframe):
+    """Tests that generated ids come back from the insert"""
     conn = MagicMock()
-    fake_fetch = conn.cursor().__enter__().fetchall
-    fake_fetch.return_value = []
-    result = retrieve_author_id(conn, "Sylvia Plath")
-    assert result == None
-    assert fake_fetch.call_count == 1
+    mock_execute.return_value = [("www.a.com", 7)]
+    result = insert_articles(conn, mock_dataframe)
+    assert result == {"www.a.com": 7}
+    assert mock_execute.call_args.kwargs["fetch"] is True
+    assert "first_heading" in mock_execute.call_args.args[1]
 
 
-def test_retrieve_article_id():
-    """Tests that retrieve article ids returns an id"""
+@patch("load.execute_values")
+def test_insert_authors_returns_all_ids(mock_execute):
+    """Tests that ids for new and existing authors are fetched in one query"""
     conn = MagicMock()
-    fake_fetch = conn.cursor().__enter__().fetchall
-    fake_fetch.return_value = [("www.test.com",)]
-    result = retrieve_article_id(conn, "www.test.com")
-    assert result == "www.test.com"
-    assert fake_fetch.call_count == 1
+    cur = conn.cursor().__enter__()
+    cur.fetchall.return_value = [("Bob Vance", 1), ("Phyllis Vance", 2)]
+    result = insert_authors(conn, ["Bob Vance", "Phyllis Vance"])
+    assert result == {"Bob Vance": 1, "Phyllis Vance": 2}
+    assert mock_execute.call_count == 1
+    assert cur.execute.call_count == 1
 
 
-def test_retrieve_article_id_no_match():
-    """Tests that retrieve article ids returns None when no id found"""
-    conn = MagicMock()
-    fake_fetch = conn.cursor().__enter__().fetchall
-    fake_fetch.return_value = []
-    result = retrieve_article_id(conn, "www.test.com")
-    assert result == None
-    assert fake_fetch.call_count == 1
+@patch("load.add_to_article_version_table")
+@patch("load.add_to_article_author_table")
+@patch("load.insert_authors")
+@patch("load.insert_articles")
+@patch("load.retrieve_existing_urls")
+@patch("load.get_db_connection")
+def test_load_data_skips_existing_and_maps_ids(mock_connection, mock_existing, mock_articles,
+                                                mock_authors, mock_article_author, mock_version):
+    """Tests that existing articles are dropped and ids are mapped without per-row queries"""
+    mock_existing.return_value = {"www.old.com"}
+    mock_articles.return_value = {"www.new.com": 5}
+    mock_authors.return_value = {"Bob Vance": 3, "Phyllis Vance": 4}
+    transformed = pd.DataFrame([
+        {"title": "old", "url": "www.old.com", "body": "body", "author": ["Bob Vance"],
+         "published": "2023-09-07 14:05:53+01:00", "source": "BBC"},
+        {"title": "new", "url": "www.new.com", "body": "body",
+         "author": ["Bob Vance", "Phyllis Vance"], "published": "2023-09-07 14:05:53+01:00",
+         "source": "Guardian"}])
+
+    load_data(transformed)
+    assert mock_articles.call_args.args[1].values.tolist() == [
+        ["www.new.com", "Guardian", "2023-09-07 14:05:53+01:00", "new"]]
+    article_authors = mock_article_author.call_args.args[1]
+    assert article_authors.values.tolist() == [["5", "3"], ["5", "4"]]
+    assert list(mock_version.call_args.args[1]["url"]) == ["5"]
 
 
 @patch("load.execute_values")
-@patch("load.pd.read_csv")
+def test_record_seen_entries(mock_execute):
+    """Tests that each scraped entry's url and source go into the seen index"""
+    entries = pd.DataFrame([{"id": "www.a.com", "source": "BBC"}])
+    record_seen_entries(MagicMock(), entries)
+    assert "ON CONFLICT (entry_url) DO NOTHING" in mock_execute.call_args.args[1]
+    assert mock_execute.call_args.args[2] == [("www.a.com", "BBC")]
+
+
+@patch("load.execute_values")
+def test_record_feed_polls_upserts(mock_execute):
+    """Tests that feed validators replace the stored ones"""
+    polls = pd.DataFrame([{"feed_url": "bbc", "etag": '"v2"', "modified": None}])
+    record_feed_polls(MagicMock(), polls)
+    assert "DO UPDATE" in mock_execute.call_args.args[1]
+    assert mock_execute.call_args.args[2] == [("bbc", '"v2"', None)]
+
+
+@patch("load.record_feed_polls")
+@patch("load.record_seen_entries")
+@patch("load.execute_values")
 @patch("load.get_db_connection")
-def test_load_data_conn_close_called(mock_connection, mock_read_csv, mock_execute, mock_loading_df):
-    """Tests that conn.close is called in function"""
-    mock_conn = MagicMock()
-    mock_read_csv.return_value = mock_loading_df
-    mock_connection.return_value = mock_conn
+def test_load_data_records_polls_in_transaction(mock_connection, mock_execute, mock_seen,
+                                                mock_polls, mock_loading_df):
+    """Tests that only scraped entries are marked seen, in the same commit as the articles"""
+    rss_df = pd.DataFrame([{"id": "www.test.com", "source": "BBC", "scraped": True,
+                            "feed_url": "bbc"}])
+    polls = pd.DataFrame([{"feed_url": "bbc", "etag": None, "modified": None}])
 
-    load_data()
-    assert mock_conn.close.call_count == 1
+    load_data(mock_loading_df, rss_df, polls)
+    assert list(mock_seen.call_args.args[1]["id"]) == ["www.test.com"]
+    assert mock_polls.call_args.args[1].equals(polls)
+    assert mock_connection.return_value.commit.call_count == 1
 
 
+@patch("load.record_feed_polls")
+@patch("load.record_seen_entries")
 @patch("load.execute_values")
-@patch("load.pd.read_csv")
 @patch("load.get_db_connection")
-def test_load_data_conn_commit_called(mock_connection, mock_read_csv, mock_execute, mock_loading_df):
-    """Tests that conn.close is called in function"""
-    mock_conn = MagicMock()
-    mock_read_csv.return_value = mock_loading_df
-    mock_connection.return_value = mock_conn
+def test_load_data_holds_polls_of_feeds_with_unscraped_entries(
+        mock_connection, mock_execute, mock_seen, mock_polls, mock_loading_df):
+    """Tests that a feed with an entry left unscraped keeps its stored validators,
+    while only scraped entries are marked seen"""
+    rss_df = pd.DataFrame([{"id": "www.test.com", "source": "BBC", "scraped": True,
+                            "feed_url": "bbc-top"},
+                           {"id": "www.down.com", "source": "BBC", "scraped": False,
+                            "feed_url": "bbc-uk"}])
+    polls = pd.DataFrame([{"feed_url": "bbc-top", "etag": '"v2"', "modified": None},
+                          {"feed_url": "bbc-uk", "etag": '"v2"', "modified": None}])
+
+    load_data(mock_loading_df, rss_df, polls)
+    assert list(mock_seen.call_args.args[1]["id"]) == ["www.test.com"]
+    assert list(mock_polls.call_args.args[1]["feed_url"]) == ["bbc-top"]
 
-    load_data()
-    assert mock_conn.commit.call_count == 4
+
+@patch("load.execute_values")
+@patch("load.get_db_connection")
+def test_load_data_leaves_passed_connection_open(mock_connection, mock_execute, mock_loading_df):
+    """Tests that a connection passed in is committed but not closed or replaced"""
+    conn = MagicMock()
+    load_data(mock_loading_df, conn=conn)
+    assert mock_connection.call_count == 0
+    assert conn.commit.call_count == 1
+    assert conn.close.call_count == 0
+
+
+@patch("load.record_pipeline_run")
+@patch("load.execute_values")
+@patch("load.get_db_connection")
+def test_load_data_marks_pipeline_run(mock_connection, mock_execute, mock_run, mock_loading_df):
+    """Tests that a load marks the ingest run for the dashboard cache"""
+    load_data(mock_loading_df)
+    assert mock_run.call_args.args[1] == "ingest"
@@ -5,7 +5,7 @@ Tests transform.py functionality
 from datetime import datetime
 import pytz
 import pandas as pd
-from transform import format_time_to_timestamp, format_rss_feed_df, format_authors, format_scraped_articles_df
+from transform import format_time_to_timestamp, format_rss_feed_df, format_authors, format_scraped_articles_df, transform_data
 from conftest import mock_dataframe, mock_scraped_df
 
 def test_format_timestamp():
@@ -47,3 +47,62 @@ def test_format_scraped_articles_strips_URL(mock_scraped_df):
     result = format_scraped_articles_df(mock_scraped_df)
     assert isinstance(result, pd.DataFrame)
     assert result["url"][0] == "www.realurl.com"
+
+
+def test_transform_data_in_memory(mock_dataframe, mock_scraped_df):
+    """Tests that dataframes passed in are joined without reading or writing csv"""
+    mock_dataframe["id"] = "www.realurl.com"
+    result = transform_data(mock_scraped_df, mock_dataframe)
+    assert isinstance(result, pd.DataFrame)
+    assert list(result["headline"]) == ["headline1", "headline2"]
+    assert result["author"][0] == ["Scooby", "Shaggy", "Scrappy"]
+    assert result["author"][1] is None
+
+
+def test_format_scraped_articles_missing_author():
+    """Tests that a missing author from the scraper is treated like an empty csv cell"""
+    scraped = pd.DataFrame([{"author": None, "url": "www.url.com"}])
+    result = format_scraped_articles_df(scraped)
+    assert result["author"][0] is None
+
+
+
+def test_format_timestamp_numeric_offset():
+    """Tests that feeds using a numeric offset keep it"""
+    result = format_time_to_timestamp("Mon, 04 Sep 2023 12:02:28 +0100")
+    assert result.isoformat() == "2023-09-04T12:02:28+01:00"
+
+
+def test_format_timestamp_iso():
+    """Tests that Atom feeds' ISO 8601 times are read and unreadable times give None"""
+    assert format_time_to_timestamp("2023-09-04T12:02:28+00:00").isoformat() \
+        == "2023-09-04T12:02:28+00:00"
+    assert format_time_to_timestamp("yesterday") is None
+    assert format_time_to_timestamp(float("nan")) is None
+
+
+def test_format_rss_feed_falls_back_to_updated():
+    """Tests that entries without a published time use their updated time,
+    and entries with no readable time are dropped"""
+    rss_df = pd.DataFrame([
+        {"id": "www.a.com", "title": "a", "source": "Sky",
+         "published": "Mon, 04 Sep 2023 12:02:28 +0100"},
+        {"id": "www.b.com", "title": "b", "source": "Sky", "updated": "2023-09-04T12:02:28Z"},
+        {"id": "www.c.com", "title": "c", "source": "Sky"}])
+    result = format_rss_feed_df(rss_df)
+    assert list(result["id"]) == ["www.a.com", "www.b.com"]
+
+
+def test_format_rss_feed_without_published_column():
+    """Tests that a feed whose entries only have updated times is transformed"""
+    rss_df = pd.DataFrame([{"id": "www.b.com", "title": "b", "source": "Sky",
+                            "updated": "2023-09-04T12:02:28Z"}])
+    result = format_rss_feed_df(rss_df)
+    assert result["published"].iloc[0].isoformat() == "2023-09-04T12:02:28+00:00"
+
+
+def test_transform_data_nothing_scraped(mock_dataframe):
+    """Tests that a poll with no new articles transforms to an empty frame"""
+    result = transform_data(pd.DataFrame(), mock_dataframe)
+    assert result.empty
+    assert "source" in result.columns
@@ -1,6 +1,7 @@
 """Transforms the data by flattening and cleaning before it goes into the load stage"""
 
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 
 import pandas as pd
 import pytz
@@ -9,6 +10,7 @@ from pandas import DataFrame
 RSS_FEED_DATA = "rss_feed.csv"
 SCRAPED_DATA = "scraped_articles.csv"
 TRANSFORMED_DATA_CSV = "transformed_data.csv"
+TRANSFORMED_COLUMNS = ["title", "url", "headline", "body", "author", "published", "source"]
 
 
 def get_rss_feed_df(file_path: str) -> DataFrame:
@@ -27,24 +29,41 @@ def get_scraped_articles_df(file_path: str) -> DataFrame:
     return scraped_article_df
 
 
-def format_time_to_timestamp(time_in_col: str) -> datetime:
-    """Formats time to timestamp format to load into postgres"""
+def format_time_to_timestamp(time_in_col: str) -> datetime | None:
+    """Formats time to timestamp format to load into postgres.
+    Feeds giving a numeric offset instead of a zone name keep their offset, and Atom
+    feeds' ISO 8601 times are read too. Returns None for anything else."""
 
-    time_in_col = time_in_col[5:]
-    gmt = pytz.timezone("Europe/London")
-    time_in_col = gmt.localize(datetime.strptime(time_in_col, "%d %b %Y %H:%M:%S %Z"))
-
-    return time_in_col
+    if not isinstance(time_in_col, str):
+        return None
+    try:
+        gmt = pytz.timezone("Europe/London")
+        return gmt.localize(datetime.strptime(time_in_col[5:], "%d %b %Y %H:%M:%S %Z"))
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(time_in_col)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(time_in_col)
+    except ValueError:
+        return None
 
 
 def format_rss_feed_df(rss_df: DataFrame) -> DataFrame:
-    """Formats rss feed dataframe columns before saving to csv df"""
+    """Formats rss feed dataframe columns before saving to csv df.
+    Entries without a published time use their updated time, as Atom feeds give,
+    and entries with neither that can be read are dropped."""
 
-    rss_df["published"] = rss_df["published"].apply(format_time_to_timestamp)
-    rss_df["id"] = rss_df["id"].apply(lambda url: url.strip())
-    rss_df = rss_df[["id", "title", "published"]]
+    published = rss_df.get("published", pd.Series(None, index=rss_df.index, dtype=object))
+    if "updated" in rss_df.columns:
+        published = published.fillna(rss_df["updated"])
+    rss_df = rss_df.assign(published=published.apply(format_time_to_timestamp),
+                           id=rss_df["id"].apply(lambda url: url.strip()))
+    rss_df = rss_df.dropna(subset=["published"])
 
-    return rss_df
+    return rss_df.reindex(columns=["id", "title", "published", "source"])
 
 
 def format_authors(authors: str) -> str | None :
@@ -69,21 +88,28 @@ def format_scraped_articles_df(scraped_articles_df: DataFrame) -> DataFrame:
 
     scraped_articles_df["url"] = scraped_articles_df["url"].apply(lambda url: url.strip())
 
-    scraped_articles_df["author"] = scraped_articles_df["author"].apply(lambda authors:
-                                                                        str(authors))
+    scraped_articles_df["author"] = scraped_articles_df["author"].fillna("nan").apply(
+        lambda authors: str(authors))
     scraped_articles_df["author"] = scraped_articles_df["author"].apply(format_authors)
 
     return scraped_articles_df
 
 
-def transform_data() -> None:
-    """Whole process of transforming data"""
+def transform_data(scraped_article_df: DataFrame = None, rss_feed_df: DataFrame = None,
+                   checkpoint: bool = False) -> DataFrame:
+    """Whole process of transforming data. Reads the extract csv files for any
+    dataframe not passed in, and saves the result to csv when checkpoint is set"""
 
-    rss_feed_df = get_rss_feed_df("rss_feed.csv")
+    if rss_feed_df is None:
+        rss_feed_df = get_rss_feed_df(RSS_FEED_DATA)
 
     rss_feed_df = format_rss_feed_df(rss_feed_df)
 
-    scraped_article_df = get_scraped_articles_df("scraped_articles.csv")
+    if scraped_article_df is None:
+        scraped_article_df = get_scraped_articles_df(SCRAPED_DATA)
+
+    if scraped_article_df.empty:
+        return pd.DataFrame(columns=TRANSFORMED_COLUMNS)
 
     scraped_article_df = format_scraped_articles_df(scraped_article_df)
 
@@ -93,9 +119,12 @@ def transform_data() -> None:
                             right_on="id",
                             how="inner")
 
-    joined_data = joined_data[["title", "url", "headline", "body", "author", "published"]]
+    joined_data = joined_data[TRANSFORMED_COLUMNS]
 
-    joined_data.to_csv(TRANSFORMED_DATA_CSV)
+    if checkpoint:
+        joined_data.to_csv(TRANSFORMED_DATA_CSV)
+
+    return joined_data
 
 
 if __name__ == "__main__":
@@ -114,6 +143,6 @@ if __name__ == "__main__":
                             right_on="id",
                             how="inner")
 
-    joined_data = joined_data[["title", "url", "headline", "body", "author", "published"]]
+    joined_data = joined_data[TRANSFORMED_COLUMNS]
 
     joined_data.to_csv(TRANSFORMED_DATA_CSV)
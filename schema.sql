@@ -9,15 +9,17 @@ CREATE TABLE IF NOT EXISTS article (
     article_url TEXT NOT NULL,
     source TEXT NOT NULL,
     created_at TIMESTAMPTZ NOT NULL,
+    first_heading TEXT,
     PRIMARY KEY (article_id),
-    CONSTRAINT check_created_at CHECK (created_at <= NOW()),
-    CONSTRAINT check_article_url CHECK (article_url LIKE '%www.%' or article_url LIKE '%WWW.%')
+    CONSTRAINT unique_article_url UNIQUE (article_url),
+    CONSTRAINT check_created_at CHECK (created_at <= NOW())
 );
 
 CREATE TABLE IF NOT EXISTS author (
     author_id INT GENERATED ALWAYS AS IDENTITY,
     author_name TEXT NOT NULL,
-    PRIMARY KEY (author_id)
+    PRIMARY KEY (author_id),
+    CONSTRAINT unique_author_name UNIQUE (author_name)
 );
 
 CREATE TABLE IF NOT EXISTS article_author (
@@ -25,34 +27,115 @@ CREATE TABLE IF NOT EXISTS article_author (
     article_id INT,
     author_id INT,
     FOREIGN KEY (article_id) REFERENCES article(article_id),
-    FOREIGN KEY (author_id) REFERENCES author(author_id)
+    FOREIGN KEY (author_id) REFERENCES author(author_id),
+    CONSTRAINT unique_article_author UNIQUE (article_id, author_id)
 );
 
 CREATE TABLE IF NOT EXISTS article_version (
     article_version_id INT GENERATED ALWAYS AS IDENTITY,
     scraped_at TIMESTAMPTZ NOT NULL,
     heading TEXT NOT NULL,
-    body TEXT NOT NULL,
+    body TEXT,
+    body_delta TEXT,
     article_id INT NOT NULL,
+    heading_hash TEXT NOT NULL,
+    body_hash TEXT NOT NULL,
+    paragraph_hashes TEXT[],
     PRIMARY KEY(article_version_id),
+    FOREIGN KEY (article_id) REFERENCES article(article_id),
+    CONSTRAINT unique_article_version UNIQUE (article_id, scraped_at),
+    CONSTRAINT article_version_body_check CHECK (body IS NOT NULL OR body_delta IS NOT NULL)
+);
+
+CREATE INDEX IF NOT EXISTS article_author_author_id_idx ON article_author (author_id);
+
+CREATE INDEX IF NOT EXISTS article_source_idx ON article (source);
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS article_first_heading_trgm_idx
+    ON article USING GIN (first_heading gin_trgm_ops);
+
+CREATE TABLE IF NOT EXISTS article_check (
+    article_id INT NOT NULL,
+    last_checked TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (article_id),
     FOREIGN KEY (article_id) REFERENCES article(article_id)
 );
 
+CREATE TABLE IF NOT EXISTS feed_state (
+    feed_url TEXT NOT NULL,
+    etag TEXT,
+    modified TEXT,
+    last_polled TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (feed_url)
+);
+
+CREATE TABLE IF NOT EXISTS feed_entry_seen (
+    entry_url TEXT NOT NULL,
+    source TEXT NOT NULL,
+    first_seen TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (entry_url)
+);
+
+CREATE TABLE IF NOT EXISTS pipeline_run (
+    pipeline TEXT NOT NULL,
+    finished_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (pipeline)
+);
+
 CREATE SCHEMA changes;
 
 SET SEARCH_PATH TO changes;
 
-CREATE TYPE change_types AS ENUM ('body', 'heading');
+CREATE TYPE change_types AS ENUM ('body', 'heading', 'paragraph');
 
 CREATE TABLE IF NOT EXISTS article_change (
     article_change_id INT GENERATED ALWAYS AS IDENTITY,
     article_id INT NOT NULL,
     article_url TEXT NOT NULL,
     change_type change_types,
-    previous_version TEXT NOT NULL,
-    current_version TEXT NOT NULL,
+    previous_version TEXT,
+    current_version TEXT,
+    diff JSONB,
     last_scraped TIMESTAMPTZ NOT NULL,
     current_scraped TIMESTAMPTZ NOT NULL,
     similarity FLOAT NOT NULL,
-    PRIMARY KEY (article_change_id)
+    PRIMARY KEY (article_change_id),
+    CONSTRAINT unique_article_change UNIQUE (article_id, change_type, current_scraped)
+);
+
+CREATE INDEX IF NOT EXISTS article_change_similarity_idx
+    ON article_change (article_id, similarity);
+
+CREATE TABLE IF NOT EXISTS change_type_count (
+    change_type change_types NOT NULL,
+    change_count INT NOT NULL,
+    PRIMARY KEY (change_type)
+);
+
+CREATE TABLE IF NOT EXISTS article_change_count (
+    article_id INT NOT NULL,
+    article_url TEXT NOT NULL,
+    change_count INT NOT NULL,
+    min_similarity FLOAT NOT NULL,
+    PRIMARY KEY (article_id)
 );
+
+CREATE INDEX IF NOT EXISTS article_change_count_change_count_idx
+    ON article_change_count (change_count);
+
+CREATE TABLE IF NOT EXISTS change_count_histogram (
+    change_count INT NOT NULL,
+    article_count INT NOT NULL,
+    PRIMARY KEY (change_count)
+);
+
+CREATE TABLE IF NOT EXISTS author_change_count (
+    author_id INT NOT NULL,
+    change_count INT NOT NULL,
+    PRIMARY KEY (author_id)
+);
+
+CREATE INDEX IF NOT EXISTS author_change_count_change_count_idx
+    ON author_change_count (change_count);
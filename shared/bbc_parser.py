@@ -0,0 +1,103 @@
+"""Extraction of BBC article pages with lxml XPath, shared by both pipelines"""
+
+from codecs import lookup
+from email.message import Message
+from charset_normalizer import detect
+from lxml import html
+
+PARAGRAPH_SEPARATOR = "\n"
+
+
+def declared_charset(content_type: str | None) -> str | None:
+    """Returns the charset named in a Content-Type header, if it is a known encoding"""
+
+    if not content_type:
+        return None
+    header = Message()
+    header["Content-Type"] = content_type
+    charset = header.get_content_charset()
+    try:
+        return lookup(charset).name if charset else None
+    except LookupError:
+        return None
+
+
+def page_text(content: bytes, content_type: str = None) -> str:
+    """Decodes a page with the charset its Content-Type declares, or, when it declares
+    none, the encoding detected from its bytes as requests' apparent_encoding does"""
+
+    encoding = declared_charset(content_type) or detect(content)["encoding"] or "utf-8"
+
+    return content.decode(encoding, errors="replace")
+
+
+def parse_page(content: bytes | str) -> html.HtmlElement:
+    """Parses page html, decoding bytes with the encoding detected from them;
+    pass page_text's output instead to use the response's declared charset"""
+
+    if isinstance(content, bytes):
+        content = page_text(content)
+
+    return html.document_fromstring(content)
+
+
+def first(element: html.HtmlElement, path: str) -> html.HtmlElement:
+    """Returns the first element matching an XPath, or None"""
+
+    matches = element.xpath(path)
+    return matches[0] if matches else None
+
+
+def element_text(element: html.HtmlElement) -> str:
+    """Returns all the text inside an element, without comments"""
+
+    return "".join(element.itertext())
+
+
+def join_paragraphs(paragraphs: list) -> str:
+    """Joins paragraphs into a body, one paragraph per line"""
+
+    return PARAGRAPH_SEPARATOR.join(
+        paragraph.replace(PARAGRAPH_SEPARATOR, " ") for paragraph in paragraphs)
+
+
+def text_block_paragraphs(main: html.HtmlElement) -> list:
+    """Returns the first paragraph of each text block in the main content"""
+
+    return [element_text(block.find(".//p"))
+            for block in main.xpath(".//div[@data-component='text-block']")]
+
+
+def parse_news_article(content: bytes) -> dict:
+    """Returns the headline, body and author of a news article page,
+    or an empty dict for pages without a main content section"""
+
+    root = parse_page(content)
+    headline = element_text(first(root, "//h1"))
+    main = first(root, "//main[@id='main-content']")
+    if main is None:
+        return {}
+
+    author = first(main, ".//div[contains(@class, 'TextContributorName')]")
+
+    return {"body": join_paragraphs(text_block_paragraphs(main)),
+            "headline": headline,
+            "author": None if author is None else element_text(author)}
+
+
+def parse_article_text(content: bytes) -> tuple[str, str]:
+    """Returns the heading and body of a news or sport article page.
+    Pages without a main content section use every paragraph of their article."""
+
+    root = parse_page(content)
+    heading = element_text(first(root, "//h1"))
+    main = first(root, "//main[@id='main-content']")
+    if main is not None:
+        paragraphs = text_block_paragraphs(main)
+    else:
+        article = first(root, "//article")
+        if article is None:
+            raise ValueError("No article body found")
+        paragraphs = [element_text(paragraph) for paragraph in article.xpath(".//p")]
+
+    return heading, join_paragraphs(paragraphs)
@@ -0,0 +1,43 @@
+"""Benchmarks parse time per saved page for the lxml XPath parser against the
+BeautifulSoup extraction it replaced (needs beautifulsoup4, which the pipelines
+no longer install)"""
+# pylint: disable=invalid-name
+import re
+import time
+from pathlib import Path
+from bs4 import BeautifulSoup as bs
+from bbc_parser import parse_news_article
+
+GOLDEN_DIR = Path(__file__).parent / "golden"
+REPEATS = 200
+
+
+def parse_with_soup(content: bytes) -> dict:
+    """The original BeautifulSoup extraction of a news article page"""
+    soup = bs(content, 'lxml')
+    body = soup.find('main', id='main-content')
+    headline = soup.find('h1').text
+    if body is None:
+        return {}
+    relevant_divs = body.find_all('div', attrs={"data-component": "text-block"})
+    author = body.find('div', attrs={"class": re.compile(".*TextContributorName")})
+    return {"body": "\n".join(div.find('p').text.replace("\n", " ") for div in relevant_divs),
+            "headline": headline, "author": getattr(author, "text", None)}
+
+
+def time_per_page(parse, content: bytes) -> float:
+    """Returns the mean milliseconds taken to parse a page"""
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        parse(content)
+    return (time.perf_counter() - start) * 1000 / REPEATS
+
+
+if __name__ == "__main__":
+
+    for page in sorted(GOLDEN_DIR.glob("*.html")):
+        content = page.read_bytes()
+        soup_ms = time_per_page(parse_with_soup, content)
+        lxml_ms = time_per_page(parse_news_article, content)
+        print(f"{page.stem}: BeautifulSoup {soup_ms:.2f}ms, lxml XPath {lxml_ms:.2f}ms "
+              f"({soup_ms / lxml_ms:.1f}x)")
@@ -0,0 +1,53 @@
+"""Fixed-size digests of article text, used to spot changed articles without full text"""
+
+import hashlib
+import pandas as pd
+
+HASH_COLUMNS = ["heading_hash", "body_hash"]
+PARAGRAPH_SEPARATOR = "\n"
+
+
+def hash_text(text: str) -> str:
+    """Returns the md5 hex digest of a text, matching Postgres' md5() on the same text"""
+
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def canonical_body(body: str) -> str:
+    """Returns the body with paragraphs joined by spaces, as bodies were stored before
+    paragraphs were kept, so their digests still match"""
+
+    return body.replace(PARAGRAPH_SEPARATOR, " ")
+
+
+def paragraph_hashes(body: str) -> list:
+    """Returns the digest of each paragraph of a body"""
+
+    return [hash_text(paragraph) for paragraph in body.split(PARAGRAPH_SEPARATOR)]
+
+
+def to_pg_array(values: list) -> str:
+    """Formats a list of digests as a Postgres array literal, for COPY"""
+
+    return "{" + ",".join(values) + "}"
+
+
+def add_content_hashes(df: pd.DataFrame) -> pd.DataFrame:
+    """Returns a copy of df with heading and body digests added"""
+
+    df = df.copy()
+    df["heading_hash"] = df["heading"].map(hash_text)
+    df["body_hash"] = df["body"].map(canonical_body).map(hash_text)
+
+    return df
+
+
+def find_changed_urls(scraped_df: pd.DataFrame, previous_hashes: pd.DataFrame) -> list:
+    """Returns the urls whose scraped heading or body digest differs from the latest stored one"""
+
+    compared = previous_hashes.merge(scraped_df[["article_url"] + HASH_COLUMNS],
+                                     how="inner", on="article_url")
+    changed = compared[(compared["heading_hash_x"] != compared["heading_hash_y"]) |
+                       (compared["body_hash_x"] != compared["body_hash_y"])]
+
+    return list(changed["article_url"])
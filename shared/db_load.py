@@ -0,0 +1,23 @@
+"""Database write helpers shared by both pipelines' load stages"""
+
+from io import StringIO
+import pandas as pd
+
+
+def copy_rows(cur, table: str, columns: list, df: pd.DataFrame) -> None:
+    """Streams the dataframe's rows into a table with COPY, in column order"""
+
+    buffer = StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv);",
+                    buffer)
+
+
+def record_pipeline_run(conn, pipeline: str) -> None:
+    """Marks the pipeline as having just loaded, telling the dashboard its cache is stale"""
+
+    with conn.cursor() as cur:
+        cur.execute("""INSERT INTO pipeline_run (pipeline, finished_at) VALUES (%s, NOW())
+                    ON CONFLICT (pipeline) DO UPDATE SET finished_at = EXCLUDED.finished_at;""",
+                    [pipeline])
@@ -0,0 +1,80 @@
+"""Registry of news sources: their RSS feeds and how to extract their article pages,
+shared by the scraping pipeline at ingest and the comparison pipeline when re-scraping"""
+
+import json
+from pathlib import Path
+from typing import Callable
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from bbc_parser import (parse_page, first, element_text, join_paragraphs, parse_news_article,
+                        parse_article_text)
+
+FEEDS_FILE = Path(__file__).parent / "feeds.json"
+TRACKING_PARAMS = ("utm_", "at_", "cmp", "ocid")
+NAMED_EXTRACTORS = {"bbc": parse_news_article}
+NAMED_TEXT_EXTRACTORS = {"bbc": parse_article_text}
+
+
+def load_registry(path: str = FEEDS_FILE) -> list:
+    """Returns the sources in a feeds json file, each with a source name,
+    a list of feed urls and an extractor"""
+
+    with open(path, encoding="utf-8") as feeds_file:
+        return json.load(feeds_file)
+
+
+def canonical_url(url: str) -> str:
+    """Returns a url without surrounding whitespace, fragment or tracking parameters,
+    with a lower case scheme and host, so one article reached from two feeds matches"""
+
+    parts = urlsplit(url.strip())
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not key.lower().startswith(TRACKING_PARAMS)]
+
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path,
+                       urlencode(query), ""))
+
+
+def parse_with_rules(content: bytes, rules: dict) -> dict:
+    """Returns the headline, body and author of a page using a source's XPath rules:
+    headline and author each match one element and body matches every paragraph.
+    Pages where the body rule matches nothing give an empty dict."""
+
+    root = parse_page(content)
+    paragraphs = [element_text(paragraph) for paragraph in root.xpath(rules["body"])]
+    if not paragraphs:
+        return {}
+
+    headline = first(root, rules["headline"])
+    author = first(root, rules["author"]) if rules.get("author") else None
+
+    return {"body": join_paragraphs(paragraphs),
+            "headline": "" if headline is None else element_text(headline),
+            "author": None if author is None else element_text(author)}
+
+
+def get_extractor(source: dict) -> Callable:
+    """Returns the page extractor for a source, either a named parser or its XPath rules"""
+
+    extractor = source["extractor"]
+    if isinstance(extractor, str):
+        return NAMED_EXTRACTORS[extractor]
+
+    return lambda content: parse_with_rules(content, extractor)
+
+
+
+def get_text_extractor(source: dict) -> Callable:
+    """Returns the extractor the comparison pipeline uses for a source's pages, giving
+    their heading and body and raising ValueError for pages without a body"""
+
+    extractor = source["extractor"]
+    if isinstance(extractor, str):
+        return NAMED_TEXT_EXTRACTORS[extractor]
+
+    def extract_text(content: bytes | str) -> tuple[str, str]:
+        article = parse_with_rules(content, extractor)
+        if not article:
+            raise ValueError("No article body found")
+        return article["headline"], article["body"]
+
+    return extract_text
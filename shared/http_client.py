@@ -0,0 +1,123 @@
+"""Pooled HTTP client shared by the scrapers, retrying transient failures with backoff"""
+
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from random import uniform
+from threading import Lock
+from time import sleep
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 16
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DEFAULT_TIMEOUT = 10
+
+SESSION_LOCK = Lock()
+SESSIONS = {}
+STATS_LOCK = Lock()
+STATS = Counter()
+
+
+def get_session() -> requests.Session:
+    """Returns the process' session, whose keep-alive connections are reused
+    by every request to the same host"""
+
+    with SESSION_LOCK:
+        if "session" not in SESSIONS:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            SESSIONS["session"] = session
+
+    return SESSIONS["session"]
+
+
+def count(**amounts: int) -> None:
+    """Adds to the request counters"""
+
+    with STATS_LOCK:
+        STATS.update(amounts)
+
+
+def retry_after_seconds(response: requests.Response) -> float:
+    """Returns the wait a Retry-After header asks for, in seconds or as a date,
+    or None when there is no usable header"""
+
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def backoff_seconds(attempt: int, response: requests.Response = None) -> float:
+    """Returns how long to wait before retrying: the server's Retry-After when given,
+    otherwise a random wait up to an exponentially growing limit"""
+
+    retry_after = retry_after_seconds(response) if response is not None else None
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX)
+
+    return uniform(0, min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX))
+
+
+def fetch(url: str, timeout: float = DEFAULT_TIMEOUT, headers: dict = None,
+          max_retries: int = MAX_RETRIES) -> requests.Response:
+    """Gets a url over the pooled session, retrying connection errors, timeouts and
+    429/5xx responses. The last response is returned once retries run out, and the
+    last connection error is raised."""
+
+    session = get_session()
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.get(url, timeout=timeout, headers=headers)
+        except (requests.ConnectionError, requests.Timeout):
+            count(requests=1, errors=1)
+            if attempt == max_retries:
+                raise
+            count(retries=1)
+            sleep(backoff_seconds(attempt))
+            continue
+
+        count(requests=1, bytes=len(response.content))
+        if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+            return response
+        count(retries=1)
+        sleep(backoff_seconds(attempt, response))
+
+    return response
+
+
+def get_stats() -> dict:
+    """Returns the request counters, with how many requests reused a pooled connection"""
+
+    with STATS_LOCK:
+        stats = dict(STATS)
+
+    opened = handled = 0
+    session = SESSIONS.get("session")
+    if session is not None:
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    opened += pool.num_connections
+                    handled += pool.num_requests
+    stats["connections"] = opened
+    stats["reused_connections"] = max(handled - opened, 0)
+
+    return stats
+
@@ -0,0 +1,52 @@
+# pylint: skip-file
+"""
+Tests bbc_parser.py against saved BBC pages in golden/, whose .json files hold
+the output of the original BeautifulSoup extraction for the same page
+"""
+import json
+from pathlib import Path
+import pytest
+from bbc_parser import parse_news_article, parse_article_text, page_text
+
+GOLDEN_DIR = Path(__file__).parent / "golden"
+PAGES = sorted(GOLDEN_DIR.glob("*.html"))
+
+
+def expected_output(page: Path) -> dict:
+    """Loads the saved extraction output for a page"""
+    return json.loads(page.with_suffix(".json").read_text(encoding="utf-8"))
+
+
+@pytest.mark.parametrize("page", PAGES, ids=[page.stem for page in PAGES])
+def test_news_article_matches_golden(page):
+    """Tests that the ingest pipeline's extraction is unchanged"""
+    assert parse_news_article(page.read_bytes()) == expected_output(page)["news_article"]
+
+
+@pytest.mark.parametrize("page", PAGES, ids=[page.stem for page in PAGES])
+def test_article_text_matches_golden(page):
+    """Tests that the comparison pipeline's extraction is unchanged"""
+    assert list(parse_article_text(page.read_bytes())) == expected_output(page)["article_text"]
+
+
+def test_article_text_without_article_raises():
+    """Tests that a page with no article body is rejected"""
+    with pytest.raises(ValueError):
+        parse_article_text(b"<html><body><h1>Heading</h1></body></html>")
+
+
+def test_page_text_uses_declared_charset():
+    """Tests that a page is decoded with the charset its Content-Type names"""
+    page = "<p>Café crème</p>".encode("iso-8859-1")
+    assert page_text(page, "text/html; charset=ISO-8859-1") == "<p>Café crème</p>"
+
+
+def test_page_text_detects_undeclared_charset():
+    """Tests that a page without a declared charset is decoded with the detected encoding"""
+    page = "<html><body><p>Le café où l'élève a mangé une crème brûlée</p></body></html>"
+    assert page_text(page.encode("utf-16"), "text/html") == page
+
+
+def test_page_text_ignores_unknown_charset():
+    """Tests that an unknown declared charset falls back to detection"""
+    assert page_text("<p>naïve</p>".encode("utf-8"), "text/html; charset=bogus") == "<p>naïve</p>"
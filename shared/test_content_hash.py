@@ -0,0 +1,46 @@
+# pylint: skip-file
+"""
+Tests content_hash.py functionality
+"""
+import pandas as pd
+from content_hash import hash_text, add_content_hashes, find_changed_urls, paragraph_hashes
+
+
+def test_hash_text_matches_postgres_md5():
+    """Tests that digests match Postgres md5() of the same text"""
+    assert hash_text("body") == "841a2d689ad86bd1611447453c22c6fc"
+
+
+def test_add_content_hashes_leaves_input_untouched():
+    """Tests that digests are added to a copy of the dataframe"""
+    articles = pd.DataFrame([{"heading": "new headline", "body": "body"}])
+    result = add_content_hashes(articles)
+    assert result["heading_hash"][0] == hash_text("new headline")
+    assert result["body_hash"][0] == hash_text("body")
+    assert "heading_hash" not in articles.columns
+
+
+def test_body_hash_ignores_paragraph_breaks():
+    """Tests that keeping paragraphs does not change the digest of a stored space-joined body"""
+    joined = add_content_hashes(pd.DataFrame([{"heading": "h", "body": "first second"}]))
+    split = add_content_hashes(pd.DataFrame([{"heading": "h", "body": "first\nsecond"}]))
+    assert joined["body_hash"][0] == split["body_hash"][0]
+
+
+def test_paragraph_hashes():
+    """Tests that each paragraph gets its own digest"""
+    assert paragraph_hashes("first\nsecond") == [hash_text("first"), hash_text("second")]
+
+
+def test_find_changed_urls_only_returns_differing_articles():
+    """Tests that only articles whose heading or body digest changed are returned"""
+    scraped = add_content_hashes(pd.DataFrame([
+        {"article_url": "same", "heading": "h", "body": "b"},
+        {"article_url": "new heading", "heading": "h2", "body": "b"},
+        {"article_url": "new body", "heading": "h", "body": "b2"},
+        {"article_url": "not stored", "heading": "h", "body": "b"}]))
+    previous = pd.DataFrame([(url, hash_text("h"), hash_text("b"))
+                             for url in ("same", "new heading", "new body")],
+                            columns=["article_url", "heading_hash", "body_hash"])
+
+    assert find_changed_urls(scraped, previous) == ["new heading", "new body"]
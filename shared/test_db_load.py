@@ -0,0 +1,28 @@
+# pylint: skip-file
+"""
+Tests db_load.py helpers
+"""
+from unittest.mock import MagicMock
+import pandas as pd
+from db_load import copy_rows, record_pipeline_run
+
+
+def test_copy_rows_streams_csv_in_column_order():
+    """Tests that rows are sent to COPY as csv, quoted where needed, without a header"""
+    cur = MagicMock()
+    df = pd.DataFrame([("1", "a, b"), ("2", "c")], columns=["id", "text"])
+    copy_rows(cur, "staging", ["id", "text"], df)
+    sql, buffer = cur.copy_expert.call_args.args
+    assert sql == "COPY staging (id, text) FROM STDIN WITH (FORMAT csv);"
+    assert buffer.getvalue() == '1,"a, b"\n2,c\n'
+
+
+def test_record_pipeline_run_upserts_finish_time():
+    """Tests that the pipeline's finish time is inserted or updated, without committing"""
+    conn = MagicMock()
+    record_pipeline_run(conn, "ingest")
+    cur = conn.cursor.return_value.__enter__.return_value
+    sql, params = cur.execute.call_args.args
+    assert "ON CONFLICT (pipeline)" in sql
+    assert params == ["ingest"]
+    conn.commit.assert_not_called()
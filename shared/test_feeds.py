@@ -0,0 +1,54 @@
+# pylint: skip-file
+"""
+Tests feeds.py functionality
+"""
+import pytest
+from feeds import (load_registry, canonical_url, parse_with_rules, get_extractor,
+                   get_text_extractor, NAMED_EXTRACTORS, NAMED_TEXT_EXTRACTORS)
+
+RULES = {"headline": "//h1", "body": "//div[@class='story']/p", "author": "//a[@rel='author']"}
+PAGE = ("<html><body><h1>headline</h1><a rel=\"author\">Bob Vance</a>"
+        "<div class=\"story\"><p>first</p><p>second</p></div></body></html>")
+
+
+def test_shipped_registry_is_valid():
+    """Tests that every source in feeds.json has feeds and a known or rules extractor"""
+    registry = load_registry()
+    assert [source["source"] for source in registry][0] == "BBC"
+    for source in registry:
+        assert source["feeds"]
+        assert isinstance(source["extractor"], dict) or source["extractor"] in NAMED_EXTRACTORS
+        assert isinstance(source["extractor"], dict) or source["extractor"] in NAMED_TEXT_EXTRACTORS
+
+
+def test_canonical_url_drops_tracking_and_fragment():
+    """Tests that tracking parameters, fragments and host case do not change the url"""
+    assert canonical_url(" https://WWW.BBC.co.uk/news/uk-1?at_medium=RSS&at_campaign=KARANGA#top ")\
+        == "https://www.bbc.co.uk/news/uk-1"
+    assert canonical_url("https://www.a.com/story?id=4&utm_source=rss") \
+        == "https://www.a.com/story?id=4"
+
+
+def test_parse_with_rules():
+    """Tests that a rules extractor reads the headline, paragraphs and author"""
+    assert parse_with_rules(PAGE, RULES) == {"body": "first\nsecond", "headline": "headline",
+                                             "author": "Bob Vance"}
+
+
+def test_parse_with_rules_no_body():
+    """Tests that pages without any body paragraphs give an empty dict"""
+    assert parse_with_rules("<html><body><h1>video</h1></body></html>", RULES) == {}
+
+
+def test_get_extractor():
+    """Tests that named extractors are looked up and rules are wrapped"""
+    assert get_extractor({"extractor": "bbc"}) is NAMED_EXTRACTORS["bbc"]
+    assert get_extractor({"extractor": RULES})(PAGE)["headline"] == "headline"
+
+
+def test_get_text_extractor():
+    """Tests that the comparison extractors give a heading and body, rejecting empty pages"""
+    assert get_text_extractor({"extractor": "bbc"}) is NAMED_TEXT_EXTRACTORS["bbc"]
+    assert get_text_extractor({"extractor": RULES})(PAGE) == ("headline", "first\nsecond")
+    with pytest.raises(ValueError):
+        get_text_extractor({"extractor": RULES})("<html><body><h1>video</h1></body></html>")
@@ -0,0 +1,118 @@
+# pylint: skip-file
+"""
+Tests http_client.py retries, backoff and counters
+"""
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from unittest.mock import MagicMock, patch
+import pytest
+import requests
+from http_client import fetch, backoff_seconds, retry_after_seconds, get_stats, BACKOFF_MAX
+
+
+def fake_response(status: int, headers: dict = None) -> MagicMock:
+    """Returns a mock response with a status, headers and a short body"""
+    response = MagicMock()
+    response.status_code = status
+    response.headers = headers or {}
+    response.content = b"page"
+    return response
+
+
+@patch("http_client.sleep")
+@patch("http_client.get_session")
+def test_fetch_retries_server_errors(mock_session, mock_sleep):
+    """Tests that 503s are retried until a good response comes back"""
+    mock_session.return_value.get.side_effect = [fake_response(503), fake_response(200)]
+    result = fetch("www.fakeurl.com")
+    assert result.status_code == 200
+    assert mock_session.return_value.get.call_count == 2
+    assert mock_sleep.call_count == 1
+
+
+@patch("http_client.sleep")
+@patch("http_client.get_session")
+def test_fetch_does_not_retry_client_errors(mock_session, mock_sleep):
+    """Tests that a 404 is returned straight away"""
+    mock_session.return_value.get.return_value = fake_response(404)
+    assert fetch("www.fakeurl.com").status_code == 404
+    assert mock_sleep.call_count == 0
+
+
+@patch("http_client.sleep")
+@patch("http_client.get_session")
+def test_fetch_returns_last_response_when_retries_run_out(mock_session, mock_sleep):
+    """Tests that a persistent 429 is handed back after max_retries waits"""
+    mock_session.return_value.get.return_value = fake_response(429)
+    assert fetch("www.fakeurl.com", max_retries=2).status_code == 429
+    assert mock_session.return_value.get.call_count == 3
+    assert mock_sleep.call_count == 2
+
+
+@patch("http_client.sleep")
+@patch("http_client.get_session")
+def test_fetch_raises_connection_error_after_retries(mock_session, mock_sleep):
+    """Tests that connection errors are retried, then raised"""
+    mock_session.return_value.get.side_effect = requests.exceptions.ConnectionError
+    with pytest.raises(requests.exceptions.ConnectionError):
+        fetch("www.fakeurl.com", max_retries=1)
+    assert mock_session.return_value.get.call_count == 2
+
+
+@patch("http_client.sleep")
+@patch("http_client.get_session")
+def test_fetch_honours_retry_after(mock_session, mock_sleep):
+    """Tests that the wait before a retry is the server's Retry-After"""
+    mock_session.return_value.get.side_effect = [fake_response(429, {"Retry-After": "7"}),
+                                                 fake_response(200)]
+    fetch("www.fakeurl.com")
+    assert mock_sleep.call_args.args[0] == 7
+
+
+def test_retry_after_date():
+    """Tests that a Retry-After date becomes the seconds until it"""
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=20)
+    response = fake_response(503, {"Retry-After": format_datetime(retry_at, usegmt=True)})
+    assert 15 < retry_after_seconds(response) <= 20
+    assert retry_after_seconds(fake_response(503, {"Retry-After": "soon"})) is None
+
+
+def test_backoff_is_jittered_and_capped():
+    """Tests that waits stay under the exponential limit and the cap"""
+    assert all(0 <= backoff_seconds(1) <= 1 for _ in range(50))
+    assert all(backoff_seconds(20) <= BACKOFF_MAX for _ in range(50))
+    assert backoff_seconds(0, fake_response(429, {"Retry-After": "3600"})) == BACKOFF_MAX
+
+
+class QuietHandler(BaseHTTPRequestHandler):
+    """Answers every GET with a short keep-alive response"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "4")
+        self.end_headers()
+        self.wfile.write(b"page")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_fetch_reuses_connections():
+    """Tests that repeat requests to one host go over a pooled connection"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), QuietHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        before = get_stats()
+        for _ in range(3):
+            fetch(f"http://127.0.0.1:{server.server_port}/article")
+        after = get_stats()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert after["requests"] - before.get("requests", 0) == 3
+    assert after["bytes"] - before.get("bytes", 0) == 12
+    assert after["reused_connections"] - before["reused_connections"] == 2